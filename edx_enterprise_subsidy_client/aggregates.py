@@ -0,0 +1,261 @@
+"""
+A cache of per-learner aggregate data, for enforcing per-learner spend and enrollment limits locally.
+
+``get_subsidy_aggregates_by_learner_data()`` returns, for every learner in a subsidy (optionally
+filtered to one subsidy access policy), how many enrollments they have and how much they've spent.
+Callers that enforce per-learner limits typically need this for every policy of a subsidy, for every
+redemption.  ``LearnerAggregateCache`` fetches each (subsidy, policy) view once, keeps it as a compact
+``lms_user_id -> (enrollment_count, total_quantity)`` map, refreshes it in the background shortly before
+its TTL is up, and applies the deltas of transactions created through the same client.
+
+A transaction created while a view is being fetched may or may not be included in the fetched data,
+so its delta is applied to the new view as well, and the view is refreshed again on its next use.  Until
+then, the learner may be counted twice for it, which errs on the side of enforcing limits.
+
+Spend limits rely on the endpoint's ``total_quantity`` field.  If the service doesn't return it, spend is
+unknown rather than zero: ``would_exceed_limits()`` then raises instead of letting every redemption pass.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+
+from .client import WRITE_TYPE_TRANSACTION, EnterpriseSubsidyAPIClientException, TransactionStateChoices
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_REFRESH_AHEAD_SECONDS = 60
+
+
+class LearnerAggregateView:
+    """
+    Aggregates for every learner in one subsidy, optionally restricted to one policy.
+
+    ``total_quantity`` is the sum of the learner's transaction quantities, i.e. a negative
+    number of cents for spend.  ``spend_known`` is False if the service didn't return it for every learner.
+    """
+
+    __slots__ = ('subsidy_uuid', 'policy_uuid', 'learners', 'fetched_at', 'spend_known')
+
+    def __init__(self, subsidy_uuid, policy_uuid, learner_aggregates, fetched_at):
+        self.subsidy_uuid = subsidy_uuid
+        self.policy_uuid = policy_uuid
+        self.fetched_at = fetched_at
+        self.spend_known = all('total_quantity' in record for record in learner_aggregates)
+        self.learners = {
+            str(record['lms_user_id']): (
+                int(record.get('enrollment_count') or 0),
+                int(record.get('total_quantity') or 0),
+            )
+            for record in learner_aggregates
+        }
+
+    def get(self, lms_user_id):
+        """
+        Returns ``(enrollment_count, total_quantity)`` for the learner; zeros if they have no transactions.
+        """
+        return self.learners.get(str(lms_user_id), (0, 0))
+
+    def apply_delta(self, lms_user_id, quantity):
+        """
+        Counts one more enrollment of the given quantity for the learner.
+        """
+        enrollment_count, total_quantity = self.get(lms_user_id)
+        self.learners[str(lms_user_id)] = (enrollment_count + 1, total_quantity + quantity)
+
+
+class LearnerAggregateCache:
+    """
+    TTL cache of ``LearnerAggregateView`` objects, keyed on (subsidy uuid, policy uuid or None).
+
+    Args:
+        client: An ``EnterpriseSubsidyAPIClient`` (or V2) instance.
+        ttl (int): Seconds after which a view must be refetched before it's used again.
+        refresh_ahead (int): Within this many seconds of the TTL, a view is still served but a
+            background refresh is started, so that hot views rarely expire.
+    """
+
+    def __init__(self, client, ttl=DEFAULT_TTL_SECONDS, refresh_ahead=DEFAULT_REFRESH_AHEAD_SECONDS):
+        self.client = client
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self._views = {}
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        # Futures of the fetches in flight, by key, so concurrent misses share one fetch.
+        self._fetches = {}
+        # Deltas applied while a fetch of the key is in flight: key -> one list of deltas per fetch.
+        self._in_flight = {}
+        client.add_write_listener(self.on_write)
+
+    def close(self):
+        """
+        Stops listening to the client's writes.
+        """
+        self.client.remove_write_listener(self.on_write)
+
+    @staticmethod
+    def _key(subsidy_uuid, policy_uuid):
+        """
+        Returns the cache key of a (subsidy, policy) view.
+        """
+        return (str(subsidy_uuid), str(policy_uuid) if policy_uuid else None)
+
+    def _fetch(self, key):
+        """
+        Fetches the key's view, applies the deltas of transactions created meanwhile, and caches it.
+        """
+        subsidy_uuid, policy_uuid = key
+        fetched_at = time.monotonic()
+        deltas = []
+        with self._lock:
+            self._in_flight.setdefault(key, []).append(deltas)
+        try:
+            learner_aggregates = self.client.get_subsidy_aggregates_by_learner_data(
+                subsidy_uuid, policy_uuid=policy_uuid,
+            )
+        finally:
+            with self._lock:
+                others = [other for other in self._in_flight[key] if other is not deltas]
+                if others:
+                    self._in_flight[key] = others
+                else:
+                    del self._in_flight[key]
+        view = LearnerAggregateView(subsidy_uuid, policy_uuid, learner_aggregates, fetched_at)
+        with self._lock:
+            for lms_user_id, quantity in deltas:
+                view.apply_delta(lms_user_id, quantity)
+            if deltas:
+                # Due for a refresh-ahead on its next use, to correct any delta the server already counted.
+                view.fetched_at = min(fetched_at, time.monotonic() - (self.ttl - self.refresh_ahead))
+            self._views[key] = view
+        if not view.spend_known:
+            logger.error(
+                'Learner aggregates for %s have no total_quantity; per-learner spend limits cannot be enforced', key,
+            )
+        return view
+
+    def _fetch_once(self, key):
+        """
+        Fetches the key's view, or waits for the fetch of it another thread already started.
+        """
+        with self._lock:
+            future = self._fetches.get(key)
+            started = future is None
+            if started:
+                future = self._fetches[key] = Future()
+        if not started:
+            return future.result()
+        try:
+            view = self._fetch(key)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                del self._fetches[key]
+        future.set_result(view)
+        return view
+
+    def _background_refresh(self, key):
+        """
+        Refetches the key's view; run on a background thread.
+        """
+        try:
+            self._fetch_once(key)
+        except requests.exceptions.RequestException:
+            logger.warning('Background refresh of learner aggregates failed for %s', key, exc_info=True)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _refresh_in_background(self, key):
+        """
+        Starts a background refresh of the key's view, unless one is already running.
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        threading.Thread(target=self._background_refresh, args=(key,), daemon=True).start()
+
+    def get_view(self, subsidy_uuid, policy_uuid=None):
+        """
+        Returns the cached ``LearnerAggregateView``, fetching it first if it's missing or expired.
+        """
+        key = self._key(subsidy_uuid, policy_uuid)
+        view = self._views.get(key)
+        if view is None:
+            return self._fetch_once(key)
+        age = time.monotonic() - view.fetched_at
+        if age >= self.ttl:
+            return self._fetch_once(key)
+        if age >= self.ttl - self.refresh_ahead:
+            self._refresh_in_background(key)
+        return view
+
+    def invalidate(self, subsidy_uuid, policy_uuid=None):
+        """
+        Drops cached views for the subsidy; all of them if no policy is given.
+        """
+        subsidy_uuid = str(subsidy_uuid)
+        with self._lock:
+            for key in list(self._views):
+                if key[0] == subsidy_uuid and (policy_uuid is None or key[1] == str(policy_uuid)):
+                    del self._views[key]
+
+    def learner_totals(self, subsidy_uuid, lms_user_id, policy_uuid=None):
+        """
+        Returns ``(enrollment_count, total_quantity)`` for the learner in the subsidy (and policy, if given).
+        """
+        return self.get_view(subsidy_uuid, policy_uuid).get(lms_user_id)
+
+    def would_exceed_limits(
+        self, subsidy_uuid, lms_user_id, policy_uuid=None,
+        max_enrollments=None, max_spend=None, additional_spend=0,
+    ):
+        """
+        Returns True if one more redemption costing ``additional_spend`` would exceed the given per-learner limits.
+
+        Args:
+            max_enrollments (int): Maximum number of enrollments per learner, or None for no limit.
+            max_spend (int): Maximum spend per learner, as a positive quantity (e.g. cents), or None for no limit.
+            additional_spend (int): The positive quantity the new redemption would cost.
+
+        Raises:
+            EnterpriseSubsidyAPIClientException: If ``max_spend`` is given but the service didn't return
+                ``total_quantity``, so the learner's spend is unknown.
+        """
+        view = self.get_view(subsidy_uuid, policy_uuid)
+        enrollment_count, total_quantity = view.get(lms_user_id)
+        if max_enrollments is not None and enrollment_count + 1 > max_enrollments:
+            return True
+        if max_spend is not None and not view.spend_known:
+            raise EnterpriseSubsidyAPIClientException(
+                'The learner aggregates have no total_quantity, so per-learner spend limits cannot be enforced.'
+            )
+        if max_spend is not None and -total_quantity + additional_spend > max_spend:
+            return True
+        return False
+
+    def on_write(self, write_type, subsidy_uuid, response_data):
+        """
+        Write listener; applies transactions created through the client to the cached views.
+        """
+        if write_type != WRITE_TYPE_TRANSACTION or response_data.get('state') == TransactionStateChoices.FAILED:
+            return
+        lms_user_id = response_data.get('lms_user_id')
+        if lms_user_id is None:
+            return
+        quantity = int(response_data.get('quantity') or 0)
+        policy_uuid = response_data.get('subsidy_access_policy_uuid')
+        with self._lock:
+            for key in set((self._key(subsidy_uuid, None), self._key(subsidy_uuid, policy_uuid))):
+                view = self._views.get(key)
+                if view is not None:
+                    view.apply_delta(lms_user_id, quantity)
+                for deltas in self._in_flight.get(key, ()):
+                    deltas.append((lms_user_id, quantity))
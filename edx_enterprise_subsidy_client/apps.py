@@ -0,0 +1,55 @@
+"""
+Django app config for the enterprise-subsidy client.
+"""
+import threading
+
+from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+
+class EnterpriseSubsidyClientConfig(AppConfig):
+    """
+    Optionally prewarms a subsidy client when Django starts.
+
+    Warming happens when the ``ENTERPRISE_SUBSIDY_CLIENT_WARMUP`` setting is a dict, with:
+
+    * ``client_factory`` (required): dotted path of a callable returning the client to warm.  It must
+      return the very instance the service makes its calls through (e.g. a module-level singleton),
+      since a fresh client's token, connections and cache would go unused.
+    * ``connections``: number of pooled connections to open.
+    * ``hot_keys_path``: file of hot keys to prefetch, also where this process's hot keys are
+      snapshotted at exit.  Only used if the client has a ``read_cache``.
+    * ``background``: warm up in a daemon thread, so as not to delay startup; defaults to True.
+    """
+
+    name = 'edx_enterprise_subsidy_client'
+    verbose_name = 'Enterprise subsidy client'
+
+    def ready(self):
+        config = getattr(settings, 'ENTERPRISE_SUBSIDY_CLIENT_WARMUP', None)
+        if config is None:
+            return
+        if not config.get('client_factory'):
+            raise ImproperlyConfigured(
+                'ENTERPRISE_SUBSIDY_CLIENT_WARMUP needs a client_factory returning the client the service uses.'
+            )
+        if config.get('background', True):
+            threading.Thread(target=self.warm_up, args=(config,), name='subsidy-client-warmup', daemon=True).start()
+        else:
+            self.warm_up(config)
+
+    @staticmethod
+    def warm_up(config):
+        """
+        Warms up the configured client, then starts tracking its hot keys.
+        """
+        from .warmup import track_hot_keys, warmup  # pylint: disable=import-outside-toplevel
+        client = import_string(config['client_factory'])()
+        hot_keys_path = config.get('hot_keys_path')
+        warmup(client, connections=config.get('connections', 4), hot_keys_path=hot_keys_path)
+        # Only after warming up, so that prefetches aren't counted as hot reads.  Without a read cache,
+        # there's nothing to prefetch, and snapshotting would only overwrite the file with no keys.
+        if client.read_cache is not None:
+            track_hot_keys(client, snapshot_path=hot_keys_path)
@@ -0,0 +1,266 @@
+"""
+Process-wide OAuth token management for the enterprise-subsidy client.
+
+``edx_rest_api_client.client.OAuthAPIClient`` fetches a new access token lazily,
+on the first request made after the cached token expires.  That means one
+user-facing request per token lifetime pays for a round trip to the OAuth provider,
+and concurrent threads may all try to refresh at the same time.
+
+The ``OAuthTokenManager`` defined here instead refreshes the token *before* it expires
+(at a jittered point inside a refresh window), in a background thread, and guarantees
+that at most one refresh is in flight per set of credentials.  Managers are shared
+by every client instance in the process via ``get_token_manager()``.
+
+Tokens are also shared between processes through ``TieredCache`` (i.e. the Django cache), under the
+same key ``edx_rest_api_client`` caches them: a manager due for a refresh first adopts a newer token
+another process already put there, and writes the tokens it fetches back to it.
+"""
+import datetime
+import logging
+import random
+import threading
+import time
+
+import requests
+from edx_django_utils.cache import TieredCache
+from edx_rest_api_client.client import OAuthAPIClient as BaseOAuthAPIClient
+from edx_rest_api_client.client import _get_oauth_url, get_oauth_access_token
+
+logger = logging.getLogger(__name__)
+
+# Treat tokens as expired this many seconds early, so they are still valid when used.
+ACCESS_TOKEN_EXPIRED_THRESHOLD_SECONDS = 5
+
+# Start trying to refresh a token this many seconds before it expires...
+DEFAULT_REFRESH_MARGIN_SECONDS = 120
+
+# ...plus a random amount up to this many seconds, so that many processes
+# started at the same time don't all hit the OAuth provider together.
+DEFAULT_REFRESH_JITTER_SECONDS = 60
+
+# After a failed background refresh, wait this long before trying again.
+REFRESH_RETRY_SECONDS = 5
+
+# The ``TieredCache`` key of ``edx_rest_api_client.client.get_and_cache_oauth_access_token()``.
+SHARED_TOKEN_CACHE_KEY = 'edx_rest_api_client.access_token.jwt.client_credentials.{client_id}.{oauth_url}'
+
+_token_managers = {}
+_token_managers_lock = threading.Lock()
+
+
+class OAuthTokenManager:
+    """
+    Holds a single OAuth access token for one set of client credentials and keeps it fresh.
+
+    Callers only ever block on the token endpoint when there is no usable token at all
+    (i.e. the very first request in a process, or after the token fully expired).  Once a
+    token is inside its refresh window, the next caller kicks off a background refresh
+    and keeps using the current, still-valid token.
+    """
+
+    def __init__(
+        self,
+        oauth_url,
+        client_id,
+        client_secret,
+        timeout=None,
+        refresh_margin=DEFAULT_REFRESH_MARGIN_SECONDS,
+        refresh_jitter=DEFAULT_REFRESH_JITTER_SECONDS,
+    ):
+        self.oauth_url = oauth_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.timeout = timeout
+        self.refresh_margin = refresh_margin
+        self.refresh_jitter = refresh_jitter
+
+        self._token = None
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        # Held for the duration of any token fetch; this is the single-flight guard.
+        self._refresh_lock = threading.Lock()
+
+    def _is_usable(self, now):
+        return self._token is not None and now < self._expires_at - ACCESS_TOKEN_EXPIRED_THRESHOLD_SECONDS
+
+    def get_token(self):
+        """
+        Returns a valid access token, fetching one synchronously only if none is usable.
+
+        Raises:
+            requests.RequestException if there is a problem retrieving the access token.
+        """
+        now = time.monotonic()
+        token = self._token
+        if self._is_usable(now):
+            if now >= self._refresh_at:
+                self.refresh_in_background()
+            return token
+        return self.refresh()
+
+    def refresh(self):
+        """
+        Synchronously fetches a new token, unless another thread has just done so.
+        """
+        with self._refresh_lock:
+            if self._is_usable(time.monotonic()) and time.monotonic() < self._refresh_at:
+                return self._token
+            self._fetch()
+            return self._token
+
+    def refresh_in_background(self):
+        """
+        Starts a background refresh, unless one is already in flight.
+
+        Returns:
+            bool: True if a refresh thread was started.
+        """
+        if not self._refresh_lock.acquire(blocking=False):  # pylint: disable=consider-using-with
+            return False
+        try:
+            thread = threading.Thread(
+                target=self._background_refresh,
+                name='enterprise-subsidy-client-token-refresh',
+                daemon=True,
+            )
+            thread.start()
+        except Exception:
+            self._refresh_lock.release()
+            raise
+        return True
+
+    def _background_refresh(self):
+        """
+        Runs in the refresh thread started by ``refresh_in_background()``, and releases ``_refresh_lock`` when done.
+        """
+        try:
+            self._fetch()
+        except requests.RequestException:
+            # The current token is still valid; try again a little later.
+            self._refresh_at = time.monotonic() + REFRESH_RETRY_SECONDS
+            logger.warning('Background OAuth token refresh failed for client %s', self.client_id, exc_info=True)
+        finally:
+            self._refresh_lock.release()
+
+    def _shared_cache_key(self):
+        """
+        Returns the TieredCache key tokens are shared under, the same one edx-rest-api-client uses.
+        """
+        return SHARED_TOKEN_CACHE_KEY.format(client_id=self.client_id, oauth_url=_get_oauth_url(self.oauth_url))
+
+    def _get_shared_token(self):
+        """
+        Returns the ``(token, expires_at)`` pair from the shared cache, or None if there is none or the cache fails.
+        """
+        try:
+            cached_response = TieredCache.get_cached_response(self._shared_cache_key())
+        except Exception:
+            logger.warning('Failed to read the shared OAuth token cache', exc_info=True)
+            return None
+        return cached_response.value if cached_response.is_found else None
+
+    def _set_shared_token(self, token, expires_at, lifetime):
+        """
+        Shares a token through the TieredCache until it is due to expire.  Cache failures are logged, not raised.
+        """
+        try:
+            TieredCache.set_all_tiers(
+                self._shared_cache_key(), (token, expires_at), int(lifetime) - ACCESS_TOKEN_EXPIRED_THRESHOLD_SECONDS,
+            )
+        except Exception:
+            logger.warning('Failed to write to the shared OAuth token cache', exc_info=True)
+
+    def _fetch(self):
+        """
+        Adopts a newer token from the shared cache, or else fetches one from the provider and shares it,
+        and schedules its jittered early refresh.  Must be called while holding ``_refresh_lock``.
+        """
+        shared_token = self._get_shared_token()
+        if shared_token is not None and shared_token[0] != self._token:
+            token, expires_at = shared_token
+            lifetime = (expires_at - datetime.datetime.utcnow()).total_seconds()
+            # Only worth adopting if it isn't itself about to be refreshed.
+            if lifetime > self.refresh_margin:
+                self._install(token, lifetime)
+                return
+
+        kwargs = {'grant_type': 'client_credentials'}
+        if self.timeout is not None:
+            kwargs['timeout'] = self.timeout
+        token, expires_at = get_oauth_access_token(
+            self.oauth_url,
+            self.client_id,
+            self.client_secret,
+            **kwargs,
+        )
+        lifetime = (expires_at - datetime.datetime.utcnow()).total_seconds()
+        self._set_shared_token(token, expires_at, lifetime)
+        self._install(token, lifetime)
+
+    def _install(self, token, lifetime):
+        """
+        Makes ``token`` the current one, and schedules its jittered early refresh.
+        """
+        now = time.monotonic()
+        # Never schedule the refresh earlier than half-way through the token's lifetime.
+        lead_time = min(self.refresh_margin + random.uniform(0, self.refresh_jitter), lifetime / 2)
+        self._expires_at = now + lifetime
+        self._refresh_at = now + lifetime - lead_time
+        self._token = token
+
+    def seed(self, token, expires_in):
+        """
+        Installs a known token that is valid for ``expires_in`` seconds, e.g. during warmup or replay.
+        """
+        now = time.monotonic()
+        with self._refresh_lock:
+            self._token = token
+            self._expires_at = now + expires_in
+            self._refresh_at = now + expires_in - min(self.refresh_margin, expires_in / 2)
+
+
+def get_token_manager(oauth_url, client_id, client_secret, timeout=None):
+    """
+    Returns the process-wide ``OAuthTokenManager`` for the given credentials, creating it if necessary.
+    """
+    key = (oauth_url, client_id)
+    with _token_managers_lock:
+        manager = _token_managers.get(key)
+        if manager is None or manager.client_secret != client_secret:
+            manager = OAuthTokenManager(oauth_url, client_id, client_secret, timeout=timeout)
+            _token_managers[key] = manager
+        return manager
+
+
+def reset_token_managers():
+    """
+    Forgets all process-wide token managers.  Mostly useful in tests.
+    """
+    with _token_managers_lock:
+        _token_managers.clear()
+
+
+class OAuthAPIClient(BaseOAuthAPIClient):
+    """
+    An ``OAuthAPIClient`` whose access token comes from a process-wide ``OAuthTokenManager``,
+    which refreshes tokens ahead of expiry instead of on the request path.
+    """
+
+    def __init__(self, base_url, client_id, client_secret, **kwargs):
+        super().__init__(base_url, client_id, client_secret, **kwargs)
+        oauth_url = self._base_url if not self.oauth_uri else self._base_url + self.oauth_uri
+        self.token_manager = get_token_manager(oauth_url, client_id, client_secret, timeout=self._timeout)
+        # Sent instead of the token manager's token, by this session only; e.g. when replaying recordings.
+        self.access_token_override = None
+
+    def _ensure_authentication(self):
+        """
+        Ensures that the Session's auth.token is set with an unexpired token.
+
+        Raises:
+            requests.RequestException if there is a problem retrieving the access token.
+        """
+        if self.access_token_override is not None:
+            self.auth.token = self.access_token_override
+        else:
+            self.auth.token = self.token_manager.get_token()
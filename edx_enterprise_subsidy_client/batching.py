@@ -0,0 +1,142 @@
+"""
+Micro-batching of ``can_redeem()`` calls.
+
+Within one web request, several independent components often ask ``can_redeem()`` about the same
+subsidy, frequently with identical arguments.  ``CanRedeemBatcher`` collects those calls for a short
+window, deduplicates them, and then sends the distinct ones concurrently.  Each caller gets a future
+for its own result.
+
+The subsidy service has no batch ``can_redeem`` endpoint, so a batch costs as much wall time as its
+slowest call rather than the sum of all of them.
+
+With ``window=None``, calls are collected until ``flush()``, until the batcher is used as a context
+manager and exits, or until any caller asks a future for its result, whichever comes first.  That
+allows batching a whole request's calls without a timer.
+
+Batching only helps callers that ``submit()`` their calls and hold on to the futures: a synchronous
+``can_redeem()`` needs its answer straight away, so it sends its batch at once.  But a batcher also
+remembers every answer it got, for its whole lifetime, so it should be scoped to one web request: there,
+repeated identical calls, synchronous or not, are answered locally after the first.
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .client import DEFAULT_FAN_OUT_WORKERS
+
+DEFAULT_BATCH_WINDOW_SECONDS = 0.002
+
+
+class BatchedFuture(Future):
+    """
+    A future that flushes its batcher when its result is needed before the batch was sent.
+    """
+
+    def __init__(self, batcher):
+        super().__init__()
+        self._batcher = batcher
+
+    def result(self, timeout=None):
+        if not self.done():
+            self._batcher.flush()
+        return super().result(timeout)
+
+    def exception(self, timeout=None):
+        if not self.done():
+            self._batcher.flush()
+        return super().exception(timeout)
+
+
+class CanRedeemBatcher:
+    """
+    Collects ``can_redeem()`` calls and sends them in deduplicated, concurrent batches.
+
+    Args:
+        client: An ``EnterpriseSubsidyAPIClient`` (or V2) instance.
+        window (float): Seconds to collect calls for after the first one of a batch; None to
+            collect until the batch is needed, as described above.
+        max_workers (int): How many calls of a batch are in flight at once.
+    """
+
+    def __init__(self, client, window=DEFAULT_BATCH_WINDOW_SECONDS, max_workers=DEFAULT_FAN_OUT_WORKERS):
+        self.client = client
+        self.window = window
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='can-redeem-batch')
+        self._pending = {}
+        # Futures of calls already sent, by key: answers are reused for the batcher's lifetime.
+        self._sent = {}
+        self._timer = None
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'requests': 0, 'batches': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, subsidy_uuid, lms_user_id, content_key):
+        """
+        Adds a ``can_redeem()`` call to the current batch.
+
+        Returns:
+            BatchedFuture: Resolves to the ``can_redeem()`` response, or its exception.  Identical calls
+            share one future, within a batch and afterwards, unless the call failed.
+        """
+        key = (str(subsidy_uuid), str(lms_user_id), str(content_key))
+        with self._lock:
+            self.stats['calls'] += 1
+            future = self._sent.get(key) or self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = BatchedFuture(self)
+                if self.window is not None and self._timer is None:
+                    self._timer = threading.Timer(self.window, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+        return future
+
+    def can_redeem(self, subsidy_uuid, lms_user_id, content_key):
+        """
+        Same as ``client.can_redeem()``, but answered locally if the same call was already made through
+        this batcher.  Only batched with calls other threads submitted meanwhile, since it needs its
+        answer straight away.
+        """
+        return self.submit(subsidy_uuid, lms_user_id, content_key).result()
+
+    def _send(self, key, future):
+        """
+        Makes one batched ``can_redeem()`` call, on a worker thread, and resolves its future.
+        """
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(self.client.can_redeem(*key))
+        except Exception as exc:
+            # Failures aren't reused, so that a later identical call tries again.
+            with self._lock:
+                if self._sent.get(key) is future:
+                    del self._sent[key]
+            future.set_exception(exc)
+
+    def flush(self):
+        """
+        Sends the current batch now.  Doesn't wait for the responses.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not pending:
+                return
+            self.stats['batches'] += 1
+            self.stats['requests'] += len(pending)
+            self._sent.update(pending)
+        for key, future in pending.items():
+            self._executor.submit(self._send, key, future)
+
+    def close(self):
+        """
+        Sends any pending calls, waits for them, and stops the worker pool.
+        """
+        self.flush()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,217 @@
+"""
+Caching for the client's read path.
+
+A cache *backend* just stores JSON-serializable entries by string key, with a timeout.  The
+``StaleWhileRevalidateCache`` built on top of a backend decides, by entry age, whether a cached
+response can be served as is, served while being refreshed in the background, or must be refetched.
+
+Pass a ``StaleWhileRevalidateCache`` to the client constructor as ``read_cache`` to enable caching of
+``retrieve_subsidy()``, ``list_subsidies()`` and ``get_subsidy_content_data()``.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FRESH_TTL_SECONDS = 60
+DEFAULT_STALE_TTL_SECONDS = 600
+DEFAULT_STALE_IF_ERROR_SECONDS = 3600
+DEFAULT_MAX_ENTRIES = 10000
+
+
+class BaseCacheBackend:
+    """
+    Interface for a cache backend.  Entries are JSON-serializable dicts.
+    """
+
+    def get(self, key):
+        """
+        Returns the entry stored under ``key``, or None if it's missing or timed out.
+        """
+        raise NotImplementedError
+
+    def set(self, key, entry, timeout):
+        """
+        Stores ``entry`` under ``key`` for ``timeout`` seconds.
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        """
+        Removes ``key``, if present.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """
+        Removes every entry.
+        """
+        raise NotImplementedError
+
+
+class LocalMemoryCacheBackend(BaseCacheBackend):
+    """
+    A per-process, LRU-bounded, in-memory backend.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if time.time() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, timeout):
+        with self._lock:
+            self._set_locked(key, entry, timeout)
+
+    def _set_locked(self, key, entry, timeout):
+        """
+        ``set()``, for callers already holding ``_lock``.
+        """
+        self._entries[key] = (time.time() + timeout, entry)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _is_transient(exc):
+    """
+    Whether a ``requests`` error may go away on retry: no response at all, or a 5xx one.
+    """
+    response = getattr(exc, 'response', None)
+    return response is None or response.status_code >= 500
+
+
+class StaleWhileRevalidateCache:
+    """
+    Serves cached responses according to their age:
+
+    * younger than ``fresh_ttl``: served directly.
+    * younger than ``stale_ttl``: served immediately, and one background refresh is started.
+    * older than ``stale_ttl``: refetched, blocking the caller.  If that fetch fails, the stale
+      value is still served as long as it's younger than ``stale_if_error``.
+
+    Only transient errors (connection failures, timeouts, 5xx responses) fall back to stale values.  A 4xx
+    response such as a 404 or 403 is an answer, not an outage: it drops the cached value and is raised.
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        fresh_ttl=DEFAULT_FRESH_TTL_SECONDS,
+        stale_ttl=DEFAULT_STALE_TTL_SECONDS,
+        stale_if_error=DEFAULT_STALE_IF_ERROR_SECONDS,
+    ):
+        self.backend = backend if backend is not None else LocalMemoryCacheBackend()
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.stale_if_error = max(stale_if_error, stale_ttl)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'refresh_failures': 0,
+            'stale_if_error_hits': 0,
+        }
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _store(self, key, value):
+        self.backend.set(key, {'value': value, 'stored_at': time.time()}, self.stale_if_error)
+
+    def _background_refresh(self, key, fetch):
+        """
+        Runs in a background thread: refetches ``key`` and stores the result.
+
+        The stale value is kept after transient failures, and dropped after definitive ones.
+        """
+        try:
+            self._store(key, fetch())
+        except requests.exceptions.RequestException as exc:
+            self._count('refresh_failures')
+            if not _is_transient(exc):
+                self.backend.delete(key)
+            logger.warning('Background refresh of subsidy client cache key %s failed', key, exc_info=True)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _refresh_in_background(self, key, fetch):
+        """
+        Starts a background refresh of ``key``, unless one is already running.
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        threading.Thread(target=self._background_refresh, args=(key, fetch), daemon=True).start()
+
+    def get_or_fetch(self, key, fetch):
+        """
+        Returns the value cached for ``key``, calling ``fetch()`` to (re)populate it as described above.
+        """
+        entry = self.backend.get(key)
+        if entry is not None:
+            age = time.time() - entry['stored_at']
+            if age < self.fresh_ttl:
+                self._count('hits')
+                return entry['value']
+            if age < self.stale_ttl:
+                self._count('stale_hits')
+                self._refresh_in_background(key, fetch)
+                return entry['value']
+
+        self._count('misses')
+        try:
+            value = fetch()
+        except requests.exceptions.RequestException as exc:
+            if not _is_transient(exc):
+                if entry is not None:
+                    self.backend.delete(key)
+                raise
+            if entry is not None and time.time() - entry['stored_at'] < self.stale_if_error:
+                self._count('stale_if_error_hits')
+                logger.warning('Serving stale subsidy client cache entry for %s after a failed fetch', key)
+                return entry['value']
+            raise
+        self._store(key, value)
+        return value
+
+    def set(self, key, value):
+        """
+        Stores a value, e.g. when prewarming the cache.
+        """
+        self._store(key, value)
+
+    def invalidate(self, key):
+        """
+        Drops the cached value for ``key``.
+        """
+        self.backend.delete(key)
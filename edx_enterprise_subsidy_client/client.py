@@ -1,14 +1,66 @@
 """
 API client for interacting with the enterprise-subsidy service.
 """
+import hashlib
 import logging
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decimal import Decimal, InvalidOperation
 
 import requests
 from django.conf import settings
-from edx_rest_api_client.client import OAuthAPIClient
+
+from .auth import OAuthAPIClient
+from .exceptions import EnterpriseSubsidyAPIClientException
+from .log_events import current_attempt, get_request_failure_logger
+from .metrics import get_request_metrics
 
 logger = logging.getLogger(__name__)
 
+# Kinds of writes reported to listeners registered with ``add_write_listener()``.
+WRITE_TYPE_TRANSACTION = 'transaction'
+WRITE_TYPE_DEPOSIT = 'deposit'
+
+# Kinds of reads counted by ``warmup.HotKeyTracker``.
+HOT_KEY_SUBSIDY = 'subsidy'
+HOT_KEY_CONTENT_METADATA = 'content_metadata'
+
+# Query param used to ask list endpoints for only some fields of each record.
+FIELDS_PARAM = 'fields'
+
+# Default number of concurrent requests made by composite, multi-subsidy calls.
+DEFAULT_FAN_OUT_WORKERS = 8
+
+# Retries of writes rejected with a 429 because the subsidy's ledger was locked.
+LEDGER_LOCKED_MAX_ATTEMPTS = 5
+LEDGER_LOCKED_BACKOFF_SECONDS = 0.1
+
+# The field of the 422 the service answers with when a write's idempotency key was already used.
+IDEMPOTENCY_KEY_FIELD = 'idempotency_key'
+
+# Per-item statuses reported by ``create_subsidy_deposits()``.
+DEPOSIT_CREATED = 'created'
+DEPOSIT_ALREADY_EXISTS = 'already_exists'
+DEPOSIT_FAILED = 'failed'
+
+# The step of ``redeem()`` that decided its outcome.
+DECIDED_BY_CAN_REDEEM = 'can_redeem'
+DECIDED_BY_EXISTING_TRANSACTION = 'existing_transaction'
+DECIDED_BY_TRANSACTION = 'transaction'
+
+RedemptionOutcome = namedtuple(
+    'RedemptionOutcome',
+    ['redeemed', 'decided_by', 'transaction', 'can_redeem', 'content_metadata', 'error'],
+)
+RedemptionOutcome.__doc__ = """
+The result of ``EnterpriseSubsidyAPIClientV2.redeem()``.
+
+``redeemed`` is True if the learner holds a transaction for the content, new or existing; ``decided_by``
+is the ``DECIDED_BY_*`` step that settled it, and ``error`` the service's reason if a create was rejected.
+"""
+
 
 class TransactionStateChoices:
     """
@@ -28,25 +80,125 @@ class TransactionStateChoices:
     }
 
 
-class EnterpriseSubsidyAPIClientException(Exception):
-    """
-    A general exception to represent non-http errors
-    arising during Subsidy API client usage.
-    """
-
-
-def get_enterprise_subsidy_api_client(version=1):
+def get_enterprise_subsidy_api_client(version=1, **kwargs):
     """
-    Helper to get a versioned client.
+    Helper to get a versioned client.  Any kwargs are passed through to the client constructor.
     """
     assert version in [1, 2]
     if version == 1:
-        return EnterpriseSubsidyAPIClient()
+        return EnterpriseSubsidyAPIClient(**kwargs)
     if version == 2:
-        return EnterpriseSubsidyAPIClientV2()
+        return EnterpriseSubsidyAPIClientV2(**kwargs)
     raise EnterpriseSubsidyAPIClientException(f'{version} is not a valid version!')
 
 
+def project_fields(response_data, fields):
+    """
+    Trims records down to the given fields.
+
+    Accepts a list of records, or a paginated response whose ``results`` are records; anything else
+    is returned untouched.  With no ``fields``, or if the service already honoured them (judging by the
+    first record), the data is returned as is.
+    """
+    if not fields:
+        return response_data
+    fields = set(fields)
+
+    def project(records):
+        if records and isinstance(records[0], dict) and records[0].keys() <= fields:
+            return records
+        return [
+            {field: value for field, value in record.items() if field in fields} if isinstance(record, dict) else record
+            for record in records
+        ]
+
+    if isinstance(response_data, list):
+        return project(response_data)
+    if isinstance(response_data, dict) and isinstance(response_data.get('results'), list):
+        return dict(response_data, results=project(response_data['results']))
+    return response_data
+
+
+def retry_on_ledger_lock(
+    request, max_attempts=LEDGER_LOCKED_MAX_ATTEMPTS, backoff=LEDGER_LOCKED_BACKOFF_SECONDS,
+):
+    """
+    Returns ``request()``, retrying it while it fails with a 429 because the ledger was locked.
+
+    Waits for the response's ``Retry-After`` seconds if given, else an exponential, jittered backoff.
+    The last 429 is re-raised once ``max_attempts`` are used up.
+    """
+    for attempt in range(1, max_attempts + 1):
+        token = current_attempt.set(attempt)
+        try:
+            return request()
+        except requests.exceptions.HTTPError as exc:
+            response = exc.response
+            if response is None or response.status_code != 429 or attempt == max_attempts:
+                raise
+            try:
+                delay = float(response.headers.get('Retry-After'))
+            except (TypeError, ValueError):
+                delay = backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            logger.info('Subsidy ledger locked, retrying in %.2fs (attempt %s of %s)', delay, attempt, max_attempts)
+            time.sleep(delay)
+        finally:
+            current_attempt.reset(token)
+    return None  # unreachable
+
+
+def is_duplicate_idempotency_key(response):
+    """
+    Whether a failed write's response says that a write with the same idempotency key already exists.
+
+    The service rejects those with a 422 whose JSON body holds an ``idempotency_key`` field error.
+    """
+    if response is None or response.status_code != 422:
+        return False
+    try:
+        response_data = response.json()
+    except ValueError:
+        return False
+    return isinstance(response_data, dict) and IDEMPOTENCY_KEY_FIELD in response_data
+
+
+def price_in_cents(content_price):
+    """
+    Converts a content metadata ``content_price``, a decimal string in dollars such as ``'149.00'``, to cents.
+    """
+    try:
+        return int(Decimal(str(content_price)) * 100)
+    except InvalidOperation:
+        return None
+
+
+def get_api_base_url(base_url=None):
+    """
+    Returns the ``.../api/`` root for the given service base url, defaulting to ``settings.ENTERPRISE_SUBSIDY_URL``.
+    """
+    if base_url is None:
+        base_url = settings.ENTERPRISE_SUBSIDY_URL
+    return base_url.strip('/') + '/api/'
+
+
+class EndpointURL:
+    """
+    Descriptor for an endpoint URL relative to a client's API base url.
+
+    Accessed on an instance, the URL is built from that instance's ``api_base_url``.
+    Accessed on the class itself (e.g. ``EnterpriseSubsidyAPIClient.SUBSIDIES_ENDPOINT``), it
+    falls back to ``settings.ENTERPRISE_SUBSIDY_URL``, which is only read at that point, never at import time.
+    """
+
+    def __init__(self, path=''):
+        self.path = path
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return get_api_base_url() + self.path
+        return instance.api_base_url + self.path
+
+
 class EnterpriseSubsidyAPIClient:
     """
     API client for calls to the enterprise-subsidy service.
@@ -56,22 +208,128 @@ class EnterpriseSubsidyAPIClient:
     BACKEND_SERVICE_EDX_OAUTH2_KEY=your-services-application-key
     BACKEND_SERVICE_EDX_OAUTH2_SECRET=your-services-application-secret
     ENTERPRISE_SUBSIDY_URL=enterprise-subsidy-service-base-url
+
+    Any of these may instead be passed explicitly to the constructor, in which case
+    the corresponding Django setting is never read.  This allows talking to several
+    subsidy service environments from a single process.
     """
-    API_BASE_URL = settings.ENTERPRISE_SUBSIDY_URL.strip('/') + '/api/'
-    V1_BASE_URL = API_BASE_URL + 'v1/'
-    SUBSIDIES_ENDPOINT = V1_BASE_URL + 'subsidies/'
-    TRANSACTIONS_ENDPOINT = V1_BASE_URL + 'transactions/'
-    CONTENT_METADATA_ENDPOINT = V1_BASE_URL + 'content-metadata/'
+    API_BASE_URL = EndpointURL()
+    V1_BASE_URL = EndpointURL('v1/')
+    SUBSIDIES_ENDPOINT = EndpointURL('v1/subsidies/')
+    TRANSACTIONS_ENDPOINT = EndpointURL('v1/transactions/')
+    CONTENT_METADATA_ENDPOINT = EndpointURL('v1/content-metadata/')
+    # Prefixes the names transaction endpoints are recorded under in ``metrics``.
+    API_VERSION = 'v1'
 
-    def __init__(self):
+    def __init__(
+        self, base_url=None, oauth2_provider_url=None, client_id=None, client_secret=None, read_cache=None,
+        http2=False, negative_cache=None, metrics=None, profiler=None, failure_logger=None,
+    ):
         """
         Initializes the OAuthAPIClient instance.
+
+        Args:
+            base_url (str): Base url of the enterprise-subsidy service, defaults to ``settings.ENTERPRISE_SUBSIDY_URL``.
+            oauth2_provider_url (str): Defaults to ``settings.OAUTH2_PROVIDER_URL``.
+            client_id (str): Defaults to ``settings.BACKEND_SERVICE_EDX_OAUTH2_KEY``.
+            client_secret (str): Defaults to ``settings.BACKEND_SERVICE_EDX_OAUTH2_SECRET``.
+            read_cache (cache.StaleWhileRevalidateCache): Optional cache for ``retrieve_subsidy()``,
+                ``list_subsidies()`` and ``get_subsidy_content_data()`` responses.
+            http2 (bool): Send requests over the HTTP/2 transport in ``http2.py``, multiplexing concurrent
+                calls over a few connections.  Requires the optional ``httpx[http2]`` package.
+            negative_cache (negative_cache.NegativeCache): Optional cache of "no" answers from ``can_redeem()``
+                and ``get_subsidy_content_data()``; deposits made through this client invalidate it.
+            metrics (metrics.RequestMetrics): Where to record per-endpoint latencies and errors; defaults to the
+                process-wide registry shown by ``views.subsidy_client_metrics``.
+            profiler (profiling.RequestProfiler): Optional profiler of a sample of this client's requests.
+            failure_logger (log_events.RequestFailureLogger): Where to log failed requests; defaults to the
+                process-wide, rate-limited logger.
         """
+        self.api_base_url = get_api_base_url(base_url)
         self.client = OAuthAPIClient(
-            settings.OAUTH2_PROVIDER_URL,
-            settings.BACKEND_SERVICE_EDX_OAUTH2_KEY,
-            settings.BACKEND_SERVICE_EDX_OAUTH2_SECRET,
+            oauth2_provider_url if oauth2_provider_url is not None else settings.OAUTH2_PROVIDER_URL,
+            client_id if client_id is not None else settings.BACKEND_SERVICE_EDX_OAUTH2_KEY,
+            client_secret if client_secret is not None else settings.BACKEND_SERVICE_EDX_OAUTH2_SECRET,
         )
+        if http2:
+            from .http2 import mount_http2  # pylint: disable=import-outside-toplevel
+            mount_http2(self.client)
+        self._write_listeners = []
+        self.read_cache = read_cache
+        self.negative_cache = negative_cache
+        self.metrics = metrics if metrics is not None else get_request_metrics()
+        self.profiler = profiler
+        self.failure_logger = failure_logger if failure_logger is not None else get_request_failure_logger()
+        # Set by ``warmup.track_hot_keys()`` to count reads worth prewarming after a restart.
+        self.hot_keys = None
+        if negative_cache is not None:
+            self.add_write_listener(negative_cache.on_write)
+
+    def _cached_read(self, key, fetch):
+        """
+        Returns ``fetch()``, via the read cache if one is configured.  Keys are namespaced by service url.
+        """
+        if self.read_cache is None:
+            return fetch()
+        return self.read_cache.get_or_fetch(f'{self.api_base_url}|{key}', fetch)
+
+    def _request(self, endpoint_name, method, url, subsidy_uuid=None, **kwargs):
+        """
+        Makes a request through the OAuth session, recording its latency and status under ``endpoint_name``.
+
+        Failed requests (an error status, or an exception instead of a response) are also logged, tagged
+        with ``subsidy_uuid``, through the rate-limited ``failure_logger``.
+        """
+        started_at = time.perf_counter()
+        status_code = None
+        error = None
+        try:
+            if self.profiler is not None and self.profiler.should_sample(endpoint_name):
+                response = self.profiler.profile(endpoint_name, lambda: getattr(self.client, method)(url, **kwargs))
+            else:
+                response = getattr(self.client, method)(url, **kwargs)
+            status_code = getattr(response, 'status_code', None)
+            return response
+        except Exception as exc:
+            error = exc
+            raise
+        finally:
+            elapsed = time.perf_counter() - started_at
+            self.metrics.record(endpoint_name, elapsed, status_code)
+            if status_code is None or status_code >= 400:
+                self.failure_logger.request_failed(
+                    endpoint_name, status_code, elapsed, subsidy_uuid=subsidy_uuid, error=error,
+                )
+
+    def _record_hot_key(self, kind, *args):
+        if self.hot_keys is not None:
+            self.hot_keys.record(kind, *args)
+
+    def add_write_listener(self, listener):
+        """
+        Registers a callable to be notified of every successful write made through this client.
+
+        The listener is called as ``listener(write_type, subsidy_uuid, response_data)``, where ``write_type``
+        is one of ``WRITE_TYPE_TRANSACTION`` or ``WRITE_TYPE_DEPOSIT``.  Local indexes and caches use this
+        to stay up to date with the client's own writes without refetching.
+        """
+        self._write_listeners.append(listener)
+
+    def remove_write_listener(self, listener):
+        """
+        Unregisters a listener added with ``add_write_listener()``.
+        """
+        self._write_listeners.remove(listener)
+
+    def _notify_write(self, write_type, subsidy_uuid, response_data):
+        """
+        Calls every write listener.  A failing listener is logged, and never fails the write.
+        """
+        for listener in list(self._write_listeners):
+            try:
+                listener(write_type, str(subsidy_uuid), response_data)
+            except Exception:
+                logger.exception('Subsidy client write listener %r failed', listener)
 
     def get_subsidy_aggregates_by_learner_url(self, subsidy_uuid):
         """
@@ -79,13 +337,14 @@ class EnterpriseSubsidyAPIClient:
         """
         return f"{self.SUBSIDIES_ENDPOINT}{subsidy_uuid}/aggregates-by-learner"
 
-    def get_subsidy_aggregates_by_learner_data(self, subsidy_uuid, policy_uuid=None):
+    def get_subsidy_aggregates_by_learner_data(self, subsidy_uuid, policy_uuid=None, fields=None):
         """
         Client method to fetch subsidy specific learner aggregate data.
 
         Args:
             subsidy_uuid (str): Subsidy record UUID
             policy_uuid (string): Optional param to filter subsidy aggregate data by subsidy access policy UUID
+            fields (list): Optional list of fields to request and return for each record
         Returns:
             json subsidy learner aggregate data response:
                 [{
@@ -96,17 +355,14 @@ class EnterpriseSubsidyAPIClient:
         url = self.get_subsidy_aggregates_by_learner_url(subsidy_uuid)
         if policy_uuid:
             url += f"?subsidy_access_policy_uuid={policy_uuid}"
-        try:
-            resp = self.client.get(url)
-            response_data = resp
-            resp.raise_for_status()
-        except requests.exceptions.HTTPError as exc:
-            logger.exception(
-                f'Subsidy client failed to fetch aggregate data for {subsidy_uuid} '
-                f'and policy: {policy_uuid}'
+        if fields:
+            resp = self._request(
+                'learner_aggregates', 'get', url, subsidy_uuid=subsidy_uuid, params={FIELDS_PARAM: ','.join(fields)},
             )
-            raise exc
-        return response_data.json()
+        else:
+            resp = self._request('learner_aggregates', 'get', url, subsidy_uuid=subsidy_uuid)
+        resp.raise_for_status()
+        return project_fields(resp.json(), fields)
 
     def get_content_metadata_url(self, content_identifier):
         """Helper method to generate the subsidy service metadata API url, with a trailing slash."""
@@ -128,27 +384,42 @@ class EnterpriseSubsidyAPIClient:
                     'content_price': '149.00'
                 }
         """
+        self._record_hot_key(HOT_KEY_CONTENT_METADATA, str(enterprise_customer_uuid), content_identifier)
+        key = f'content-metadata:{enterprise_customer_uuid}:{content_identifier}'
+        if self.negative_cache is None:
+            return self._cached_read(
+                key, lambda: self._fetch_subsidy_content_data(enterprise_customer_uuid, content_identifier),
+            )
+
+        negative_key = f'{self.api_base_url}|{key}'
+        self.negative_cache.raise_for_error(negative_key, self.get_content_metadata_url(content_identifier))
         try:
-            resp = self.client.get(
-                self.get_content_metadata_url(content_identifier),
-                params={'enterprise_customer_uuid': enterprise_customer_uuid}
+            return self._cached_read(
+                key, lambda: self._fetch_subsidy_content_data(enterprise_customer_uuid, content_identifier),
             )
-            response_data = resp
-            resp.raise_for_status()
         except requests.exceptions.HTTPError as exc:
-            logger.exception(
-                f'Subsidy client failed to fetch content metadata for {content_identifier} '
-                f'in customer {enterprise_customer_uuid}'
-            )
-            raise exc
-        return response_data.json()
+            self.negative_cache.set_error(negative_key, exc.response)
+            raise
+
+    def _fetch_subsidy_content_data(self, enterprise_customer_uuid, content_identifier):
+        """
+        Fetches the content metadata for ``content_identifier`` from the subsidy service, bypassing the caches.
+        """
+        resp = self._request(
+            'content_metadata', 'get',
+            self.get_content_metadata_url(content_identifier),
+            params={'enterprise_customer_uuid': enterprise_customer_uuid}
+        )
+        resp.raise_for_status()
+        return resp.json()
 
-    def list_subsidies(self, enterprise_customer_uuid, **kwargs):
+    def list_subsidies(self, enterprise_customer_uuid, fields=None, **kwargs):
         """
         Client method to list enterprise subsidy records for the given enterprise_customer_uuid.
 
         Args:
             enterprise_customer_uuid (str): Enterprise customer UUID
+            fields (list): Optional list of fields to request and return for each subsidy record
         Returns:
             Paginated response of serialized Subsidy records:
             ```
@@ -174,34 +445,126 @@ class EnterpriseSubsidyAPIClient:
         """
         query_params = {'enterprise_customer_uuid': enterprise_customer_uuid}
         query_params.update(kwargs)
-        response = self.client.get(
-            self.SUBSIDIES_ENDPOINT,
-            params=query_params,
-        )
-        response.raise_for_status()
-        return response.json()
+        if fields:
+            query_params[FIELDS_PARAM] = ','.join(fields)
+
+        def fetch():
+            response = self._request(
+                'subsidies.list', 'get',
+                self.SUBSIDIES_ENDPOINT,
+                params=query_params,
+            )
+            response.raise_for_status()
+            return project_fields(response.json(), fields)
+
+        return self._cached_read(f'subsidies:{sorted(query_params.items())}', fetch)
+
+    def iter_subsidies(self, enterprise_customer_uuid, **kwargs):
+        """
+        Yields every subsidy record for the given enterprise customer, across all pages of ``list_subsidies()``.
+        """
+        page = 1
+        while True:
+            response_data = self.list_subsidies(enterprise_customer_uuid, page=page, **kwargs)
+            yield from response_data.get('results', [])
+            if not response_data.get('next'):
+                return
+            page += 1
+
+    def get_enterprise_subsidies_overview(
+        self, enterprise_customer_uuid, max_workers=DEFAULT_FAN_OUT_WORKERS, include_learner_aggregates=True,
+    ):
+        """
+        Fetches details, transaction aggregates and learner aggregates for all of a customer's subsidies, concurrently.
+
+        Up to ``max_workers`` requests are in flight at once, so the total time is roughly that of the
+        slowest subsidy rather than the sum of all of them.  A failure fetching any one part for a subsidy
+        is recorded in that subsidy's ``errors`` and doesn't affect the other parts or subsidies.
+
+        Returns:
+            {
+                'enterprise_customer_uuid': '...',
+                'subsidies': [
+                    {
+                        'uuid': '...',
+                        'subsidy': {...} or None,                       # retrieve_subsidy()
+                        'aggregates': {...} or None,                    # list_subsidy_transactions() aggregates
+                        'learner_aggregates': [...] or None,            # get_subsidy_aggregates_by_learner_data()
+                        'errors': {'aggregates': {'status_code': 503, 'message': '...'}, ...},
+                    },
+                    ...
+                ],
+            }
+        """
+        subsidy_uuids = [str(subsidy['uuid']) for subsidy in self.iter_subsidies(enterprise_customer_uuid)]
+        parts = {
+            'subsidy': self.retrieve_subsidy,
+            'aggregates': lambda subsidy_uuid: self.list_subsidy_transactions(
+                subsidy_uuid, include_aggregates=True, page_size=1,
+            ).get('aggregates'),
+        }
+        if include_learner_aggregates:
+            parts['learner_aggregates'] = self.get_subsidy_aggregates_by_learner_data
+
+        overview = {
+            subsidy_uuid: dict({part: None for part in parts}, uuid=subsidy_uuid, errors={})
+            for subsidy_uuid in subsidy_uuids
+        }
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(fetch, subsidy_uuid): (subsidy_uuid, part)
+                for subsidy_uuid in subsidy_uuids
+                for part, fetch in parts.items()
+            }
+            for future in as_completed(futures):
+                subsidy_uuid, part = futures[future]
+                try:
+                    overview[subsidy_uuid][part] = future.result()
+                except requests.exceptions.RequestException as exc:
+                    logger.warning(
+                        'Subsidy client failed to fetch %s for subsidy %s: %s', part, subsidy_uuid, exc,
+                    )
+                    overview[subsidy_uuid]['errors'][part] = {
+                        'status_code': getattr(exc.response, 'status_code', None),
+                        'message': str(exc),
+                    }
+        return {
+            'enterprise_customer_uuid': str(enterprise_customer_uuid),
+            'subsidies': [overview[subsidy_uuid] for subsidy_uuid in subsidy_uuids],
+        }
 
     def retrieve_subsidy(self, subsidy_uuid):
         """
         TODO: add docstring.
         """
-        response = self.client.get(
-            self.SUBSIDIES_ENDPOINT + f'{subsidy_uuid}/'
-        )
-        response.raise_for_status()
-        return response.json()
+        def fetch():
+            response = self._request(
+                'subsidies.retrieve', 'get',
+                self.SUBSIDIES_ENDPOINT + f'{subsidy_uuid}/',
+                subsidy_uuid=subsidy_uuid,
+            )
+            response.raise_for_status()
+            return response.json()
+
+        self._record_hot_key(HOT_KEY_SUBSIDY, str(subsidy_uuid))
+        return self._cached_read(f'subsidy:{subsidy_uuid}', fetch)
 
     def list_subsidy_transactions(
         self, subsidy_uuid, include_aggregates=True,
         lms_user_id=None, content_key=None,
-        subsidy_access_policy_uuid=None,
+        subsidy_access_policy_uuid=None, *, fields=None,
         **kwargs
     ):
         """
-        TODO: add docstring.
+        List transactions in a subsidy, optionally filtered to a learner, content key or policy.
+
+        Pass ``fields`` (e.g. ``['uuid', 'state', 'quantity', 'lms_user_id']``) to request, and return,
+        only those fields of each transaction.
         """
         query_params = {'subsidy_uuid': subsidy_uuid}
         query_params.update(kwargs)
+        if fields:
+            query_params[FIELDS_PARAM] = ','.join(fields)
         if include_aggregates:
             query_params['include_aggregates'] = include_aggregates
         if lms_user_id:
@@ -211,18 +574,44 @@ class EnterpriseSubsidyAPIClient:
         if subsidy_access_policy_uuid:
             query_params['subsidy_access_policy_uuid'] = str(subsidy_access_policy_uuid)
 
-        response = self.client.get(
+        response = self._request(
+            'v1.transactions.list', 'get',
             self.TRANSACTIONS_ENDPOINT,
+            subsidy_uuid=subsidy_uuid,
             params=query_params,
         )
         response.raise_for_status()
-        return response.json()
+        return project_fields(response.json(), fields)
+
+    def iter_subsidy_transaction_pages(self, subsidy_uuid, **kwargs):
+        """
+        Streams every page of transactions in a subsidy, following the ``next`` links of the paginated response.
+
+        Only one page is held in memory at a time.  Accepts the same filtering kwargs as
+        ``list_subsidy_transactions()``; aggregates are not requested, since they're identical on every page.
+
+        Yields:
+            list: The ``results`` of each page, in order.
+        """
+        kwargs.setdefault('include_aggregates', False)
+        response_data = self.list_subsidy_transactions(subsidy_uuid, **kwargs)
+        while True:
+            yield response_data.get('results') or []
+            next_url = response_data.get('next')
+            if not next_url:
+                return
+            response = self._request(
+                f'{self.API_VERSION}.transactions.list', 'get', next_url, subsidy_uuid=subsidy_uuid,
+            )
+            response.raise_for_status()
+            response_data = project_fields(response.json(), kwargs.get('fields'))
 
     def retrieve_subsidy_transaction(self, transaction_uuid):
         """
         TODO: add docstring.
         """
-        response = self.client.get(
+        response = self._request(
+            'v1.transactions.retrieve', 'get',
             self.TRANSACTIONS_ENDPOINT + f'{transaction_uuid}/'
         )
         response.raise_for_status()
@@ -249,12 +638,16 @@ class EnterpriseSubsidyAPIClient:
         }
         if idempotency_key:
             request_payload['idempotency_key'] = idempotency_key
-        response = self.client.post(
+        response = self._request(
+            'v1.transactions.create', 'post',
             self.TRANSACTIONS_ENDPOINT,
+            subsidy_uuid=subsidy_uuid,
             json=request_payload,
         )
         response.raise_for_status()
-        return response.json()
+        response_data = response.json()
+        self._notify_write(WRITE_TYPE_TRANSACTION, subsidy_uuid, response_data)
+        return response_data
 
     def reverse_subsidy_transaction(self, subsidy_uuid, transaction_uuid):
         """
@@ -266,16 +659,30 @@ class EnterpriseSubsidyAPIClient:
         """
         TODO: add docstring.
         """
+        negative_key = f'{self.api_base_url}|can_redeem:{subsidy_uuid}:{lms_user_id}:{content_key}'
+        if self.negative_cache is not None:
+            answer = self.negative_cache.get(negative_key, subsidy_uuid=subsidy_uuid)
+            if answer is not None:
+                return answer
+
         query_params = {
             'lms_user_id': lms_user_id,
             'content_key': content_key,
         }
-        response = self.client.get(
+        response = self._request(
+            'can_redeem', 'get',
             self.SUBSIDIES_ENDPOINT + f'{subsidy_uuid}/can_redeem/',
+            subsidy_uuid=subsidy_uuid,
             params=query_params,
         )
         response.raise_for_status()
-        return response.json()
+        response_data = response.json()
+        if (
+            self.negative_cache is not None and not response_data.get('can_redeem')
+            and not response_data.get('existing_transaction')
+        ):
+            self.negative_cache.set(negative_key, response_data, subsidy_uuid=subsidy_uuid)
+        return response_data
 
 
 class EnterpriseSubsidyAPIClientV2(EnterpriseSubsidyAPIClient):  # pylint: disable=abstract-method
@@ -289,18 +696,22 @@ class EnterpriseSubsidyAPIClientV2(EnterpriseSubsidyAPIClient):  # pylint: disab
     BACKEND_SERVICE_EDX_OAUTH2_SECRET=your-services-application-secret
     ENTERPRISE_SUBSIDY_URL=enterprise-subsidy-service-base-url
     """
-    V2_BASE_URL = EnterpriseSubsidyAPIClient.API_BASE_URL + 'v2/'
-    TRANSACTIONS_LIST_ENDPOINT = V2_BASE_URL + 'subsidies/{subsidy_uuid}/admin/transactions/'
-    DEPOSITS_CREATE_ENDPOINT = V2_BASE_URL + 'subsidies/{subsidy_uuid}/admin/deposits/'
+    V2_BASE_URL = EndpointURL('v2/')
+    API_VERSION = 'v2'
+    TRANSACTIONS_LIST_ENDPOINT = EndpointURL('v2/subsidies/{subsidy_uuid}/admin/transactions/')
+    DEPOSITS_CREATE_ENDPOINT = EndpointURL('v2/subsidies/{subsidy_uuid}/admin/deposits/')
 
     def list_subsidy_transactions(
         self, subsidy_uuid, include_aggregates=True,
         lms_user_id=None, content_key=None,
-        subsidy_access_policy_uuid=None, transaction_states=None,
+        subsidy_access_policy_uuid=None, transaction_states=None, *, fields=None,
         **kwargs,
     ):
         """
         List transactions in a subsidy with admin- or operator-level permissions.
+
+        Pass ``fields`` (e.g. ``['uuid', 'state', 'quantity', 'lms_user_id']``) to request, and return,
+        only those fields of each transaction.
         """
         query_params = {
             'state': [
@@ -324,13 +735,17 @@ class EnterpriseSubsidyAPIClientV2(EnterpriseSubsidyAPIClient):  # pylint: disab
                 if state in TransactionStateChoices.VALID_CHOICES
             ]
             query_params['state'] = valid_states
+        if fields:
+            query_params[FIELDS_PARAM] = ','.join(fields)
 
-        response = self.client.get(
+        response = self._request(
+            'v2.transactions.list', 'get',
             self.TRANSACTIONS_LIST_ENDPOINT.format(subsidy_uuid=subsidy_uuid),
+            subsidy_uuid=subsidy_uuid,
             params=query_params,
         )
         response.raise_for_status()
-        return response.json()
+        return project_fields(response.json(), fields)
 
     def create_subsidy_transaction(
         self,
@@ -365,12 +780,16 @@ class EnterpriseSubsidyAPIClientV2(EnterpriseSubsidyAPIClient):  # pylint: disab
             request_payload['idempotency_key'] = idempotency_key
         if requested_price_cents is not None:
             request_payload['requested_price_cents'] = requested_price_cents
-        response = self.client.post(
+        response = self._request(
+            'v2.transactions.create', 'post',
             self.TRANSACTIONS_LIST_ENDPOINT.format(subsidy_uuid=subsidy_uuid),
+            subsidy_uuid=subsidy_uuid,
             json=request_payload,
         )
         response.raise_for_status()
-        return response.json()
+        response_data = response.json()
+        self._notify_write(WRITE_TYPE_TRANSACTION, subsidy_uuid, response_data)
+        return response_data
 
     def create_subsidy_deposit(
         self,
@@ -405,9 +824,225 @@ class EnterpriseSubsidyAPIClientV2(EnterpriseSubsidyAPIClient):  # pylint: disab
             request_payload['metadata'] = metadata
         if idempotency_key is not None:
             request_payload['idempotency_key'] = idempotency_key
-        response = self.client.post(
+        response = self._request(
+            'v2.deposits.create', 'post',
             self.DEPOSITS_CREATE_ENDPOINT.format(subsidy_uuid=subsidy_uuid),
+            subsidy_uuid=subsidy_uuid,
             json=request_payload,
         )
         response.raise_for_status()
-        return response.json()
+        response_data = response.json()
+        self._notify_write(WRITE_TYPE_DEPOSIT, subsidy_uuid, response_data)
+        return response_data
+
+    @staticmethod
+    def deposit_idempotency_key(subsidy_uuid, sales_contract_reference_provider, sales_contract_reference_id):
+        """
+        Returns a stable idempotency key for a sales contract's deposit into a subsidy.
+
+        The quantity is deliberately left out, so re-running a bulk deposit with a corrected quantity
+        still can't deposit twice for the same contract.
+        """
+        digest = hashlib.sha256(
+            f'{subsidy_uuid}|{sales_contract_reference_provider}|{sales_contract_reference_id}'.encode('utf8')
+        ).hexdigest()
+        return f'deposit-{digest[:32]}'
+
+    def _create_deposits_in_subsidy(self, deposits):
+        """
+        Creates the given deposits, all into the same subsidy, one at a time.
+        """
+        results = []
+        for deposit in deposits:
+            deposit = dict(deposit)
+            subsidy_uuid = deposit['subsidy_uuid']
+            deposit.setdefault('idempotency_key', self.deposit_idempotency_key(
+                subsidy_uuid, deposit['sales_contract_reference_provider'], deposit['sales_contract_reference_id'],
+            ))
+            result = {'subsidy_uuid': str(subsidy_uuid), 'idempotency_key': deposit['idempotency_key']}
+            try:
+                result['deposit'] = retry_on_ledger_lock(lambda deposit=deposit: self.create_subsidy_deposit(**deposit))
+                result['status'] = DEPOSIT_CREATED
+            except requests.exceptions.RequestException as exc:
+                # Timeouts and connection errors fail only this deposit: the rest still go ahead.
+                response = exc.response
+                if is_duplicate_idempotency_key(response):
+                    result['status'] = DEPOSIT_ALREADY_EXISTS
+                else:
+                    logger.warning('Subsidy client failed to create a deposit in subsidy %s: %s', subsidy_uuid, exc)
+                    result['status'] = DEPOSIT_FAILED
+                    result['error'] = {'status_code': getattr(response, 'status_code', None), 'message': str(exc)}
+            results.append(result)
+        return results
+
+    def create_subsidy_deposits(self, deposits, max_workers=DEFAULT_FAN_OUT_WORKERS):
+        """
+        Creates many deposits, e.g. to top up every subsidy of a renewed contract.
+
+        Deposits into different subsidies are submitted concurrently, while deposits into the same
+        subsidy are submitted one after the other, since they'd contend for the same ledger lock anyway.
+        Every deposit gets an idempotency key derived by ``deposit_idempotency_key()`` unless one is
+        given, and is retried while the ledger is locked, so re-running the same list is safe: deposits
+        that already exist are reported as ``DEPOSIT_ALREADY_EXISTS``.
+
+        Args:
+            deposits (list): Dicts of ``create_subsidy_deposit()`` kwargs: ``subsidy_uuid``,
+                ``desired_deposit_quantity``, ``sales_contract_reference_id``,
+                ``sales_contract_reference_provider`` and optionally ``metadata`` and ``idempotency_key``.
+
+        Returns:
+            list: One dict per deposit, in the given order: ``{'subsidy_uuid', 'idempotency_key', 'status'}``
+            plus ``deposit`` (the created deposit) or ``error`` (``{'status_code', 'message'}``, with no
+            ``status_code`` for timeouts and connection errors).  A deposit that timed out may still have been
+            created; re-running it with the same idempotency key is safe.
+        """
+        positions_by_subsidy = {}
+        for position, deposit in enumerate(deposits):
+            positions_by_subsidy.setdefault(str(deposit['subsidy_uuid']), []).append(position)
+
+        results_by_position = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self._create_deposits_in_subsidy, [deposits[position] for position in positions]):
+                positions
+                for positions in positions_by_subsidy.values()
+            }
+            for future in as_completed(futures):
+                results_by_position.update(zip(futures[future], future.result()))
+        return [results_by_position[position] for position in range(len(deposits))]
+
+    @staticmethod
+    def redemption_idempotency_key(
+        subsidy_uuid, subsidy_access_policy_uuid, lms_user_id, content_key, historical_redemption_uuids=None,
+    ):
+        """
+        Returns a stable idempotency key for one learner redeeming one piece of content via one policy.
+
+        Retrying a redemption, from any process, therefore never creates a second transaction.  The
+        uuids of the learner's earlier, failed or reversed, transactions for the content are part of the
+        key, so redeeming the content again after one of those gets a new key.
+        """
+        parts = [subsidy_uuid, subsidy_access_policy_uuid, lms_user_id, content_key]
+        if historical_redemption_uuids:
+            parts += sorted(str(redemption_uuid) for redemption_uuid in historical_redemption_uuids)
+        digest = hashlib.sha256('|'.join(str(part) for part in parts).encode('utf8')).hexdigest()
+        return f'redeem-{digest[:32]}'
+
+    def historical_redemption_uuids(self, subsidy_uuid, subsidy_access_policy_uuid, lms_user_id, content_key):
+        """
+        Returns the uuids of the learner's failed or reversed transactions for the content, via the policy.
+        """
+        redemption_uuids = []
+        for transactions in self.iter_subsidy_transaction_pages(
+            subsidy_uuid,
+            lms_user_id=lms_user_id,
+            content_key=content_key,
+            subsidy_access_policy_uuid=subsidy_access_policy_uuid,
+            transaction_states=[TransactionStateChoices.COMMITTED, TransactionStateChoices.FAILED],
+            fields=['uuid', 'state', 'reversal'],
+        ):
+            redemption_uuids += [
+                transaction['uuid'] for transaction in transactions
+                if transaction.get('state') == TransactionStateChoices.FAILED or transaction.get('reversal')
+            ]
+        return redemption_uuids
+
+    def redeem(
+        self,
+        subsidy_uuid,
+        enterprise_customer_uuid,
+        lms_user_id,
+        content_key,
+        subsidy_access_policy_uuid,
+        metadata=None,
+        idempotency_key=None,
+        requested_price_cents=None,
+    ):
+        """
+        Redeems content for a learner: checks ``can_redeem()``, then creates the transaction.
+
+        The eligibility check and the content metadata read are made concurrently.  If the learner is
+        eligible, the transaction is created with the content price those reads returned (unless
+        ``requested_price_cents`` is given), an idempotency key derived by ``redemption_idempotency_key()``
+        from the learner's ``historical_redemption_uuids()`` (unless one is given), and retries while the
+        ledger is locked.
+
+        Returns:
+            RedemptionOutcome: ``decided_by`` is ``DECIDED_BY_CAN_REDEEM`` if the learner can't redeem,
+            ``DECIDED_BY_EXISTING_TRANSACTION`` if they already hold a transaction for the content, and
+            ``DECIDED_BY_TRANSACTION`` if a create was attempted; ``redeemed`` is False if it was rejected
+            with a 422.
+
+        Raises:
+            requests.exceptions.HTTPError: For any other error, or if the ledger stayed locked.
+        """
+        # Not a context manager: an ineligible learner shouldn't wait for the metadata read to finish.
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            content_metadata_future = executor.submit(
+                self.get_subsidy_content_data, enterprise_customer_uuid, content_key,
+            )
+            history_future = None
+            if idempotency_key is None:
+                history_future = executor.submit(
+                    self.historical_redemption_uuids,
+                    subsidy_uuid, subsidy_access_policy_uuid, lms_user_id, content_key,
+                )
+            can_redeem_data = self.can_redeem(subsidy_uuid, lms_user_id, content_key)
+            if not can_redeem_data.get('can_redeem'):
+                existing_transaction = can_redeem_data.get('existing_transaction')
+                return RedemptionOutcome(
+                    redeemed=bool(existing_transaction),
+                    decided_by=DECIDED_BY_EXISTING_TRANSACTION if existing_transaction else DECIDED_BY_CAN_REDEEM,
+                    transaction=existing_transaction,
+                    can_redeem=can_redeem_data,
+                    content_metadata=None,
+                    error=None,
+                )
+            try:
+                content_metadata = content_metadata_future.result()
+            except requests.exceptions.RequestException:
+                # Only needed for the price, which can_redeem() usually already returned.
+                content_metadata = None
+            if history_future is not None:
+                idempotency_key = self.redemption_idempotency_key(
+                    subsidy_uuid, subsidy_access_policy_uuid, lms_user_id, content_key,
+                    historical_redemption_uuids=history_future.result(),
+                )
+        finally:
+            executor.shutdown(wait=False)
+
+        if requested_price_cents is None:
+            requested_price_cents = can_redeem_data.get('content_price')
+        if requested_price_cents is None and content_metadata:
+            requested_price_cents = price_in_cents(content_metadata.get('content_price'))
+
+        try:
+            transaction = retry_on_ledger_lock(lambda: self.create_subsidy_transaction(
+                subsidy_uuid,
+                lms_user_id,
+                content_key,
+                subsidy_access_policy_uuid,
+                metadata,
+                idempotency_key=idempotency_key,
+                requested_price_cents=requested_price_cents,
+            ))
+        except requests.exceptions.HTTPError as exc:
+            if exc.response is None or exc.response.status_code != 422:
+                raise
+            return RedemptionOutcome(
+                redeemed=False,
+                decided_by=DECIDED_BY_TRANSACTION,
+                transaction=None,
+                can_redeem=can_redeem_data,
+                content_metadata=content_metadata,
+                error=exc.response.text,
+            )
+        return RedemptionOutcome(
+            redeemed=True,
+            decided_by=DECIDED_BY_TRANSACTION,
+            transaction=transaction,
+            can_redeem=can_redeem_data,
+            content_metadata=content_metadata,
+            error=None,
+        )
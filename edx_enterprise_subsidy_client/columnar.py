@@ -0,0 +1,288 @@
+"""
+Columnar decoding of transaction and learner aggregate pages, for analytics consumers.
+
+Instead of accumulating lists of record dicts, ``ColumnarPages`` extracts each requested field of
+every page into a compact per-column buffer as the page arrives, and the page's dicts are then freed:
+
+* integer fields (quantities, counts, ids) into ``array('q')`` int64 buffers;
+* timestamps into int64 buffers of microseconds since the epoch, UTC;
+* low-cardinality strings (state, content key, policy uuid) dictionary-encoded, as int32 codes into
+  a list of distinct values;
+* other strings into a plain list.
+
+Appending a page extends the buffers in place, so concatenating pages never copies earlier ones.
+``to_numpy()``, ``to_pandas()`` and ``to_arrow()`` then wrap the buffers without per-row Python
+objects: int64 buffers are handed over zero-copy, and dictionary-encoded columns become
+``pandas.Categorical`` or ``pyarrow.DictionaryArray`` values.  Those require the optional ``numpy``,
+``pandas`` and ``pyarrow`` packages respectively; decoding itself needs none of them.
+"""
+import datetime
+from array import array
+
+from django.utils.dateparse import parse_datetime
+
+from .client import EnterpriseSubsidyAPIClientException
+
+STRING = 'string'
+CATEGORY = 'category'
+INT64 = 'int64'
+TIMESTAMP = 'timestamp'
+
+TRANSACTION_COLUMN_TYPES = {
+    'uuid': STRING,
+    'state': CATEGORY,
+    'quantity': INT64,
+    'lms_user_id': INT64,
+    'content_key': CATEGORY,
+    'subsidy_access_policy_uuid': CATEGORY,
+    'created': TIMESTAMP,
+    'modified': TIMESTAMP,
+}
+
+LEARNER_AGGREGATE_COLUMN_TYPES = {
+    'lms_user_id': INT64,
+    'enrollment_count': INT64,
+    'total_quantity': INT64,
+}
+
+# Stored for missing timestamps; it's numpy's NaT.
+NULL_TIMESTAMP = -2**63
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def _import_optional(name):
+    try:
+        return __import__(name)
+    except ImportError as exc:
+        raise EnterpriseSubsidyAPIClientException(
+            f'This conversion requires the {name} package to be installed.'
+        ) from exc
+
+
+def _to_microseconds(value):
+    """
+    Returns an ISO 8601 timestamp as UTC microseconds since the epoch, or ``NULL_TIMESTAMP`` if missing.
+    """
+    if not value:
+        return NULL_TIMESTAMP
+    try:
+        timestamp = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        timestamp = parse_datetime(value)
+        if timestamp is None:
+            return NULL_TIMESTAMP
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+    return (timestamp - _EPOCH) // _MICROSECOND
+
+
+class Int64Column:
+    """
+    An int64 buffer, with a null mask created only once a null is seen.
+    """
+
+    def __init__(self):
+        self.values = array('q')
+        self.nulls = None
+
+    def extend(self, values):
+        """
+        Appends ``values``; None is stored as 0 and marked in ``nulls``.
+        """
+        start = len(self.values)
+        self.values.extend(0 if value is None else int(value) for value in values)
+        if self.nulls is None and any(value is None for value in values):
+            self.nulls = bytearray(start)
+        if self.nulls is not None:
+            self.nulls.extend(value is None for value in values)
+
+
+class TimestampColumn:
+    """
+    An int64 buffer of UTC microseconds since the epoch; missing values are ``NULL_TIMESTAMP``.
+    """
+
+    def __init__(self):
+        self.values = array('q')
+
+    def extend(self, values):
+        """
+        Appends ISO 8601 timestamps.
+        """
+        self.values.extend(_to_microseconds(value) for value in values)
+
+
+class CategoryColumn:
+    """
+    Dictionary-encoded strings: int32 ``codes`` into ``categories``, with -1 for missing values.
+    """
+
+    def __init__(self):
+        self.codes = array('i')
+        self.categories = []
+        self._index = {}
+
+    def _code(self, value):
+        """
+        Returns the code of ``value``, adding it to the categories if it's new.
+        """
+        if value is None:
+            return -1
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.categories)
+            self.categories.append(value)
+        return code
+
+    def extend(self, values):
+        """
+        Appends strings, adding unseen ones to ``categories``.
+        """
+        self.codes.extend(self._code(None if value is None else str(value)) for value in values)
+
+
+class StringColumn:
+    """
+    A plain list of strings, for high-cardinality fields like uuids.
+    """
+
+    def __init__(self):
+        self.values = []
+
+    def extend(self, values):
+        """
+        Appends strings.
+        """
+        self.values.extend(None if value is None else str(value) for value in values)
+
+
+_COLUMN_CLASSES = {
+    STRING: StringColumn,
+    CATEGORY: CategoryColumn,
+    INT64: Int64Column,
+    TIMESTAMP: TimestampColumn,
+}
+
+
+class ColumnarPages:
+    """
+    Per-column buffers for pages of records, e.g. transactions.
+
+    Args:
+        column_types (dict): Maps each field to decode to one of ``STRING``, ``CATEGORY``, ``INT64``
+            or ``TIMESTAMP``; defaults to ``TRANSACTION_COLUMN_TYPES``.
+    """
+
+    def __init__(self, column_types=None):
+        self.column_types = dict(column_types or TRANSACTION_COLUMN_TYPES)
+        self.columns = {name: _COLUMN_CLASSES[column_type]() for name, column_type in self.column_types.items()}
+        self.row_count = 0
+
+    def add_page(self, records):
+        """
+        Appends a page of records to every column.
+        """
+        for name, column in self.columns.items():
+            column.extend([record.get(name) for record in records])
+        self.row_count += len(records)
+
+    def __len__(self):
+        return self.row_count
+
+    def to_numpy(self):
+        """
+        Returns ``{field: numpy array}``.
+
+        int64 fields are zero-copy views of the buffers (``numpy.ma.MaskedArray`` if they have nulls),
+        timestamps are ``datetime64[us]`` with NaT for nulls, and dictionary-encoded fields are
+        ``(codes, categories)`` tuples.  While zero-copy views are alive, ``add_page()`` can't grow the
+        buffers they share (``BufferError``), so convert once all pages are added.
+        """
+        numpy = _import_optional('numpy')
+        arrays = {}
+        for name, column in self.columns.items():
+            if isinstance(column, Int64Column):
+                values = numpy.frombuffer(column.values, dtype=numpy.int64)
+                if column.nulls is not None:
+                    values = numpy.ma.MaskedArray(values, mask=numpy.frombuffer(column.nulls, dtype=numpy.bool_))
+                arrays[name] = values
+            elif isinstance(column, TimestampColumn):
+                arrays[name] = numpy.frombuffer(column.values, dtype=numpy.int64).view('datetime64[us]')
+            elif isinstance(column, CategoryColumn):
+                arrays[name] = (numpy.frombuffer(column.codes, dtype=numpy.int32), list(column.categories))
+            else:
+                arrays[name] = numpy.array(column.values, dtype=object)
+        return arrays
+
+    def to_pandas(self):
+        """
+        Returns a ``pandas.DataFrame``; dictionary-encoded fields become categoricals.
+        """
+        pandas = _import_optional('pandas')
+        numpy = _import_optional('numpy')
+        data = {}
+        for name, values in self.to_numpy().items():
+            column_type = self.column_types[name]
+            if column_type == CATEGORY:
+                codes, categories = values
+                data[name] = pandas.Categorical.from_codes(codes, categories=categories)
+            elif column_type == TIMESTAMP:
+                data[name] = pandas.DatetimeIndex(values).tz_localize('UTC')
+            elif column_type == INT64 and numpy.ma.is_masked(values):
+                data[name] = pandas.arrays.IntegerArray(values.data, values.mask)
+            else:
+                data[name] = values
+        return pandas.DataFrame(data)
+
+    def to_arrow(self):
+        """
+        Returns a ``pyarrow.Table``; dictionary-encoded fields become dictionary arrays.
+        """
+        pyarrow = _import_optional('pyarrow')
+        numpy = _import_optional('numpy')
+        arrays = {}
+        for name, values in self.to_numpy().items():
+            column_type = self.column_types[name]
+            if column_type == CATEGORY:
+                codes, categories = values
+                arrays[name] = pyarrow.DictionaryArray.from_arrays(
+                    pyarrow.array(codes, mask=codes < 0), pyarrow.array(categories, type=pyarrow.string()),
+                )
+            elif column_type == TIMESTAMP:
+                raw = values.view(numpy.int64)
+                arrays[name] = pyarrow.array(
+                    raw, type=pyarrow.timestamp('us', tz='UTC'), mask=raw == NULL_TIMESTAMP,
+                )
+            elif column_type == INT64:
+                mask = numpy.ma.getmaskarray(values) if numpy.ma.is_masked(values) else None
+                arrays[name] = pyarrow.array(numpy.ma.getdata(values), type=pyarrow.int64(), mask=mask)
+            else:
+                arrays[name] = pyarrow.array(values.tolist(), type=pyarrow.string())
+        return pyarrow.table(arrays)
+
+
+def decode_transaction_pages(client, subsidy_uuid, column_types=None, **list_kwargs):
+    """
+    Streams every transaction in a subsidy into a ``ColumnarPages``, requesting only the decoded fields.
+
+    Args:
+        list_kwargs: Filters passed through to ``list_subsidy_transactions()``.
+    """
+    columns = ColumnarPages(column_types or TRANSACTION_COLUMN_TYPES)
+    list_kwargs.setdefault('fields', list(columns.column_types))
+    for page in client.iter_subsidy_transaction_pages(subsidy_uuid, **list_kwargs):
+        columns.add_page(page)
+    return columns
+
+
+def decode_learner_aggregates(client, subsidy_uuid, policy_uuid=None):
+    """
+    Returns a subsidy's learner aggregates as a ``ColumnarPages``.
+    """
+    columns = ColumnarPages(LEARNER_AGGREGATE_COLUMN_TYPES)
+    columns.add_page(client.get_subsidy_aggregates_by_learner_data(
+        subsidy_uuid, policy_uuid=policy_uuid, fields=list(LEARNER_AGGREGATE_COLUMN_TYPES),
+    ))
+    return columns
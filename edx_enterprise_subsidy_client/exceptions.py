@@ -0,0 +1,10 @@
+"""
+Exceptions raised by the subsidy client.
+"""
+
+
+class EnterpriseSubsidyAPIClientException(Exception):
+    """
+    A general exception to represent non-http errors
+    arising during Subsidy API client usage.
+    """
@@ -0,0 +1,265 @@
+"""
+Export of full subsidy transaction ledgers to CSV, Parquet or Arrow files.
+
+Transactions are streamed one page at a time via ``iter_subsidy_transaction_pages()`` and
+written to the output file as each page arrives, so memory use is bounded by the page size
+(times the number of subsidies exported concurrently), not by the size of the ledger.
+
+Parquet and Arrow output require the optional ``pyarrow`` package.
+"""
+import csv
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.utils.dateparse import parse_datetime
+
+from .client import EnterpriseSubsidyAPIClientException
+from .files import atomic_path
+
+logger = logging.getLogger(__name__)
+
+STRING = 'string'
+INT64 = 'int64'
+DATETIME = 'datetime'
+JSON = 'json'
+
+# The exported columns, and their types.  ``quantity`` is in the subsidy's unit, i.e. usually cents.
+TRANSACTION_COLUMNS = (
+    ('subsidy_uuid', STRING),
+    ('uuid', STRING),
+    ('state', STRING),
+    ('idempotency_key', STRING),
+    ('lms_user_id', INT64),
+    ('lms_user_email', STRING),
+    ('content_key', STRING),
+    ('parent_content_key', STRING),
+    ('content_title', STRING),
+    ('quantity', INT64),
+    ('unit', STRING),
+    ('fulfillment_identifier', STRING),
+    ('subsidy_access_policy_uuid', STRING),
+    ('created', DATETIME),
+    ('modified', DATETIME),
+    ('metadata', JSON),
+    ('reversal', JSON),
+)
+
+
+def _to_string(value):
+    return None if value is None else str(value)
+
+
+def _to_int(value):
+    return None if value in (None, '') else int(value)
+
+
+def _to_datetime(value):
+    return parse_datetime(value) if value else None
+
+
+def _to_json(value):
+    return None if value is None else json.dumps(value, sort_keys=True)
+
+
+_CONVERTERS = {
+    STRING: _to_string,
+    INT64: _to_int,
+    DATETIME: _to_datetime,
+    JSON: _to_json,
+}
+
+
+def transaction_to_row(subsidy_uuid, transaction):
+    """
+    Converts a serialized transaction into a tuple of typed values, ordered as ``TRANSACTION_COLUMNS``.
+    """
+    record = dict(transaction, subsidy_uuid=subsidy_uuid)
+    return tuple(
+        _CONVERTERS[column_type](record.get(column_name))
+        for column_name, column_type in TRANSACTION_COLUMNS
+    )
+
+
+class CSVTransactionWriter:
+    """
+    Writes transaction rows to a CSV file.  Datetimes are written in ISO 8601 format.
+    """
+
+    extension = 'csv'
+
+    def __init__(self, path):
+        self._file = open(path, 'w', newline='', encoding='utf8')  # pylint: disable=consider-using-with
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([column_name for column_name, _ in TRANSACTION_COLUMNS])
+
+    def write_rows(self, rows):
+        self._writer.writerows(
+            [value.isoformat() if hasattr(value, 'isoformat') else value for value in row]
+            for row in rows
+        )
+
+    def close(self):
+        self._file.close()
+
+
+def _import_pyarrow():
+    """
+    Returns the ``pyarrow`` module, or raises ``EnterpriseSubsidyAPIClientException`` if it isn't installed.
+    """
+    try:
+        import pyarrow  # pylint: disable=import-outside-toplevel
+    except ImportError as exc:
+        raise EnterpriseSubsidyAPIClientException(
+            'Parquet and Arrow exports require the pyarrow package to be installed.'
+        ) from exc
+    return pyarrow
+
+
+def arrow_schema(pyarrow):
+    """
+    Returns the pyarrow schema equivalent of ``TRANSACTION_COLUMNS``.
+    """
+    arrow_types = {
+        STRING: pyarrow.string(),
+        INT64: pyarrow.int64(),
+        DATETIME: pyarrow.timestamp('us', tz='UTC'),
+        JSON: pyarrow.string(),
+    }
+    return pyarrow.schema([
+        (column_name, arrow_types[column_type]) for column_name, column_type in TRANSACTION_COLUMNS
+    ])
+
+
+class ArrowTransactionWriter:
+    """
+    Writes transaction rows to an Arrow IPC file, one record batch per page.
+    """
+
+    extension = 'arrow'
+
+    def __init__(self, path):
+        self._pyarrow = _import_pyarrow()
+        self._schema = arrow_schema(self._pyarrow)
+        self._writer = self._open(path)
+
+    def _open(self, path):
+        return self._pyarrow.ipc.new_file(path, self._schema)
+
+    def _record_batch(self, rows):
+        columns = list(zip(*rows)) if rows else [()] * len(TRANSACTION_COLUMNS)
+        return self._pyarrow.record_batch(
+            [self._pyarrow.array(column, type=field.type) for column, field in zip(columns, self._schema)],
+            schema=self._schema,
+        )
+
+    def write_rows(self, rows):
+        if rows:
+            self._writer.write_batch(self._record_batch(rows))
+
+    def close(self):
+        self._writer.close()
+
+
+class ParquetTransactionWriter(ArrowTransactionWriter):
+    """
+    Writes transaction rows to a Parquet file, one row group per page.
+    """
+
+    extension = 'parquet'
+
+    def _open(self, path):
+        import pyarrow.parquet  # pylint: disable=import-outside-toplevel
+        return pyarrow.parquet.ParquetWriter(path, self._schema)
+
+
+WRITERS = {
+    'csv': CSVTransactionWriter,
+    'arrow': ArrowTransactionWriter,
+    'parquet': ParquetTransactionWriter,
+}
+
+
+def export_single_subsidy_transactions(client, subsidy_uuid, path, file_format='csv', **list_kwargs):
+    """
+    Streams every transaction in one subsidy into a file at ``path``.
+
+    The file is written under a temporary name and only moved into place once complete.  If the export
+    fails, the temporary file is removed: checkpoints are per subsidy, so a resumed export starts the
+    subsidy over anyway.
+
+    Returns:
+        int: The number of transactions written.
+    """
+    writer_class = WRITERS[file_format]
+    row_count = 0
+    with atomic_path(path, prefix=f'.tmp-{os.path.basename(path)}-') as temp_path:
+        writer = writer_class(temp_path)
+        try:
+            for page in client.iter_subsidy_transaction_pages(subsidy_uuid, **list_kwargs):
+                writer.write_rows([transaction_to_row(str(subsidy_uuid), transaction) for transaction in page])
+                row_count += len(page)
+        finally:
+            writer.close()
+    return row_count
+
+
+def export_subsidy_transactions(
+    client, subsidy_uuids, output_dir, file_format='csv', max_workers=4, checkpoint_store=None, **list_kwargs,
+):
+    """
+    Exports the full transaction ledger of each given subsidy to ``<output_dir>/<subsidy_uuid>.<format>``.
+
+    Args:
+        client: An ``EnterpriseSubsidyAPIClient`` (or V2) instance.
+        subsidy_uuids (list): The subsidies to export.
+        output_dir (str): Directory to write files into; created if necessary.
+        file_format (str): One of ``csv``, ``parquet`` or ``arrow``.
+        max_workers (int): How many subsidies to export concurrently.
+        checkpoint_store: Optional ``stores.BaseLocalStore``.  Each completed subsidy is recorded in it,
+            and subsidies already recorded there are skipped, so an interrupted export can be resumed
+            by re-running it with the same store.
+        list_kwargs: Passed through to ``list_subsidy_transactions()``, e.g. ``transaction_states``.
+
+    Returns:
+        dict: Maps each subsidy uuid to ``{'path': ..., 'rows': ...}``.
+
+    Raises:
+        EnterpriseSubsidyAPIClientException: If any subsidy failed to export.  All other subsidies are
+            still exported (and checkpointed) first.
+    """
+    if file_format not in WRITERS:
+        raise EnterpriseSubsidyAPIClientException(f'{file_format} is not a valid export format!')
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = {}
+    pending = []
+    for subsidy_uuid in subsidy_uuids:
+        subsidy_uuid = str(subsidy_uuid)
+        checkpoint = checkpoint_store.get(subsidy_uuid) if checkpoint_store is not None else None
+        if checkpoint and checkpoint.get('format') == file_format:
+            results[subsidy_uuid] = {'path': checkpoint['path'], 'rows': checkpoint['rows']}
+        else:
+            pending.append(subsidy_uuid)
+
+    def export_one(subsidy_uuid):
+        path = os.path.join(output_dir, f'{subsidy_uuid}.{WRITERS[file_format].extension}')
+        rows = export_single_subsidy_transactions(client, subsidy_uuid, path, file_format, **list_kwargs)
+        if checkpoint_store is not None:
+            checkpoint_store.set(subsidy_uuid, {'path': path, 'rows': rows, 'format': file_format})
+        return {'path': path, 'rows': rows}
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {subsidy_uuid: executor.submit(export_one, subsidy_uuid) for subsidy_uuid in pending}
+        for subsidy_uuid, future in futures.items():
+            try:
+                results[subsidy_uuid] = future.result()
+            except Exception:
+                logger.exception('Failed to export transactions for subsidy %s', subsidy_uuid)
+                failed.append(subsidy_uuid)
+
+    if failed:
+        raise EnterpriseSubsidyAPIClientException(f'Failed to export transactions for subsidies: {failed}')
+    return results
@@ -0,0 +1,48 @@
+"""
+Helpers for the files the client keeps on local disk: stores, hot keys and cache snapshots.
+"""
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+def stable_key_hash(key):
+    """
+    Returns a 64-bit hash of a string key that, unlike ``hash()``, is the same in every process.
+    """
+    return int.from_bytes(hashlib.blake2b(key.encode('utf8'), digest_size=8).digest(), 'little')
+
+
+@contextmanager
+def atomic_path(path, prefix='.tmp-'):
+    """
+    Yields the path of a temporary file next to ``path``, which replaces ``path`` once the block succeeds.
+
+    Readers therefore only ever see the previous or the complete new file.  If the block raises,
+    the temporary file is removed and ``path`` is left untouched.  For writers that open files themselves.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=prefix)
+    os.close(file_descriptor)
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+@contextmanager
+def atomic_write(path, mode='w', prefix='.tmp-'):
+    """
+    Yields a temporary file open for writing that replaces ``path`` once the block succeeds, as ``atomic_path()``.
+
+    Args:
+        mode (str): ``'w'`` for text (UTF-8) or ``'wb'`` for bytes.
+    """
+    with atomic_path(path, prefix=prefix) as temp_path:
+        with open(temp_path, mode, encoding=None if 'b' in mode else 'utf8') as temp_file:
+            yield temp_file
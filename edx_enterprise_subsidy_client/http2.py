@@ -0,0 +1,141 @@
+"""
+An optional HTTP/2 transport for the client.
+
+The client's session is a ``requests.Session``, which only speaks HTTP/1.1: every concurrent call
+(e.g. from ``get_enterprise_subsidies_overview()`` or a bulk export) needs its own TCP+TLS
+connection.  ``HTTP2Adapter`` is a ``requests`` transport adapter that sends requests through an
+``httpx`` client with HTTP/2 enabled instead, so concurrent calls are multiplexed as streams over a
+few connections.
+
+Since it's mounted on the same session, OAuth, headers, error handling and everything else above the
+transport are unchanged.  Transport errors are raised as the equivalent ``requests`` exceptions.
+
+httpx's synchronous HTTP/2 connections aren't safe to share between threads: two threads can open
+streams out of order, which the server treats as a protocol error and answers by dropping the connection.
+So the adapter drives an ``httpx.AsyncClient`` on an event loop in its own thread, and calling threads
+wait for their response there.  All HTTP/2 state is then only touched from that one thread.
+
+Requires the optional ``httpx[http2]`` package.  Pass ``http2=True`` to the client constructor, or
+call ``mount_http2(session)``.
+"""
+import asyncio
+import datetime
+import threading
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from .exceptions import EnterpriseSubsidyAPIClientException
+
+# Concurrent calls share connections as HTTP/2 streams, so a handful is plenty.
+DEFAULT_MAX_CONNECTIONS = 4
+
+
+def _import_httpx():
+    """
+    Returns the ``httpx`` module, or raises ``EnterpriseSubsidyAPIClientException`` if it isn't installed.
+    """
+    try:
+        import httpx  # pylint: disable=import-outside-toplevel
+    except ImportError as exc:
+        raise EnterpriseSubsidyAPIClientException(
+            'The HTTP/2 transport requires the httpx[http2] package to be installed.'
+        ) from exc
+    return httpx
+
+
+class HTTP2Adapter(BaseAdapter):
+    """
+    A ``requests`` transport adapter backed by an HTTP/2-capable ``httpx.AsyncClient``, on its own event loop thread.
+
+    Args:
+        max_connections (int): Maximum number of connections kept open across all hosts.
+        verify: TLS verification, as for ``httpx.AsyncClient``; per-request ``verify`` is not supported.
+        http1 (bool): Set to False to speak HTTP/2 without negotiation ("prior knowledge"), e.g. to
+            a local cleartext HTTP/2 test server.  Otherwise HTTP/2 is negotiated via TLS ALPN,
+            falling back to HTTP/1.1.
+        transport: Optional ``httpx`` transport, e.g. an ``httpx.MockTransport`` in tests.
+    """
+
+    def __init__(self, max_connections=DEFAULT_MAX_CONNECTIONS, verify=True, http1=True, transport=None):
+        super().__init__()
+        self._httpx = _import_httpx()
+        self._client = self._httpx.AsyncClient(
+            http1=http1,
+            http2=True,
+            verify=verify,
+            limits=self._httpx.Limits(max_connections=max_connections),
+            transport=transport,
+        )
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='subsidy-client-http2', daemon=True)
+        self._thread.start()
+
+    def _run(self, coroutine):
+        """
+        Runs ``coroutine`` on the adapter's event loop, and returns its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def _timeout(self, timeout):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return self._httpx.Timeout(read, connect=connect)
+        return self._httpx.Timeout(timeout)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        httpx = self._httpx
+        try:
+            httpx_response = self._run(self._client.request(
+                request.method,
+                request.url,
+                headers=dict(request.headers),
+                content=request.body,
+                timeout=self._timeout(timeout),
+            ))
+        except httpx.TimeoutException as exc:
+            if isinstance(exc, httpx.ConnectTimeout):
+                raise requests.exceptions.ConnectTimeout(exc, request=request) from exc
+            raise requests.exceptions.ReadTimeout(exc, request=request) from exc
+        except httpx.TransportError as exc:
+            raise requests.exceptions.ConnectionError(exc, request=request) from exc
+        return self.build_response(request, httpx_response)
+
+    def build_response(self, request, httpx_response):
+        """
+        Returns a ``requests.Response`` equivalent to the given ``httpx.Response``.
+        """
+        response = requests.Response()
+        response.status_code = httpx_response.status_code
+        response.reason = httpx_response.reason_phrase
+        response.headers = CaseInsensitiveDict(httpx_response.headers.multi_items())
+        # httpx has already decompressed the body, so don't let requests try to do it again.
+        response.headers.pop('Content-Encoding', None)
+        response._content = httpx_response.content  # pylint: disable=protected-access
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.elapsed = getattr(httpx_response, '_elapsed', datetime.timedelta(0))
+        response.http_version = httpx_response.http_version
+        return response
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        self._run(self._client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+def mount_http2(session, **kwargs):
+    """
+    Routes all of ``session``'s requests through a new ``HTTP2Adapter``, which is returned.
+    """
+    adapter = HTTP2Adapter(**kwargs)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return adapter
@@ -0,0 +1,252 @@
+"""
+An optional, in-memory index of one subsidy's transactions, for fast local lookups.
+
+Answering "has this learner already redeemed this content?" via ``list_subsidy_transactions(...,
+lms_user_id=..., content_key=...)`` costs a filtered query against the service every time.  A
+``TransactionIndex`` instead streams a snapshot of the subsidy's transactions once, indexes them by
+learner, content key, policy and state, and keeps itself current with transactions created through
+the same client.  Once the snapshot is older than ``max_staleness`` seconds, the next lookup
+rebuilds it in the background while lookups keep being answered from it, so writes made by *other*
+processes show up within about that bound.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from .client import WRITE_TYPE_TRANSACTION, EnterpriseSubsidyAPIClientV2, TransactionStateChoices
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_STALENESS_SECONDS = 300
+
+# States that count as a learner having redeemed content, i.e. every state except failed.
+REDEEMED_STATES = (
+    TransactionStateChoices.COMMITTED,
+    TransactionStateChoices.PENDING,
+    TransactionStateChoices.CREATED,
+)
+
+
+class _Snapshot:
+    """
+    The indexed transactions, plus one dict per lookup key mapping to sets of transaction uuids.
+    """
+
+    def __init__(self):
+        self.transactions = {}
+        self.by_learner = defaultdict(set)
+        self.by_content = defaultdict(set)
+        self.by_policy = defaultdict(set)
+        self.by_state = defaultdict(set)
+        self.by_learner_content = defaultdict(set)
+
+    def _keys(self, transaction):
+        lms_user_id = str(transaction.get('lms_user_id'))
+        content_key = transaction.get('content_key')
+        return (
+            (self.by_learner, lms_user_id),
+            (self.by_content, content_key),
+            (self.by_policy, str(transaction.get('subsidy_access_policy_uuid'))),
+            (self.by_state, transaction.get('state')),
+            (self.by_learner_content, (lms_user_id, content_key)),
+        )
+
+    def add(self, transaction):
+        """
+        Indexes ``transaction``, replacing any earlier version of it.
+        """
+        transaction_uuid = str(transaction['uuid'])
+        existing = self.transactions.get(transaction_uuid)
+        if existing is not None:
+            for index, key in self._keys(existing):
+                index[key].discard(transaction_uuid)
+        self.transactions[transaction_uuid] = transaction
+        for index, key in self._keys(transaction):
+            index[key].add(transaction_uuid)
+
+    def lookup(self, index, key):
+        return [self.transactions[transaction_uuid] for transaction_uuid in index.get(key, ())]
+
+
+class TransactionIndex:
+    """
+    In-memory index of a single subsidy's transactions.
+
+    Usage::
+
+        index = TransactionIndex(client, subsidy_uuid, max_staleness=60)
+        if index.has_redeemed(lms_user_id, content_key):
+            ...
+
+    Args:
+        client: An ``EnterpriseSubsidyAPIClient`` (or V2) instance.  Transactions created through it
+            for this subsidy are added to the index as soon as they are created.
+        subsidy_uuid: The subsidy to index.
+        max_staleness (int): Seconds after which the next lookup rebuilds the snapshot in the background.
+            ``None`` means never rebuild automatically; call ``refresh()`` instead.
+        list_kwargs: Passed through to ``list_subsidy_transactions()`` when building the snapshot.
+            On the v2 client this defaults to every transaction state.
+    """
+
+    def __init__(self, client, subsidy_uuid, max_staleness=DEFAULT_MAX_STALENESS_SECONDS, **list_kwargs):
+        self.client = client
+        self.subsidy_uuid = str(subsidy_uuid)
+        self.max_staleness = max_staleness
+        self.list_kwargs = list_kwargs
+        if isinstance(client, EnterpriseSubsidyAPIClientV2):
+            self.list_kwargs.setdefault('transaction_states', sorted(TransactionStateChoices.VALID_CHOICES))
+
+        self._snapshot = None
+        self._built_at = None
+        # Transactions created through the client that the current snapshot's query may have missed.
+        self._local_writes = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+        client.add_write_listener(self.on_write)
+
+    def close(self):
+        """
+        Stops listening to the client's writes.
+        """
+        self.client.remove_write_listener(self.on_write)
+
+    def refresh(self):
+        """
+        Rebuilds the snapshot by streaming every page of the subsidy's transactions.
+
+        Lookups keep being answered from the previous snapshot while the new one is built.
+        """
+        with self._refresh_lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        """
+        Builds a new snapshot and swaps it in.  Callers must hold ``_refresh_lock``.
+        """
+        snapshot = _Snapshot()
+        started_at = time.monotonic()
+        for page in self.client.iter_subsidy_transaction_pages(self.subsidy_uuid, **self.list_kwargs):
+            for transaction in page:
+                snapshot.add(transaction)
+        with self._lock:
+            # Keep our own writes that raced with building the snapshot.
+            for transaction_uuid, transaction in list(self._local_writes.items()):
+                if transaction_uuid in snapshot.transactions:
+                    del self._local_writes[transaction_uuid]
+                else:
+                    snapshot.add(transaction)
+            self._snapshot = snapshot
+            self._built_at = started_at
+
+    def is_stale(self):
+        """
+        Returns True if the snapshot is due to be rebuilt.
+        """
+        if self._snapshot is None:
+            return True
+        if self.max_staleness is None:
+            return False
+        return time.monotonic() - self._built_at > self.max_staleness
+
+    def _background_refresh(self):
+        """
+        Rebuilds the snapshot if it's still stale; run on a background thread.
+        """
+        try:
+            with self._refresh_lock:
+                if self.is_stale():
+                    self._rebuild()
+        except requests.exceptions.RequestException:
+            logger.warning('Background refresh of the transaction index of %s failed', self.subsidy_uuid, exc_info=True)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _current(self):
+        """
+        Returns the snapshot to answer a lookup from, building it first if there's none yet.
+        """
+        if self._snapshot is None:
+            # Nothing to serve yet: build it, once, however many lookups are waiting for it.
+            with self._refresh_lock:
+                if self._snapshot is None:
+                    self._rebuild()
+        elif self.is_stale():
+            with self._lock:
+                if self._refreshing:
+                    return self._snapshot
+                self._refreshing = True
+            threading.Thread(target=self._background_refresh, daemon=True).start()
+        return self._snapshot
+
+    def add(self, transaction):
+        """
+        Adds or replaces a single transaction in the index.
+        """
+        with self._lock:
+            if self._snapshot is not None:
+                self._snapshot.add(transaction)
+
+    def on_write(self, write_type, subsidy_uuid, response_data):
+        """
+        Write listener; indexes transactions created through the client in this subsidy.
+        """
+        if write_type == WRITE_TYPE_TRANSACTION and subsidy_uuid == self.subsidy_uuid and 'uuid' in response_data:
+            with self._lock:
+                self._local_writes[str(response_data['uuid'])] = response_data
+            self.add(response_data)
+
+    def _lookup(self, index_name, key):
+        snapshot = self._current()
+        with self._lock:
+            return snapshot.lookup(getattr(snapshot, index_name), key)
+
+    def get(self, transaction_uuid):
+        """
+        Returns the transaction with the given uuid, or None.
+        """
+        return self._current().transactions.get(str(transaction_uuid))
+
+    def for_learner(self, lms_user_id):
+        """
+        Returns all indexed transactions for the given learner.
+        """
+        return self._lookup('by_learner', str(lms_user_id))
+
+    def for_content(self, content_key):
+        """
+        Returns all indexed transactions for the given content key.
+        """
+        return self._lookup('by_content', content_key)
+
+    def for_policy(self, subsidy_access_policy_uuid):
+        """
+        Returns all indexed transactions redeemed via the given subsidy access policy.
+        """
+        return self._lookup('by_policy', str(subsidy_access_policy_uuid))
+
+    def in_state(self, state):
+        """
+        Returns all indexed transactions in the given state.
+        """
+        return self._lookup('by_state', state)
+
+    def for_learner_and_content(self, lms_user_id, content_key):
+        """
+        Returns all indexed transactions for the given learner and content key.
+        """
+        return self._lookup('by_learner_content', (str(lms_user_id), content_key))
+
+    def has_redeemed(self, lms_user_id, content_key, states=REDEEMED_STATES):
+        """
+        Returns True if the learner has a transaction for the content in any of the given states, that wasn't
+        reversed since (e.g. a refunded enrollment).
+        """
+        return any(
+            transaction.get('state') in states and not transaction.get('reversal')
+            for transaction in self.for_learner_and_content(lms_user_id, content_key)
+        )
@@ -0,0 +1,289 @@
+"""
+Task-queue-agnostic primitives for long-running bulk subsidy jobs.
+
+A ``BulkJob`` applies one named *operation* (e.g. ``create_subsidy_deposit``) to a list of items.  The
+items are split into fixed-size chunks, called work units, and each unit's outcome is checkpointed in
+a local store (see ``stores.py``).  That allows:
+
+* splitting a job across workers: ``plan()`` returns JSON-serializable work units that can be sent
+  as task arguments (Celery, RQ, a thread pool...), and each worker calls ``run_unit()``;
+* resuming a job: units already checkpointed are skipped, and a unit whose items partially failed
+  only retries the failed items;
+* reporting progress from any process that can read the store, via ``progress()``.
+
+Writes get a default idempotency key derived from the item's contents: deposits use
+``deposit_idempotency_key()``, other writes a hash of the job id and the item.  Re-running a unit that was
+interrupted between a write and its checkpoint therefore never writes twice, even if the items were
+reordered or filtered meanwhile: a deposit the service rejects as already made with that key counts as
+succeeded, with an ``already_exists`` status.
+
+Usage::
+
+    job = BulkJob(JSONFileLocalStore('deposits.json'), 'deposits-2024-q1', OPERATION_CREATE_DEPOSIT)
+    job.run(client, [{'subsidy_uuid': ..., 'desired_deposit_quantity': ..., ...}, ...], max_workers=4)
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .client import (
+    DEPOSIT_ALREADY_EXISTS,
+    EnterpriseSubsidyAPIClientException,
+    is_duplicate_idempotency_key,
+    retry_on_ledger_lock,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 100
+
+OPERATION_CREATE_DEPOSIT = 'create_subsidy_deposit'
+OPERATION_CREATE_TRANSACTION = 'create_subsidy_transaction'
+OPERATION_EXPORT_TRANSACTIONS = 'export_subsidy_transactions'
+
+# Chunk checkpoint statuses.
+UNIT_COMPLETE = 'complete'
+UNIT_INCOMPLETE = 'incomplete'
+
+_operations = {}
+
+
+def register_operation(name, operation):
+    """
+    Makes ``operation`` available to jobs as ``name``.
+
+    Operations are called as ``operation(client, item, item_id)`` and return a JSON-serializable
+    result; ``item_id`` is derived from the job id and the item's contents, so it's stable across re-runs
+    of the job, whatever the item's position, for use as an idempotency key.
+    """
+    _operations[name] = operation
+
+
+def get_operation(name):
+    """
+    Returns the operation registered as ``name``.
+    """
+    try:
+        return _operations[name]
+    except KeyError as exc:
+        raise EnterpriseSubsidyAPIClientException(f'{name} is not a registered job operation!') from exc
+
+
+def _create_deposit(client, item, item_id):  # pylint: disable=unused-argument
+    """
+    Creates one deposit, keyed like ``create_subsidy_deposits()`` keys them unless the item has a key.
+    """
+    item = dict(item)
+    item.setdefault('idempotency_key', client.deposit_idempotency_key(
+        item['subsidy_uuid'], item['sales_contract_reference_provider'], item['sales_contract_reference_id'],
+    ))
+    try:
+        return retry_on_ledger_lock(lambda: client.create_subsidy_deposit(**item))
+    except requests.exceptions.HTTPError as exc:
+        # Made by an earlier run of the unit that was interrupted before its checkpoint.
+        if is_duplicate_idempotency_key(exc.response):
+            return {'idempotency_key': item['idempotency_key'], 'status': DEPOSIT_ALREADY_EXISTS}
+        raise
+
+
+def _create_transaction(client, item, item_id):
+    """
+    Creates one transaction, keyed by ``item_id`` unless the item has a key.
+    """
+    item = dict(item)
+    item.setdefault('idempotency_key', item_id)
+    return retry_on_ledger_lock(lambda: client.create_subsidy_transaction(**item))
+
+
+def _export_transactions(client, item, item_id):  # pylint: disable=unused-argument
+    """
+    Exports one subsidy's transactions to a file in the item's ``output_dir``.
+    """
+    from .export import WRITERS, export_single_subsidy_transactions  # pylint: disable=import-outside-toplevel
+    item = dict(item)
+    subsidy_uuid = str(item.pop('subsidy_uuid'))
+    file_format = item.pop('file_format', 'csv')
+    path = os.path.join(item.pop('output_dir'), f'{subsidy_uuid}.{WRITERS[file_format].extension}')
+    rows = export_single_subsidy_transactions(client, subsidy_uuid, path, file_format, **item)
+    return {'path': path, 'rows': rows}
+
+
+register_operation(OPERATION_CREATE_DEPOSIT, _create_deposit)
+register_operation(OPERATION_CREATE_TRANSACTION, _create_transaction)
+register_operation(OPERATION_EXPORT_TRANSACTIONS, _export_transactions)
+
+
+def _item_id(job_id, item):
+    digest = hashlib.sha256(json.dumps(item, sort_keys=True, default=str).encode('utf8')).hexdigest()
+    return f'{job_id}-{digest[:32]}'
+
+
+def _error(exc):
+    response = getattr(exc, 'response', None)
+    return {'status_code': getattr(response, 'status_code', None), 'message': str(exc)}
+
+
+class BulkJob:
+    """
+    One bulk job, identified by ``job_id``, with its checkpoints in ``store``.
+
+    Args:
+        store: A ``stores.BaseLocalStore``.  To split a job across processes, it must be shared by them.
+        job_id (str): Identifies the job and its checkpoints, and is part of its default idempotency keys.
+        operation (str): A name registered with ``register_operation()``.
+        chunk_size (int): Items per work unit.
+    """
+
+    def __init__(self, store, job_id, operation, chunk_size=DEFAULT_CHUNK_SIZE):
+        get_operation(operation)
+        self.store = store
+        self.job_id = str(job_id)
+        self.operation = operation
+        self.chunk_size = chunk_size
+
+    def _job_key(self):
+        return f'job:{self.job_id}'
+
+    def _unit_key(self, index):
+        return f'job:{self.job_id}:unit:{index}'
+
+    def plan(self, items):
+        """
+        Splits ``items`` into work units, and records the job's shape for ``progress()``.
+
+        Items must be JSON-serializable, and given in the same order whenever a job is re-planned.
+
+        Returns:
+            list: ``{'job_id', 'operation', 'index', 'offset', 'items'}`` dicts, one per unit.
+        """
+        items = list(items)
+        units = [
+            {
+                'job_id': self.job_id,
+                'operation': self.operation,
+                'index': index,
+                'offset': offset,
+                'items': items[offset:offset + self.chunk_size],
+            }
+            for index, offset in enumerate(range(0, len(items), self.chunk_size))
+        ]
+        self.store.set(self._job_key(), {
+            'operation': self.operation,
+            'item_count': len(items),
+            'unit_count': len(units),
+            'chunk_size': self.chunk_size,
+        })
+        return units
+
+    def run_unit(self, client, unit):
+        """
+        Runs one work unit, unless it's already complete, and checkpoints its outcome.
+
+        Items that failed in a previous run of the unit are retried; items that succeeded aren't.
+        A failed item doesn't stop the rest of the unit.
+
+        Returns:
+            dict: The unit's checkpoint: ``{'status', 'results', 'errors', 'finished_at'}``, where
+            ``results`` and ``errors`` map item positions (as strings) to results and errors.
+        """
+        checkpoint = self.store.get(self._unit_key(unit['index'])) or {'results': {}, 'errors': {}}
+        if checkpoint.get('status') == UNIT_COMPLETE:
+            return checkpoint
+
+        operation = get_operation(self.operation)
+        results, errors = dict(checkpoint['results']), {}
+        for position, item in enumerate(unit['items'], start=unit['offset']):
+            if str(position) in results:
+                continue
+            try:
+                results[str(position)] = operation(client, item, _item_id(self.job_id, item))
+            except (requests.exceptions.RequestException, EnterpriseSubsidyAPIClientException) as exc:
+                logger.warning('Job %s failed on item %s: %s', self.job_id, position, exc)
+                errors[str(position)] = _error(exc)
+
+        checkpoint = {
+            'status': UNIT_INCOMPLETE if errors else UNIT_COMPLETE,
+            'results': results,
+            'errors': errors,
+            'finished_at': time.time(),
+        }
+        self.store.set(self._unit_key(unit['index']), checkpoint)
+        return checkpoint
+
+    def run(self, client, items, max_workers=1, on_progress=None):
+        """
+        Plans the job and runs all of its units that aren't complete yet, in this process.
+
+        Args:
+            max_workers (int): How many units to run concurrently.
+            on_progress (callable): Called with ``progress()`` after each unit finishes.
+
+        Returns:
+            dict: The final ``progress()``.
+        """
+        units = self.plan(items)
+        progress_lock = threading.Lock()
+
+        def run_one(unit):
+            self.run_unit(client, unit)
+            if on_progress is not None:
+                with progress_lock:
+                    on_progress(self.progress())
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for future in [executor.submit(run_one, unit) for unit in units]:
+                future.result()
+        return self.progress()
+
+    def progress(self):
+        """
+        Returns the job's progress, as checkpointed so far by every worker sharing the store.
+
+        Returns:
+            dict: ``{'job_id', 'units_total', 'units_complete', 'items_total', 'items_succeeded',
+            'items_failed', 'complete'}``
+        """
+        job = self.store.get(self._job_key()) or {'item_count': 0, 'unit_count': 0}
+        units_complete = items_succeeded = items_failed = 0
+        for index in range(job['unit_count']):
+            checkpoint = self.store.get(self._unit_key(index))
+            if checkpoint is None:
+                continue
+            units_complete += checkpoint['status'] == UNIT_COMPLETE
+            items_succeeded += len(checkpoint['results'])
+            items_failed += len(checkpoint['errors'])
+        return {
+            'job_id': self.job_id,
+            'units_total': job['unit_count'],
+            'units_complete': units_complete,
+            'items_total': job['item_count'],
+            'items_succeeded': items_succeeded,
+            'items_failed': items_failed,
+            'complete': units_complete == job['unit_count'],
+        }
+
+    def results(self):
+        """
+        Yields ``(position, result, error)`` for every item checkpointed so far, in item order.
+        """
+        job = self.store.get(self._job_key()) or {'unit_count': 0}
+        for index in range(job['unit_count']):
+            checkpoint = self.store.get(self._unit_key(index)) or {'results': {}, 'errors': {}}
+            positions = sorted({*checkpoint['results'], *checkpoint['errors']}, key=int)
+            for position in positions:
+                yield int(position), checkpoint['results'].get(position), checkpoint['errors'].get(position)
+
+    def reset(self):
+        """
+        Deletes the job's checkpoints, so that it runs from scratch next time.
+        """
+        job = self.store.get(self._job_key()) or {'unit_count': 0}
+        for index in range(job['unit_count']):
+            self.store.delete(self._unit_key(index))
+        self.store.delete(self._job_key())
@@ -0,0 +1,102 @@
+"""
+Structured, rate-limited logging of failed client requests.
+
+Every failed request (an error status, or no response at all) produces one compact event carrying
+its endpoint name, subsidy uuid, status, latency and attempt number, both in the message and as a
+``subsidy_client`` dict in the record's ``extra`` for structured log handlers.  Messages use lazy
+``%`` formatting, so they're only rendered if a handler actually emits them.
+
+During an incident the same failure can happen thousands of times a second, so events are rate
+limited: per ``(endpoint, status)``, at most ``max_events_per_window`` are logged per ``window``
+seconds.  The rest are only counted, and the next event logged for that key reports how many were
+suppressed in the meantime.
+"""
+import contextvars
+import logging
+import threading
+import time
+
+from .metrics import is_error
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_WINDOW_SECONDS = 60
+DEFAULT_MAX_EVENTS_PER_WINDOW = 5
+
+# Set by retries (e.g. ``client.retry_on_ledger_lock()``) so that events report which attempt failed.
+current_attempt = contextvars.ContextVar('subsidy_client_attempt', default=1)
+
+
+class RequestFailureLogger:
+    """
+    Logs one structured event per failed request, rate limited per endpoint and status.
+    """
+
+    def __init__(
+        self, event_logger=None, window=DEFAULT_LOG_WINDOW_SECONDS, max_events_per_window=DEFAULT_MAX_EVENTS_PER_WINDOW,
+    ):
+        self.logger = event_logger or logger
+        self.window = window
+        self.max_events_per_window = max_events_per_window
+        # (endpoint, status) -> [window start, events logged in the window, events suppressed since the last one logged]
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def _should_log(self, key):
+        """
+        Returns ``(should log, number of events suppressed since the last logged one)``.
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                state = self._windows[key] = [now, 0, state[2] if state else 0]
+            if state[1] >= self.max_events_per_window:
+                state[2] += 1
+                return False, 0
+            state[1] += 1
+            suppressed, state[2] = state[2], 0
+            return True, suppressed
+
+    def request_failed(self, endpoint_name, status_code, latency, subsidy_uuid=None, error=None):
+        """
+        Logs (or counts, if rate limited) one failed request.
+
+        Args:
+            status_code (int): The response status, or None if there was no response.
+            latency (float): Seconds the request took.
+            error: The exception raised instead of a response, if any.
+        """
+        should_log, suppressed = self._should_log((endpoint_name, status_code))
+        if not should_log:
+            return
+        level = logging.WARNING if is_error(status_code) else logging.INFO
+        if not self.logger.isEnabledFor(level):
+            return
+        event = {
+            'endpoint': endpoint_name,
+            'subsidy_uuid': str(subsidy_uuid) if subsidy_uuid is not None else None,
+            'status': status_code,
+            'latency_ms': round(latency * 1000, 1),
+            'attempt': current_attempt.get(),
+            'suppressed': suppressed,
+            'error': type(error).__name__ if error is not None else None,
+        }
+        self.logger.log(
+            level,
+            'subsidy_client_request_failed endpoint=%s subsidy_uuid=%s status=%s latency_ms=%s attempt=%s '
+            'suppressed=%s error=%s',
+            event['endpoint'], event['subsidy_uuid'], event['status'], event['latency_ms'], event['attempt'],
+            event['suppressed'], event['error'],
+            extra={'subsidy_client': event},
+        )
+
+
+_request_failure_logger = RequestFailureLogger()
+
+
+def get_request_failure_logger():
+    """
+    Returns the process-wide ``RequestFailureLogger`` that clients log to by default.
+    """
+    return _request_failure_logger
@@ -0,0 +1,75 @@
+"""
+Management command to export full subsidy transaction ledgers to local files.
+
+Requires ``edx_enterprise_subsidy_client`` to be in the service's ``INSTALLED_APPS``.
+"""
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from edx_enterprise_subsidy_client.client import EnterpriseSubsidyAPIClientException, get_enterprise_subsidy_api_client
+from edx_enterprise_subsidy_client.export import WRITERS, export_subsidy_transactions
+from edx_enterprise_subsidy_client.stores import JSONFileLocalStore
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Example usage:
+
+      ./manage.py export_subsidy_transactions --output-dir /tmp/ledgers --format parquet \\
+          --checkpoint-file /tmp/ledgers/checkpoint.json <subsidy-uuid> <subsidy-uuid> ...
+
+      ./manage.py export_subsidy_transactions --output-dir /tmp/ledgers \\
+          --enterprise-customer-uuid <enterprise-customer-uuid>
+    """
+    help = 'Streams every transaction of one or many subsidies into CSV, Parquet or Arrow files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('subsidy_uuids', nargs='*', help='Subsidies to export.')
+        parser.add_argument(
+            '--enterprise-customer-uuid',
+            help='Also export every subsidy belonging to this enterprise customer.',
+        )
+        parser.add_argument('--output-dir', required=True, help='Directory to write one file per subsidy into.')
+        parser.add_argument('--format', dest='file_format', choices=sorted(WRITERS), default='csv')
+        parser.add_argument('--max-workers', type=int, default=4, help='Number of subsidies exported concurrently.')
+        parser.add_argument(
+            '--checkpoint-file',
+            help='JSON file recording completed subsidies; re-running with the same file resumes the export.',
+        )
+        parser.add_argument('--api-version', type=int, choices=[1, 2], default=2)
+        parser.add_argument('--page-size', type=int, help='Transactions requested per page.')
+
+    def handle(self, *args, **options):
+        client = get_enterprise_subsidy_api_client(version=options['api_version'])
+
+        subsidy_uuids = list(options['subsidy_uuids'])
+        if options['enterprise_customer_uuid']:
+            subsidy_uuids.extend(
+                subsidy['uuid'] for subsidy in client.iter_subsidies(options['enterprise_customer_uuid'])
+            )
+        if not subsidy_uuids:
+            raise CommandError('Provide at least one subsidy uuid or an --enterprise-customer-uuid.')
+
+        list_kwargs = {}
+        if options['page_size']:
+            list_kwargs['page_size'] = options['page_size']
+        checkpoint_store = JSONFileLocalStore(options['checkpoint_file']) if options['checkpoint_file'] else None
+
+        try:
+            results = export_subsidy_transactions(
+                client,
+                subsidy_uuids,
+                options['output_dir'],
+                file_format=options['file_format'],
+                max_workers=options['max_workers'],
+                checkpoint_store=checkpoint_store,
+                **list_kwargs,
+            )
+        except EnterpriseSubsidyAPIClientException as exc:
+            raise CommandError(str(exc)) from exc
+
+        for subsidy_uuid, result in results.items():
+            logger.info('Exported %s transactions for subsidy %s to %s', result['rows'], subsidy_uuid, result['path'])
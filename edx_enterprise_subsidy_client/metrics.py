@@ -0,0 +1,214 @@
+"""
+Per-endpoint latency and error tracking for the client.
+
+Every request the client makes is timed and recorded, under its endpoint name (e.g. ``can_redeem``,
+``v2.transactions.create``), in a ``RequestMetrics`` registry.  Each endpoint keeps HDR-style
+histograms: log-linear buckets with ``SUB_BUCKETS`` buckets per power of two, so any percentile is
+accurate to within about 3%, in a fixed, small amount of memory.  Error and status code counters are
+kept alongside them.
+
+Stats cover a rolling window.  The window is split into slots, each holding its own histogram and
+counters; a slot is cleared and reused once it falls out of the window, so recording never
+allocates and reading never has to drop old samples.  Recording takes one per-endpoint lock, held only
+for a few integer increments.
+
+``snapshot()`` returns p50/p95/p99/max latencies and error rates per endpoint, for the admin view in
+``views.py``, or for adaptive features such as hedging or circuit breaking.
+"""
+import threading
+import time
+from array import array
+
+DEFAULT_WINDOW_SECONDS = 300
+DEFAULT_WINDOW_SLOTS = 10
+
+# Latencies are recorded in microseconds; 2**SUB_BUCKET_BITS buckets per power of two.
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+# Latencies from 0 up to 2**MAX_MAGNITUDE microseconds (about 19 hours); longer ones are clamped.
+MAX_MAGNITUDE = 36
+BUCKET_COUNT = (MAX_MAGNITUDE - SUB_BUCKET_BITS + 2) * SUB_BUCKETS
+
+PERCENTILES = (50, 95, 99)
+
+
+def bucket_index(microseconds):
+    """
+    Returns the histogram bucket of a latency, in microseconds.
+    """
+    value = min(max(int(microseconds), 0), (1 << MAX_MAGNITUDE) - 1)
+    magnitude = value.bit_length() - SUB_BUCKET_BITS
+    if magnitude <= 0:
+        return value
+    return magnitude * SUB_BUCKETS + (value >> (magnitude - 1)) - SUB_BUCKETS
+
+
+def bucket_upper_bound(index):
+    """
+    Returns the largest latency, in microseconds, that falls in the given bucket.
+    """
+    magnitude, sub_bucket = divmod(index, SUB_BUCKETS)
+    if magnitude == 0:
+        return index
+    return ((sub_bucket + SUB_BUCKETS + 1) << (magnitude - 1)) - 1
+
+
+def is_error(status_code):
+    """
+    Whether a response counts against the error rate: no response at all, a 429 or a 5xx.
+
+    Other 4xx responses are answers about the request, not failures of the service.
+    """
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+class _Slot:
+    """
+    The requests recorded in one slot of an endpoint's rolling window: a latency histogram, with counts.
+    """
+
+    __slots__ = ('epoch', 'counts', 'total', 'errors', 'max', 'status_codes')
+
+    def __init__(self):
+        self.epoch = -1
+        self.counts = array('q', bytes(8 * BUCKET_COUNT))
+        self.reset(-1)
+
+    def reset(self, epoch):
+        """
+        Empties the slot, for reuse by the window's ``epoch``-th slot.
+        """
+        self.epoch = epoch
+        for index, count in enumerate(self.counts):
+            if count:
+                self.counts[index] = 0
+        self.total = 0
+        self.errors = 0
+        self.max = 0
+        self.status_codes = {}
+
+
+class EndpointMetrics:
+    """
+    Rolling-window latency histogram and error counters for one endpoint.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW_SECONDS, slots=DEFAULT_WINDOW_SLOTS):
+        self.window = window
+        self.slot_seconds = window / slots
+        self._slots = [_Slot() for _ in range(slots)]
+        self._lock = threading.Lock()
+
+    def record(self, seconds, status_code):
+        """
+        Records one request that took ``seconds`` and got ``status_code`` (None if no response).
+        """
+        epoch = int(time.monotonic() // self.slot_seconds)
+        microseconds = int(seconds * 1e6)
+        with self._lock:
+            slot = self._slots[epoch % len(self._slots)]
+            if slot.epoch != epoch:
+                slot.reset(epoch)
+            slot.counts[bucket_index(microseconds)] += 1
+            slot.total += 1
+            slot.max = max(slot.max, microseconds)
+            if is_error(status_code):
+                slot.errors += 1
+            key = str(status_code) if status_code is not None else 'no_response'
+            slot.status_codes[key] = slot.status_codes.get(key, 0) + 1
+
+    def snapshot(self):
+        """
+        Returns ``{'count', 'errors', 'error_rate', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'status_codes'}``
+        over the window.
+        """
+        oldest_epoch = int(time.monotonic() // self.slot_seconds) - len(self._slots) + 1
+        counts = array('q', bytes(8 * BUCKET_COUNT))
+        total = errors = maximum = 0
+        status_codes = {}
+        with self._lock:
+            for slot in self._slots:
+                if slot.epoch < oldest_epoch or not slot.total:
+                    continue
+                for index, count in enumerate(slot.counts):
+                    if count:
+                        counts[index] += count
+                total += slot.total
+                errors += slot.errors
+                maximum = max(maximum, slot.max)
+                for key, count in slot.status_codes.items():
+                    status_codes[key] = status_codes.get(key, 0) + count
+
+        stats = {
+            'count': total,
+            'errors': errors,
+            'error_rate': errors / total if total else 0.0,
+            'max_ms': maximum / 1000,
+            'status_codes': status_codes,
+        }
+        for percentile in PERCENTILES:
+            stats[f'p{percentile}_ms'] = None
+        if total:
+            targets = [(percentile, max(1, -(-total * percentile // 100))) for percentile in PERCENTILES]
+            seen = 0
+            for index, count in enumerate(counts):
+                if not count:
+                    continue
+                seen += count
+                while targets and seen >= targets[0][1]:
+                    percentile = targets.pop(0)[0]
+                    stats[f'p{percentile}_ms'] = min(bucket_upper_bound(index), maximum) / 1000
+                if not targets:
+                    break
+        return stats
+
+
+class RequestMetrics:
+    """
+    ``EndpointMetrics`` by endpoint name, created on first use.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW_SECONDS, slots=DEFAULT_WINDOW_SLOTS):
+        self.window = window
+        self.slots = slots
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def endpoint(self, name):
+        """
+        Returns the ``EndpointMetrics`` for ``name``.
+        """
+        metrics = self._endpoints.get(name)
+        if metrics is None:
+            with self._lock:
+                metrics = self._endpoints.setdefault(name, EndpointMetrics(self.window, self.slots))
+        return metrics
+
+    def record(self, name, seconds, status_code):
+        """
+        Records one request to the ``name`` endpoint.
+        """
+        self.endpoint(name).record(seconds, status_code)
+
+    def snapshot(self):
+        """
+        Returns ``{endpoint name: EndpointMetrics.snapshot()}``.
+        """
+        return {name: metrics.snapshot() for name, metrics in sorted(self._endpoints.items())}
+
+    def reset(self):
+        """
+        Forgets every endpoint's stats.
+        """
+        with self._lock:
+            self._endpoints = {}
+
+
+_request_metrics = RequestMetrics()
+
+
+def get_request_metrics():
+    """
+    Returns the process-wide ``RequestMetrics`` that clients record to by default.
+    """
+    return _request_metrics
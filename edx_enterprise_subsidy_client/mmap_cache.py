@@ -0,0 +1,194 @@
+"""
+A cache backend shared by every process on a host, stored in a memory-mapped file.
+
+With many worker processes per host (e.g. gunicorn), a per-process cache is filled once per worker
+and every worker pays its own misses.  ``MmapCacheBackend`` instead keeps entries in a fixed-size file
+that all workers map into memory, so a response fetched by one worker is a hit for all the others,
+without a network hop to a shared cache.
+
+Layout: a small header followed by ``num_slots`` fixed-size slots, so the file (and memory) used never
+exceeds ``num_slots * slot_size`` bytes.  A key hashes to a bucket of ``BUCKET_SIZE`` adjacent slots.
+Each slot starts with a sequence counter used as a seqlock: readers never take a lock, and retry if a
+writer changed the slot while it was being read.  Writers lock only the bucket they write to (an
+``fcntl`` byte-range lock across processes, plus a thread lock within the process).  Entries larger
+than a slot are simply not cached.
+
+Unix only, since it relies on ``fcntl``.
+"""
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+from .cache import BaseCacheBackend
+from .files import stable_key_hash
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ESCMMAP1'
+# magic, num_slots, slot_size
+FILE_HEADER = struct.Struct('<8sII')
+FILE_HEADER_SIZE = 64
+# seq, key hash, expires_at, payload length
+SLOT_HEADER = struct.Struct('<IQdI')
+SEQ = struct.Struct('<I')
+
+BUCKET_SIZE = 4
+READ_RETRIES = 10
+DEFAULT_NUM_SLOTS = 4096
+DEFAULT_SLOT_SIZE = 4096
+
+
+def _key_hash(key):
+    # 0 marks an empty slot.
+    return stable_key_hash(key) or 1
+
+
+class MmapCacheBackend(BaseCacheBackend):
+    """
+    Cache backend shared across processes via a memory-mapped file at ``path``.
+
+    All processes must use the same ``num_slots`` and ``slot_size`` for a given path; a file
+    created with different dimensions is reinitialized.
+    """
+
+    def __init__(self, path, num_slots=DEFAULT_NUM_SLOTS, slot_size=DEFAULT_SLOT_SIZE):
+        if num_slots < BUCKET_SIZE or slot_size <= SLOT_HEADER.size:
+            raise ValueError('num_slots or slot_size is too small')
+        self.path = path
+        self.num_slots = num_slots
+        self.slot_size = slot_size
+        self.max_payload_size = slot_size - SLOT_HEADER.size
+        self._size = FILE_HEADER_SIZE + num_slots * slot_size
+        self._thread_locks = [threading.Lock() for _ in range(64)]
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._initialize()
+        self._mmap = mmap.mmap(self._fd, self._size)
+
+    def _initialize(self):
+        """
+        Creates (or recreates) the file with zeroed slots, unless another process already has.
+        """
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, FILE_HEADER_SIZE, 0)
+        try:
+            header = os.pread(self._fd, FILE_HEADER.size, 0)
+            expected = FILE_HEADER.pack(MAGIC, self.num_slots, self.slot_size)
+            if header != expected or os.fstat(self._fd).st_size != self._size:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self._size)
+                os.pwrite(self._fd, expected, 0)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, FILE_HEADER_SIZE, 0)
+
+    def close(self):
+        """
+        Unmaps and closes the file.  The cached entries stay in it for other processes.
+        """
+        self._mmap.close()
+        os.close(self._fd)
+
+    def _offset(self, slot):
+        return FILE_HEADER_SIZE + slot * self.slot_size
+
+    def _bucket(self, key_hash):
+        first = (key_hash % (self.num_slots // BUCKET_SIZE)) * BUCKET_SIZE
+        return range(first, first + BUCKET_SIZE)
+
+    def _lock_bucket(self, bucket):
+        thread_lock = self._thread_locks[bucket[0] // BUCKET_SIZE % len(self._thread_locks)]
+        thread_lock.acquire()
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, BUCKET_SIZE * self.slot_size, self._offset(bucket[0]))
+        return thread_lock
+
+    def _unlock_bucket(self, bucket, thread_lock):
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, BUCKET_SIZE * self.slot_size, self._offset(bucket[0]))
+        thread_lock.release()
+
+    def _read_slot(self, slot):
+        """
+        Returns ``(key_hash, expires_at, payload)`` from a consistent snapshot of the slot, or None.
+        """
+        offset = self._offset(slot)
+        for _ in range(READ_RETRIES):
+            seq, key_hash, expires_at, length = SLOT_HEADER.unpack_from(self._mmap, offset)
+            if seq % 2:
+                continue  # a write is in progress
+            payload = bytes(self._mmap[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + length])
+            if SEQ.unpack_from(self._mmap, offset)[0] == seq:
+                return key_hash, expires_at, payload
+        return None
+
+    def _write_slot(self, slot, key_hash, expires_at, payload):
+        """
+        Writes a slot; must be called with its bucket locked.
+        """
+        offset = self._offset(slot)
+        seq = SEQ.unpack_from(self._mmap, offset)[0]
+        SEQ.pack_into(self._mmap, offset, (seq + 1) % 2**32)
+        self._mmap[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + len(payload)] = payload
+        SLOT_HEADER.pack_into(self._mmap, offset, (seq + 1) % 2**32, key_hash, expires_at, len(payload))
+        SEQ.pack_into(self._mmap, offset, (seq + 2) % 2**32)
+
+    def get(self, key):
+        key_hash = _key_hash(key)
+        for slot in self._bucket(key_hash):
+            snapshot = self._read_slot(slot)
+            if snapshot is None or snapshot[0] != key_hash:
+                continue
+            _, expires_at, payload = snapshot
+            if time.time() >= expires_at:
+                return None
+            try:
+                stored_key, entry = json.loads(payload)
+            except ValueError:
+                return None
+            if stored_key == key:
+                return entry
+        return None
+
+    def set(self, key, entry, timeout):
+        payload = json.dumps([key, entry], separators=(',', ':')).encode('utf8')
+        if len(payload) > self.max_payload_size:
+            logger.debug('Not caching %s: %s bytes exceeds the slot size', key, len(payload))
+            return
+        key_hash = _key_hash(key)
+        bucket = self._bucket(key_hash)
+        now = time.time()
+        thread_lock = self._lock_bucket(bucket)
+        try:
+            # Reuse this key's slot, else an empty or expired one, else evict the soonest to expire.
+            candidates = []
+            for slot in bucket:
+                slot_hash, expires_at, _ = SLOT_HEADER.unpack_from(self._mmap, self._offset(slot))[1:]
+                if slot_hash == key_hash:
+                    candidates = [(-2, slot)]
+                    break
+                candidates.append((-1 if slot_hash == 0 or expires_at <= now else expires_at, slot))
+            self._write_slot(min(candidates)[1], key_hash, now + timeout, payload)
+        finally:
+            self._unlock_bucket(bucket, thread_lock)
+
+    def delete(self, key):
+        key_hash = _key_hash(key)
+        bucket = self._bucket(key_hash)
+        thread_lock = self._lock_bucket(bucket)
+        try:
+            for slot in bucket:
+                if SLOT_HEADER.unpack_from(self._mmap, self._offset(slot))[1] == key_hash:
+                    self._write_slot(slot, 0, 0.0, b'')
+        finally:
+            self._unlock_bucket(bucket, thread_lock)
+
+    def clear(self):
+        for first_slot in range(0, self.num_slots - BUCKET_SIZE + 1, BUCKET_SIZE):
+            bucket = range(first_slot, first_slot + BUCKET_SIZE)
+            thread_lock = self._lock_bucket(bucket)
+            try:
+                for slot in bucket:
+                    self._write_slot(slot, 0, 0.0, b'')
+            finally:
+                self._unlock_bucket(bucket, thread_lock)
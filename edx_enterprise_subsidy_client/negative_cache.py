@@ -0,0 +1,128 @@
+"""
+Negative caching of deterministic "no" answers from the subsidy service.
+
+A large share of ``can_redeem()`` and ``get_subsidy_content_data()`` calls ask about content that isn't
+in the customer's catalog, or learners who've hit a limit, and keep getting the same 404/422 or
+``can_redeem: false`` answer.  ``NegativeCache`` remembers those answers for a short ``ttl`` so repeats
+are answered locally.  Only answers that won't change without a write are cached: errors like 5xx or
+429 never are, and neither are positive answers.
+
+A deposit can turn a "no" into a "yes", so every deposit made through the client drops the cached
+answers for that subsidy.  Pass a ``NegativeCache`` to the client constructor as ``negative_cache``.
+"""
+import threading
+import time
+
+import requests
+from edx_django_utils.monitoring import set_custom_attribute
+
+from .cache import LocalMemoryCacheBackend
+from .client import WRITE_TYPE_DEPOSIT
+
+DEFAULT_NEGATIVE_TTL_SECONDS = 30
+
+# Content metadata statuses that mean the content isn't available to the customer.
+NEGATIVE_STATUS_CODES = {404, 422}
+
+
+class NegativeCache:
+    """
+    A short-lived cache of negative answers, invalidated per subsidy.
+
+    Entries for a subsidy are keyed on that subsidy's current *generation*, itself stored in the
+    backend; a deposit replaces the generation, which orphans all of the subsidy's entries at once.
+    That also works with backends shared between processes, like ``mmap_cache.MmapCacheBackend``.
+
+    Args:
+        backend: A ``cache.BaseCacheBackend``; defaults to a ``LocalMemoryCacheBackend``.
+        ttl (int): Seconds a negative answer is remembered.
+    """
+
+    def __init__(self, backend=None, ttl=DEFAULT_NEGATIVE_TTL_SECONDS):
+        self.backend = backend if backend is not None else LocalMemoryCacheBackend()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'invalidations': 0,
+        }
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+            count = self.stats[stat]
+        set_custom_attribute(f'enterprise_subsidy_client.negative_cache.{stat}', count)
+
+    def _generation(self, subsidy_uuid):
+        if subsidy_uuid is None:
+            return ''
+        entry = self.backend.get(f'negative-generation:{subsidy_uuid}')
+        return entry['generation'] if entry else ''
+
+    def _key(self, key, subsidy_uuid):
+        return f'negative:{self._generation(subsidy_uuid)}:{key}'
+
+    def get(self, key, subsidy_uuid=None):
+        """
+        Returns the negative answer cached under ``key``, or None.
+        """
+        entry = self.backend.get(self._key(key, subsidy_uuid))
+        if entry is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return entry['value']
+
+    def set(self, key, value, subsidy_uuid=None):
+        """
+        Caches a negative answer.  Pass the subsidy it depends on, so deposits invalidate it.
+        """
+        self._count('stores')
+        self.backend.set(self._key(key, subsidy_uuid), {'value': value}, self.ttl)
+
+    def raise_for_error(self, key, url, subsidy_uuid=None):
+        """
+        Raises the ``requests.exceptions.HTTPError`` cached under ``key`` with ``set_error()``, if any.
+        """
+        answer = self.get(key, subsidy_uuid=subsidy_uuid)
+        if answer is None:
+            return
+        response = requests.Response()
+        response.status_code = answer['status_code']
+        response.reason = answer['reason']
+        response._content = answer['text'].encode('utf8')  # pylint: disable=protected-access
+        response.encoding = 'utf8'
+        response.url = url
+        response.raise_for_status()
+
+    def set_error(self, key, response, subsidy_uuid=None):
+        """
+        Caches an error response, if its status is one of ``NEGATIVE_STATUS_CODES``.
+        """
+        if response is not None and response.status_code in NEGATIVE_STATUS_CODES:
+            self.set(
+                key,
+                {'status_code': response.status_code, 'reason': response.reason, 'text': response.text},
+                subsidy_uuid=subsidy_uuid,
+            )
+
+    def invalidate_subsidy(self, subsidy_uuid):
+        """
+        Drops every negative answer cached for the subsidy.
+        """
+        self._count('invalidations')
+        self.backend.set(
+            f'negative-generation:{subsidy_uuid}',
+            {'generation': str(time.time_ns())},
+            # Outlive every entry keyed on the previous generation.
+            self.ttl * 2,
+        )
+
+    def on_write(self, write_type, subsidy_uuid, response_data):  # pylint: disable=unused-argument
+        """
+        Write listener; deposits invalidate the subsidy's negative answers.
+        """
+        if write_type == WRITE_TYPE_DEPOSIT:
+            self.invalidate_subsidy(subsidy_uuid)
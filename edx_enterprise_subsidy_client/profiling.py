@@ -0,0 +1,213 @@
+"""
+Opt-in, sampled profiling of the client's requests.
+
+When the client burns CPU, it's hard to tell whether the cost is in the ``requests`` session, OAuth
+handling, JSON decoding or the caller's own processing.  A ``RequestProfiler`` passed to the client
+as ``profiler`` profiles a random sample of its requests, per endpoint name (see ``metrics.py``),
+including the decoding of their JSON bodies.  Unsampled requests only pay for one ``random()``
+call, and with no profiler configured there's no overhead at all.
+
+Two capture modes:
+
+* ``MODE_FOLDED`` (default): exact call stacks of the sampled requests, with self-time in
+  microseconds, accumulated per endpoint and written to ``<output_dir>/<endpoint>.folded`` in the
+  folded-stack format read by ``flamegraph.pl``, speedscope and similar tools.
+* ``MODE_CPROFILE``: one ``cProfile``/``pstats`` dump per sampled request, in
+  ``<output_dir>/<endpoint>-<pid>-<n>.prof``, for ``pstats``, snakeviz and the like.
+
+Either way, ``stats`` keeps perf-counter totals per endpoint of the time spent in the request
+itself and in JSON decoding.
+"""
+import cProfile
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+MODE_FOLDED = 'folded'
+MODE_CPROFILE = 'cprofile'
+
+# Accumulated folded stacks are written out after this many samples of an endpoint.
+DEFAULT_FLUSH_EVERY = 20
+
+# Profilers are process-wide on some Pythons (``cProfile`` refuses to start while another profile
+# is active on 3.12+), so only one request is profiled at a time.
+_profile_lock = threading.Lock()
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def _builtin_name(function):
+    module = getattr(function, '__module__', None) or type(getattr(function, '__self__', None)).__name__
+    return f'{module}.{getattr(function, "__qualname__", function)}'
+
+
+class FoldedStackTracer:
+    """
+    A ``sys.setprofile()`` hook that accumulates the self-time of every call path it sees.
+    """
+
+    def __init__(self):
+        self.folded = Counter()
+        self._stack = []
+
+    def __call__(self, frame, event, arg):
+        now = time.perf_counter()
+        if event == 'call':
+            self._stack.append([_frame_name(frame).replace(';', ','), now, 0.0])
+        elif event == 'c_call':
+            self._stack.append([_builtin_name(arg).replace(';', ','), now, 0.0])
+        elif event in ('return', 'c_return', 'c_exception'):
+            if not self._stack:
+                return  # returning from frames entered before tracing started
+            path = ';'.join(entry[0] for entry in self._stack)
+            _, started_at, child_time = self._stack.pop()
+            elapsed = now - started_at
+            self.folded[path] += elapsed - child_time
+            if self._stack:
+                self._stack[-1][2] += elapsed
+
+    def run(self, function):
+        """
+        Returns ``function()``, traced.  Only the calling thread is traced.
+        """
+        previous = sys.getprofile()
+        sys.setprofile(self)
+        try:
+            return function()
+        finally:
+            sys.setprofile(previous)
+
+
+class RequestProfiler:
+    """
+    Samples and profiles client requests, writing the results to ``output_dir``.
+
+    Args:
+        output_dir (str): Directory for profile dumps; created if necessary.
+        sample_rate (float): Fraction of requests to profile, from 0 to 1.
+        sample_rates (dict): Per-endpoint overrides of ``sample_rate``, e.g. ``{'can_redeem': 0.1}``.
+        mode (str): ``MODE_FOLDED`` or ``MODE_CPROFILE``.
+        flush_every (int): In folded mode, write an endpoint's stacks out after this many samples.
+    """
+
+    def __init__(
+        self, output_dir, sample_rate=0.0, sample_rates=None, mode=MODE_FOLDED, flush_every=DEFAULT_FLUSH_EVERY,
+    ):
+        if mode not in (MODE_FOLDED, MODE_CPROFILE):
+            raise ValueError(f'{mode} is not a valid profiling mode!')
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.sample_rates = dict(sample_rates or {})
+        self.mode = mode
+        self.flush_every = flush_every
+        self.stats = {}
+        self._folded = {}
+        self._lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+
+    def should_sample(self, endpoint_name):
+        """
+        Decides whether to profile one request to the endpoint.
+        """
+        rate = self.sample_rates.get(endpoint_name, self.sample_rate)
+        return rate > 0 and random.random() < rate
+
+    def profile(self, endpoint_name, send):
+        """
+        Returns ``send()``'s response, having profiled it and the decoding of its JSON body.
+
+        The body is decoded eagerly, within the profile, and the response's ``json()`` then returns
+        the already-decoded data.
+
+        Only one request is profiled at a time in the process: while another one is, or if the
+        profiler can't be started, ``send()`` is just called, unprofiled.  Profiling never changes
+        whether a request succeeds.
+        """
+        if not _profile_lock.acquire(blocking=False):
+            return send()
+        timings = {}
+
+        def send_and_decode():
+            started_at = time.perf_counter()
+            timings['request'] = 0.0
+            response = send()
+            decoding_at = time.perf_counter()
+            try:
+                data = response.json()
+            except ValueError:
+                pass
+            else:
+                response.json = lambda *args, **kwargs: data
+            timings['request'] = decoding_at - started_at
+            timings['json'] = time.perf_counter() - decoding_at
+            return response
+
+        try:
+            if self.mode == MODE_CPROFILE:
+                profile = cProfile.Profile()
+                try:
+                    return profile.runcall(send_and_decode)
+                finally:
+                    if timings:
+                        self._record(endpoint_name, timings, profile=profile)
+            else:
+                tracer = FoldedStackTracer()
+                try:
+                    return tracer.run(send_and_decode)
+                finally:
+                    if timings:
+                        self._record(endpoint_name, timings, folded=tracer.folded)
+        except Exception:
+            if timings:
+                raise  # the request itself failed
+            logger.warning('Failed to start profiling a subsidy client request to %s', endpoint_name, exc_info=True)
+        finally:
+            _profile_lock.release()
+        return send()
+
+    def _record(self, endpoint_name, timings, profile=None, folded=None):
+        """
+        Adds one sampled request's timings to the endpoint's stats, and writes or accumulates its profile.
+        """
+        with self._lock:
+            stats = self.stats.setdefault(endpoint_name, {'samples': 0, 'request_seconds': 0.0, 'json_seconds': 0.0})
+            stats['samples'] += 1
+            stats['request_seconds'] += timings.get('request', 0.0)
+            stats['json_seconds'] += timings.get('json', 0.0)
+            sample_number = stats['samples']
+            flush = False
+            if folded is not None:
+                self._folded.setdefault(endpoint_name, Counter()).update(folded)
+                flush = sample_number % self.flush_every == 0
+        try:
+            if profile is not None:
+                profile.dump_stats(os.path.join(
+                    self.output_dir, f'{endpoint_name}-{os.getpid()}-{sample_number}.prof',
+                ))
+            elif flush:
+                self.flush(endpoint_name)
+        except OSError:
+            logger.warning('Failed to write the subsidy client profile for %s', endpoint_name, exc_info=True)
+
+    def flush(self, endpoint_name=None):
+        """
+        Appends the accumulated folded stacks of one endpoint (or all of them) to their files.
+        """
+        with self._lock:
+            names = [endpoint_name] if endpoint_name is not None else list(self._folded)
+            pending = {name: self._folded.pop(name) for name in names if name in self._folded}
+        for name, folded in pending.items():
+            with open(os.path.join(self.output_dir, f'{name}.folded'), 'a', encoding='utf8') as folded_file:
+                for path, seconds in folded.items():
+                    microseconds = int(seconds * 1e6)
+                    if microseconds > 0:
+                        folded_file.write(f'{path} {microseconds}\n')
@@ -0,0 +1,232 @@
+"""
+Recording and replay of the client's HTTP traffic, for deterministic performance testing.
+
+``record(client, path)`` captures every request the client makes, and the response to it, to a
+*cassette* on disk: one compact JSON line per exchange (gzip-compressed if the path ends in ``.gz``),
+holding the method, URL, query params, request body, response status, headers, body and elapsed time.
+
+``replay(client, path, timing_scale=1.0)`` then serves those cassettes instead of the network, sleeping
+for each exchange's original elapsed time multiplied by ``timing_scale`` (``0`` to disable delays).
+That allows benchmarking pagination, retries and concurrency features against realistic traffic
+without a live subsidy service.
+
+Both work by mounting a ``requests`` transport adapter on the client's session, so auth, error
+handling and everything above the transport behave exactly as they do against the real service.
+"""
+import gzip
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# Token sent by replaying sessions, so they never call the OAuth provider.
+REPLAY_ACCESS_TOKEN = 'replayed-access-token'
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf8')
+    return open(path, mode, encoding='utf8')
+
+
+def _normalize_url(url):
+    """
+    Returns ``(url without query, sorted query params)``, so equivalent requests match regardless of param order.
+    """
+    parts = urlsplit(url)
+    params = sorted(parse_qsl(parts.query, keep_blank_values=True))
+    return urlunsplit(parts._replace(query='')), params
+
+
+def _decode_body(body):
+    """
+    Returns a request body as JSON data if it parses as JSON, or else as text.
+    """
+    if body is None:
+        return None
+    if isinstance(body, bytes):
+        body = body.decode('utf8', errors='replace')
+    try:
+        return json.loads(body)
+    except ValueError:
+        return body
+
+
+def _match_key(method, base_url, params, body):
+    return json.dumps([method.upper(), base_url, [list(param) for param in params], body], sort_keys=True)
+
+
+class Cassette:
+    """
+    A list of recorded exchanges, stored as JSON lines.
+
+    Appended exchanges go through one writer, kept open (so that a ``.gz`` cassette is a single gzip
+    stream) until ``close()``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def append(self, exchange):
+        """
+        Appends one exchange to the cassette file.
+        """
+        line = json.dumps(exchange, separators=(',', ':'), sort_keys=True)
+        with self._lock:
+            if self._writer is None:
+                self._writer = _open(self.path, 'a')
+            self._writer.write(line + '\n')
+
+    def flush(self):
+        """
+        Writes out the exchanges appended so far, so that they can be loaded.
+        """
+        with self._lock:
+            if self._writer is not None:
+                self._writer.flush()
+
+    def close(self):
+        """
+        Finishes the cassette file.  Later appends reopen it.
+        """
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def load(self):
+        """
+        Returns the recorded exchanges, in recording order.
+        """
+        self.flush()
+        with _open(self.path, 'r') as cassette_file:
+            return [json.loads(line) for line in cassette_file if line.strip()]
+
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    A transport adapter that sends requests for real, and records each exchange to a ``Cassette``.
+    """
+
+    def __init__(self, cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request, *args, **kwargs):
+        started_at = time.perf_counter()
+        response = super().send(request, *args, **kwargs)
+        # Reading the content here is part of the response time.
+        content = response.content
+        elapsed = time.perf_counter() - started_at
+        base_url, params = _normalize_url(request.url)
+        self.cassette.append({
+            'method': request.method,
+            'url': base_url,
+            'params': params,
+            'body': _decode_body(request.body),
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': dict(response.headers),
+            'content': content.decode('utf8', errors='replace'),
+            'elapsed': round(elapsed, 6),
+        })
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    A transport adapter that serves recorded exchanges instead of making requests.
+
+    Requests are matched on method, URL, query params and body.  Identical requests are answered with
+    their recorded responses in order (e.g. a 429 followed by a 201 for a retried write); once those are
+    used up, the last one keeps being served.  Unmatched requests raise ``requests.ConnectionError``.
+    """
+
+    def __init__(self, exchanges, timing_scale=1.0):
+        super().__init__()
+        self.timing_scale = timing_scale
+        self._exchanges = defaultdict(deque)
+        self._lock = threading.Lock()
+        for exchange in exchanges:
+            key = _match_key(exchange['method'], exchange['url'], exchange['params'], exchange['body'])
+            self._exchanges[key].append(exchange)
+
+    def _next_exchange(self, request):
+        """
+        Returns the recorded exchange that answers ``request``, as described in the class docstring.
+        """
+        key = _match_key(request.method, *_normalize_url(request.url), _decode_body(request.body))
+        with self._lock:
+            queue = self._exchanges.get(key)
+            if not queue:
+                raise requests.exceptions.ConnectionError(
+                    f'No recorded response for {request.method} {request.url}', request=request,
+                )
+            return queue.popleft() if len(queue) > 1 else queue[0]
+
+    def send(self, request, *_args, **_kwargs):
+        exchange = self._next_exchange(request)
+        if self.timing_scale:
+            time.sleep(exchange['elapsed'] * self.timing_scale)
+        response = requests.Response()
+        response.status_code = exchange['status']
+        response.reason = exchange.get('reason')
+        response.headers = CaseInsensitiveDict(exchange['headers'])
+        # Recorded content is already decoded, so don't let requests try to decompress it again.
+        response.headers.pop('Content-Encoding', None)
+        response._content = exchange['content'].encode('utf8')  # pylint: disable=protected-access
+        response._content_consumed = True  # pylint: disable=protected-access
+        response.encoding = 'utf8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def record(client, path):
+    """
+    Starts recording every exchange made through ``client`` to the cassette at ``path``.
+
+    Returns:
+        Cassette: Call its ``close()`` once done recording, to finish the file.
+    """
+    cassette = Cassette(path)
+    adapter = RecordingAdapter(cassette)
+    client.client.mount('http://', adapter)
+    client.client.mount('https://', adapter)
+    return cassette
+
+
+def replay(client, path, timing_scale=1.0):
+    """
+    Makes ``client`` serve every request from the cassette at ``path``, instead of the network.
+
+    The client's session also sends a dummy access token instead of fetching one, so that no OAuth
+    provider is needed either.  Other clients in the process are unaffected.
+
+    Args:
+        timing_scale (float): Multiplier for the recorded response times; 0 replays without delays.
+
+    Returns:
+        ReplayAdapter
+    """
+    adapter = ReplayAdapter(Cassette(path).load(), timing_scale=timing_scale)
+    client.client.mount('http://', adapter)
+    client.client.mount('https://', adapter)
+    client.client.access_token_override = REPLAY_ACCESS_TOKEN
+    return adapter
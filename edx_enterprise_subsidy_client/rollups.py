@@ -0,0 +1,173 @@
+"""
+Memory-bounded roll-ups of a subsidy's transactions.
+
+Computing spend per policy, per content key or per day by loading a whole ledger into memory (e.g.
+a pandas DataFrame) costs gigabytes for the largest subsidies.  ``TransactionRollup`` instead consumes
+transaction pages as they're streamed by ``iter_subsidy_transaction_pages()`` and keeps only running
+sums and counts per group, in compact ``array`` columns, so memory is O(groups) however long the
+ledger is.
+
+Quantities are net of committed reversals, so a reversed redemption adds nothing to spend.
+``total_quantity`` is computed the same way as the service's ``include_aggregates`` total, over the same
+filters, so the two can be cross-checked with ``cross_check()``.
+"""
+import datetime
+from array import array
+
+from django.utils.dateparse import parse_datetime
+
+from .client import TransactionStateChoices
+
+# The only fields a roll-up needs, requested via field selection to keep pages small.
+ROLLUP_FIELDS = ['state', 'quantity', 'reversal', 'subsidy_access_policy_uuid', 'content_key', 'created']
+
+
+class GroupedSums:
+    """
+    Running transaction counts and quantity sums per group key, stored as two parallel int64 arrays.
+    """
+
+    __slots__ = ('_index', '_counts', '_quantities')
+
+    def __init__(self):
+        self._index = {}
+        self._counts = array('q')
+        self._quantities = array('q')
+
+    def add(self, key, quantity):
+        """
+        Counts one transaction of the given quantity in the ``key`` group.
+        """
+        position = self._index.get(key)
+        if position is None:
+            position = self._index[key] = len(self._counts)
+            self._counts.append(0)
+            self._quantities.append(0)
+        self._counts[position] += 1
+        self._quantities[position] += quantity
+
+    def __len__(self):
+        return len(self._index)
+
+    def as_dict(self):
+        """
+        Returns ``{key: {'count': ..., 'total_quantity': ...}}``.
+        """
+        return {
+            key: {'count': self._counts[position], 'total_quantity': self._quantities[position]}
+            for key, position in self._index.items()
+        }
+
+
+def _net_quantity(transaction):
+    """
+    Returns the transaction's quantity, plus that of its reversal if the reversal is committed.
+    """
+    quantity = int(transaction.get('quantity') or 0)
+    reversal = transaction.get('reversal')
+    if reversal and reversal.get('state') == TransactionStateChoices.COMMITTED:
+        quantity += int(reversal.get('quantity') or 0)
+    return quantity
+
+
+def _day(created):
+    """
+    Returns the UTC date of a ``created`` timestamp in ISO format, or None if it's missing or unparseable.
+    """
+    if not created:
+        return None
+    timestamp = parse_datetime(created)
+    if timestamp is None:
+        return None
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(datetime.timezone.utc)
+    return timestamp.date().isoformat()
+
+
+class TransactionRollup:
+    """
+    Running totals of transactions, overall and grouped by state, policy, content key and (UTC) day.
+
+    Quantities are in the subsidy's unit, e.g. cents; redemptions are negative.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_quantity = 0
+        self.by_state = GroupedSums()
+        self.by_policy = GroupedSums()
+        self.by_content_key = GroupedSums()
+        self.by_day = GroupedSums()
+
+    def add(self, transaction):
+        """
+        Adds one transaction to the totals.
+        """
+        quantity = _net_quantity(transaction)
+        self.count += 1
+        self.total_quantity += quantity
+        self.by_state.add(transaction.get('state'), quantity)
+        self.by_policy.add(transaction.get('subsidy_access_policy_uuid'), quantity)
+        self.by_content_key.add(transaction.get('content_key'), quantity)
+        self.by_day.add(_day(transaction.get('created')), quantity)
+
+    def add_page(self, transactions):
+        """
+        Adds a page of transactions to the totals.
+        """
+        for transaction in transactions:
+            self.add(transaction)
+
+    def as_dict(self):
+        """
+        Returns the totals as plain, JSON-serializable dicts.
+        """
+        return {
+            'count': self.count,
+            'total_quantity': self.total_quantity,
+            'by_state': self.by_state.as_dict(),
+            'by_policy': self.by_policy.as_dict(),
+            'by_content_key': self.by_content_key.as_dict(),
+            'by_day': self.by_day.as_dict(),
+        }
+
+    def cross_check(self, server_aggregates):
+        """
+        Compares the totals with the ``aggregates`` the service returned for the same filters.
+
+        Returns:
+            dict: ``{field: {'local': ..., 'server': ...}}`` for each differing field; empty if they agree.
+        """
+        mismatches = {}
+        server_total = (server_aggregates or {}).get('total_quantity')
+        if server_total is not None and int(server_total) != self.total_quantity:
+            mismatches['total_quantity'] = {'local': self.total_quantity, 'server': int(server_total)}
+        return mismatches
+
+
+def rollup_subsidy_transactions(client, subsidy_uuid, cross_check=True, **list_kwargs):
+    """
+    Streams every transaction in a subsidy into a ``TransactionRollup``.
+
+    Only one page of transactions, trimmed to ``ROLLUP_FIELDS``, is in memory at a time.
+
+    Args:
+        cross_check (bool): Also fetch the service's aggregates for the same filters, and compare.
+        list_kwargs: Filters passed through to ``list_subsidy_transactions()``.
+
+    Returns:
+        tuple: ``(rollup, mismatches)``, where ``mismatches`` is the result of ``rollup.cross_check()``
+        (always empty without ``cross_check``).
+    """
+    list_kwargs.setdefault('fields', ROLLUP_FIELDS)
+    rollup = TransactionRollup()
+    for page in client.iter_subsidy_transaction_pages(subsidy_uuid, **list_kwargs):
+        rollup.add_page(page)
+    if not cross_check:
+        return rollup, {}
+    list_kwargs.pop('fields')
+    list_kwargs.pop('page_size', None)
+    server_aggregates = client.list_subsidy_transactions(
+        subsidy_uuid, include_aggregates=True, page_size=1, **list_kwargs,
+    ).get('aggregates')
+    return rollup, rollup.cross_check(server_aggregates)
@@ -0,0 +1,134 @@
+"""
+An in-process scheduler for ledger writes.
+
+The V2 create endpoints answer 429 while another write holds the subsidy's ledger lock, so concurrent
+writers in one process to the same subsidy mostly spend round trips on lock contention.
+``LedgerWriteScheduler`` queues ``create_subsidy_transaction()`` and ``create_subsidy_deposit()``
+calls per subsidy: writes to the same ledger run one at a time, in submission order, while writes to
+different ledgers run concurrently on a shared worker pool.  Callers get ``concurrent.futures.Future``
+objects.  429s caused by writers outside the process are still retried.
+"""
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .client import DEFAULT_FAN_OUT_WORKERS, retry_on_ledger_lock
+
+
+class LedgerWriteScheduler:
+    """
+    Serializes writes per subsidy ledger, and runs writes to different ledgers concurrently.
+
+    Args:
+        client: An ``EnterpriseSubsidyAPIClientV2`` instance.
+        max_workers (int): How many ledgers are written to at once.
+
+    Usage::
+
+        with LedgerWriteScheduler(client) as scheduler:
+            futures = [scheduler.submit_transaction(subsidy_uuid, ...) for ... in ...]
+            transactions = [future.result() for future in futures]
+    """
+
+    def __init__(self, client, max_workers=DEFAULT_FAN_OUT_WORKERS):
+        self.client = client
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ledger-writes')
+        self._queues = {}
+        self._lock = threading.Lock()
+        self._shut_down = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def submit(self, subsidy_uuid, write, *args, **kwargs):
+        """
+        Queues ``write(*args, **kwargs)`` behind any other writes to the subsidy's ledger.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the write's return value, or its exception.
+
+        Raises:
+            RuntimeError: If the scheduler has been shut down.
+        """
+        future = Future()
+        subsidy_uuid = str(subsidy_uuid)
+        with self._lock:
+            if self._shut_down:
+                raise RuntimeError('cannot schedule new writes after shutdown')
+            queue = self._queues.get(subsidy_uuid)
+            idle = queue is None
+            if idle:
+                queue = self._queues[subsidy_uuid] = deque()
+            queue.append((future, write, args, kwargs))
+        if idle:
+            self._executor.submit(self._drain, subsidy_uuid)
+        return future
+
+    def _drain(self, subsidy_uuid):
+        """
+        Runs the next queued write for the subsidy, then requeues itself if more are waiting.
+
+        Requeueing after each write, rather than looping, lets busy ledgers share the pool fairly.
+        """
+        with self._lock:
+            # Left queued while it runs, so pending() and shutdown() account for it.
+            future, write, args, kwargs = self._queues[subsidy_uuid][0]
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(retry_on_ledger_lock(lambda: write(*args, **kwargs)))
+            except Exception as exc:
+                future.set_exception(exc)
+        with self._lock:
+            self._queues[subsidy_uuid].popleft()
+            if not self._queues[subsidy_uuid]:
+                del self._queues[subsidy_uuid]
+                return
+        self._executor.submit(self._drain, subsidy_uuid)
+
+    def submit_transaction(self, subsidy_uuid, *args, **kwargs):
+        """
+        Queues ``client.create_subsidy_transaction(subsidy_uuid, *args, **kwargs)``.
+        """
+        return self.submit(subsidy_uuid, self.client.create_subsidy_transaction, subsidy_uuid, *args, **kwargs)
+
+    def submit_deposit(self, subsidy_uuid, *args, **kwargs):
+        """
+        Queues ``client.create_subsidy_deposit(subsidy_uuid, *args, **kwargs)``.
+        """
+        return self.submit(subsidy_uuid, self.client.create_subsidy_deposit, subsidy_uuid, *args, **kwargs)
+
+    def pending(self):
+        """
+        Returns the number of queued or running writes, per subsidy.
+        """
+        with self._lock:
+            return {subsidy_uuid: len(queue) for subsidy_uuid, queue in self._queues.items()}
+
+    def shutdown(self, wait=True):
+        """
+        Waits for (if ``wait``) all queued writes, then stops the worker pool.
+
+        Without ``wait``, only the write each ledger is currently on still runs: the futures of writes
+        queued behind it are cancelled, since the stopped pool could never run them.
+        """
+        with self._lock:
+            self._shut_down = True
+            if not wait:
+                for queue in self._queues.values():
+                    while len(queue) > 1:
+                        queue.pop()[0].cancel()
+        if wait:
+            while True:
+                with self._lock:
+                    futures = [item[0] for queue in self._queues.values() for item in queue]
+                if not futures:
+                    break
+                for future in futures:
+                    try:
+                        future.exception()
+                    except BaseException:
+                        pass
+        self._executor.shutdown(wait=wait)
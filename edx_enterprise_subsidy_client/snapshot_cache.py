@@ -0,0 +1,232 @@
+"""
+A cache backend whose hot entries survive restarts, via a snapshot file.
+
+Content metadata and subsidy records stay valid for hours, but every deploy starts processes with
+empty caches.  ``SnapshotCacheBackend`` is an in-memory LRU backend that can also ``save()`` its most
+recently used entries to a compact binary file, e.g. at exit.  The next process memory-maps that
+file when the backend is created and reads only its small header: entries are looked up in the
+mapped index and decoded only when first requested, so startup takes milliseconds however large
+the snapshot is.
+
+File layout (little-endian):
+
+* header: magic, a 16-byte version stamp, the entry count and the index offset;
+* data: each entry's JSON-encoded ``[key, entry]``, back to back;
+* index: one ``(key hash, expires_at, offset, length)`` record per entry, sorted by key hash, so a
+  lookup is a binary search over the mapped file.
+
+Entries keep their original expiry times, and ``save()`` carries over the loaded snapshot's entries that
+were never requested, so they aren't lost by a process that didn't need them.  The snapshot is only
+read and unmapped while holding the backend's lock, so ``clear()`` and ``close()`` are safe to call while
+other threads read.  The version stamp defaults to one derived from
+``settings.ENTERPRISE_SUBSIDY_URL``, so a snapshot taken against another environment is ignored.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import mmap
+import struct
+import time
+
+from django.conf import settings
+
+from .cache import DEFAULT_MAX_ENTRIES, LocalMemoryCacheBackend
+from .files import atomic_write, stable_key_hash
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ESCSNAP1'
+# magic, version stamp, entry count, index offset
+FILE_HEADER = struct.Struct('<8s16sIQ')
+# key hash, expires_at, offset, length
+INDEX_RECORD = struct.Struct('<QdQI')
+
+DEFAULT_MAX_SNAPSHOT_ENTRIES = 5000
+
+
+def _version_stamp(version):
+    return hashlib.blake2b(version.encode('utf8'), digest_size=16).digest()
+
+
+class SnapshotCacheBackend(LocalMemoryCacheBackend):
+    """
+    An in-memory LRU backend, backed by a read-only snapshot of a previous process's entries.
+
+    Args:
+        path (str): The snapshot file to load from, and ``save()`` to.
+        max_entries (int): Maximum number of entries held in memory.
+        max_snapshot_entries (int): Maximum number of (most recently used) entries ``save()`` writes.
+        version (str): Snapshots saved with a different version are ignored; defaults to
+            ``settings.ENTERPRISE_SUBSIDY_URL``.
+        save_at_exit (bool): Register ``save()`` to run when the process exits.
+    """
+
+    def __init__(
+        self, path, max_entries=DEFAULT_MAX_ENTRIES, max_snapshot_entries=DEFAULT_MAX_SNAPSHOT_ENTRIES,
+        version=None, save_at_exit=False,
+    ):
+        super().__init__(max_entries=max_entries)
+        self.path = path
+        self.max_snapshot_entries = max_snapshot_entries
+        self.version_stamp = _version_stamp(version if version is not None else settings.ENTERPRISE_SUBSIDY_URL)
+        self._snapshot = None
+        self._snapshot_count = 0
+        self._index_offset = 0
+        # Keys deleted or overwritten since loading, which the snapshot must no longer answer for.
+        self._shadowed = set()
+        self._load()
+        if save_at_exit:
+            atexit.register(self.save)
+
+    def _load(self):
+        """
+        Maps the snapshot file, unless it's missing, truncated or was written by another version.
+        """
+        try:
+            with open(self.path, 'rb') as snapshot_file:
+                snapshot = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return  # missing or empty
+        if len(snapshot) < FILE_HEADER.size:
+            snapshot.close()
+            return
+        magic, version_stamp, count, index_offset = FILE_HEADER.unpack_from(snapshot, 0)
+        if (
+            magic != MAGIC or version_stamp != self.version_stamp
+            or index_offset + count * INDEX_RECORD.size > len(snapshot)
+        ):
+            logger.info('Ignoring subsidy client cache snapshot %s from another version', self.path)
+            snapshot.close()
+            return
+        self._snapshot, self._snapshot_count, self._index_offset = snapshot, count, index_offset
+
+    def _record(self, position):
+        return INDEX_RECORD.unpack_from(self._snapshot, self._index_offset + position * INDEX_RECORD.size)
+
+    def _find(self, key):
+        """
+        Returns the snapshotted ``(expires_at, entry)`` for ``key``, or None.  Callers must hold ``_lock``.
+        """
+        key_hash = stable_key_hash(key)
+        low, high = 0, self._snapshot_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._record(middle)[0] < key_hash:
+                low = middle + 1
+            else:
+                high = middle
+        # Check every record with this hash, in case of collisions.
+        for position in range(low, self._snapshot_count):
+            record_hash, expires_at, offset, length = self._record(position)
+            if record_hash != key_hash:
+                break
+            stored_key, entry = json.loads(self._snapshot[offset:offset + length])
+            if stored_key == key:
+                return expires_at, entry
+        return None
+
+    def get(self, key):
+        entry = super().get(key)
+        if entry is not None:
+            return entry
+        with self._lock:
+            if self._snapshot is None or key in self._shadowed:
+                return None
+            found = self._find(key)
+            if found is None:
+                return None
+            expires_at, entry = found
+            timeout = expires_at - time.time()
+            if timeout <= 0:
+                return None
+            # Promote it, so it's served from memory from now on.
+            self._set_locked(key, entry, timeout)
+            return entry
+
+    def set(self, key, entry, timeout):
+        with self._lock:
+            if self._snapshot is not None:
+                self._shadowed.add(key)
+            self._set_locked(key, entry, timeout)
+
+    def delete(self, key):
+        with self._lock:
+            if self._snapshot is not None:
+                self._shadowed.add(key)
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._close_snapshot()
+
+    def _close_snapshot(self):
+        """
+        ``close()``, for callers already holding ``_lock``.
+        """
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
+            self._snapshot_count = 0
+            self._shadowed = set()
+
+    def close(self):
+        """
+        Unmaps the snapshot file.  In-memory entries stay available.
+        """
+        with self._lock:
+            self._close_snapshot()
+
+    def _unpromoted_snapshot_records(self, now, skip_hashes):
+        """
+        Yields ``(key hash, expires_at, payload)`` for the unexpired snapshot entries whose key hash isn't
+        in ``skip_hashes``.  Payloads are copied as they are, without decoding.  Callers must hold ``_lock``.
+        """
+        if self._snapshot is None:
+            return
+        for position in range(self._snapshot_count):
+            record_hash, expires_at, offset, length = self._record(position)
+            if expires_at > now and record_hash not in skip_hashes:
+                yield record_hash, expires_at, self._snapshot[offset:offset + length]
+
+    def save(self):
+        """
+        Atomically writes the most recently used, unexpired entries to the snapshot file.
+
+        In-memory entries come first, then the loaded snapshot's entries that were never requested,
+        up to ``max_snapshot_entries`` in all.
+
+        Returns:
+            int: The number of entries written.
+        """
+        now = time.time()
+        records = []
+        with self._lock:
+            for key, (expires_at, entry) in reversed(self._entries.items()):
+                if len(records) >= self.max_snapshot_entries:
+                    break
+                if expires_at > now:
+                    payload = json.dumps([key, entry], separators=(',', ':')).encode('utf8')
+                    records.append((stable_key_hash(key), expires_at, payload))
+            if len(records) < self.max_snapshot_entries:
+                # Compared by hash, so a snapshot entry colliding with a newer key is dropped; it's only a cache.
+                skip_hashes = {stable_key_hash(key) for key in self._shadowed.union(self._entries)}
+                for record in self._unpromoted_snapshot_records(now, skip_hashes):
+                    if len(records) >= self.max_snapshot_entries:
+                        break
+                    records.append(record)
+
+        data = bytearray()
+        index = []
+        for key_hash, expires_at, payload in records:
+            index.append((key_hash, expires_at, FILE_HEADER.size + len(data), len(payload)))
+            data += payload
+        index.sort()
+
+        with atomic_write(self.path, mode='wb', prefix='.tmp-cache-snapshot-') as temp_file:
+            temp_file.write(FILE_HEADER.pack(MAGIC, self.version_stamp, len(index), FILE_HEADER.size + len(data)))
+            temp_file.write(data)
+            for record in index:
+                temp_file.write(INDEX_RECORD.pack(*record))
+        return len(index)
@@ -0,0 +1,114 @@
+"""
+Small, pluggable key/value stores for state the client keeps locally between runs,
+e.g. export checkpoints.
+
+Values must be JSON-serializable.  Any object providing ``get``, ``set``, ``delete`` and ``keys``
+with the same signatures as ``BaseLocalStore`` can be used in place of these (e.g. one backed by
+a database table or a Django cache).
+"""
+import json
+import threading
+
+from .files import atomic_write
+
+
+class BaseLocalStore:
+    """
+    Interface for a local key/value store.
+    """
+
+    def get(self, key, default=None):
+        """
+        Returns the value stored for ``key``, or ``default``.
+        """
+        raise NotImplementedError
+
+    def set(self, key, value):
+        """
+        Stores ``value`` for ``key``.
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        """
+        Removes ``key``, if present.
+        """
+        raise NotImplementedError
+
+    def keys(self):
+        """
+        Returns a list of all stored keys.
+        """
+        raise NotImplementedError
+
+
+class InMemoryLocalStore(BaseLocalStore):
+    """
+    A store that only lives as long as the process.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._data.get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def keys(self):
+        with self._lock:
+            return list(self._data)
+
+
+class JSONFileLocalStore(BaseLocalStore):
+    """
+    A store persisted to a single JSON file.
+
+    Every ``set()`` or ``delete()`` atomically rewrites the file, so a crash never leaves it half-written.
+    Intended for small amounts of state (checkpoints, watermarks), not bulk data.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = self._load()
+
+    def _load(self):
+        """
+        Returns the file's contents, or an empty store if the file doesn't exist yet.
+        """
+        try:
+            with open(self.path, encoding='utf8') as store_file:
+                return json.load(store_file)
+        except FileNotFoundError:
+            return {}
+
+    def _flush(self):
+        with atomic_write(self.path, prefix='.tmp-store-') as temp_file:
+            json.dump(self._data, temp_file, sort_keys=True)
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._data.get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._flush()
+
+    def delete(self, key):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self._flush()
+
+    def keys(self):
+        with self._lock:
+            return list(self._data)
@@ -0,0 +1,12 @@
+"""
+URLs for the enterprise-subsidy client's operational views.
+"""
+from django.urls import path
+
+from .views import subsidy_client_metrics
+
+app_name = 'edx_enterprise_subsidy_client'
+
+urlpatterns = [
+    path('subsidy-client/metrics/', subsidy_client_metrics, name='metrics'),
+]
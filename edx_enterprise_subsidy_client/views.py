@@ -0,0 +1,23 @@
+"""
+Django views exposing the client's operational state.
+"""
+from django.http import JsonResponse
+
+from .metrics import get_request_metrics
+
+
+def subsidy_client_metrics(request):
+    """
+    Returns per-endpoint latency percentiles and error rates of this process's subsidy client requests.
+
+    Only available to staff users.  Include ``edx_enterprise_subsidy_client.urls`` in the service's
+    URLconf to serve it.
+    """
+    user = getattr(request, 'user', None)
+    if not getattr(user, 'is_staff', False):
+        return JsonResponse({'detail': 'Staff access required.'}, status=403)
+    metrics = get_request_metrics()
+    return JsonResponse({
+        'window_seconds': metrics.window,
+        'endpoints': metrics.snapshot(),
+    })
@@ -0,0 +1,158 @@
+"""
+Prewarming of a client after process start.
+
+The first requests a fresh process (after a deploy or an autoscaling event) makes through the client pay
+for DNS resolution, TCP and TLS handshakes, an OAuth token fetch and cold caches.  ``warmup()`` pays
+those costs up front: it fetches a token, opens a number of pooled connections, and, if the client has
+a ``read_cache``, fills it with the subsidies and content metadata that were hottest in the previous
+process.
+
+Hot keys come from a small JSON file: ``track_hot_keys()`` counts the client's cacheable reads and
+snapshots the most frequent ones to that file when the process exits.
+
+The ``EnterpriseSubsidyClientConfig`` app config (see ``apps.py``) runs all of this at Django startup
+when the ``ENTERPRISE_SUBSIDY_CLIENT_WARMUP`` setting is defined.
+"""
+import atexit
+import json
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .client import DEFAULT_FAN_OUT_WORKERS, HOT_KEY_CONTENT_METADATA, HOT_KEY_SUBSIDY
+from .files import atomic_write
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WARMUP_CONNECTIONS = 4
+DEFAULT_MAX_HOT_KEYS = 500
+
+
+class HotKeyTracker:
+    """
+    Counts reads by ``(kind, *args)``, e.g. ``('subsidy', subsidy_uuid)``.
+    """
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, kind, *args):
+        """
+        Counts one read.
+        """
+        with self._lock:
+            self._counts[(kind, *args)] += 1
+
+    def most_common(self, max_keys=DEFAULT_MAX_HOT_KEYS):
+        """
+        Returns up to ``max_keys`` ``[kind, *args]`` lists, most frequent first.
+        """
+        with self._lock:
+            return [list(key) for key, _ in self._counts.most_common(max_keys)]
+
+    def snapshot(self, path, max_keys=DEFAULT_MAX_HOT_KEYS):
+        """
+        Atomically writes the most frequent keys to ``path``, for ``load_hot_keys()``.
+        """
+        with atomic_write(path, prefix='.tmp-hot-keys-') as temp_file:
+            json.dump(self.most_common(max_keys), temp_file)
+
+
+def load_hot_keys(path):
+    """
+    Returns the hot keys snapshotted to ``path``, or an empty list if there's no usable snapshot.
+    """
+    try:
+        with open(path, encoding='utf8') as hot_keys_file:
+            return json.load(hot_keys_file)
+    except (OSError, ValueError):
+        return []
+
+
+def track_hot_keys(client, snapshot_path=None, max_keys=DEFAULT_MAX_HOT_KEYS):
+    """
+    Starts counting the client's cacheable reads, and snapshots them to ``snapshot_path`` at exit.
+
+    Returns:
+        HotKeyTracker
+    """
+    if client.hot_keys is None:
+        client.hot_keys = HotKeyTracker()
+    if snapshot_path:
+        atexit.register(client.hot_keys.snapshot, snapshot_path, max_keys)
+    return client.hot_keys
+
+
+def _open_connection(client):
+    """
+    Makes a cheap request to open one pooled connection to the service.  Returns whether it succeeded.
+    """
+    try:
+        client.client.head(client.api_base_url, timeout=(5, 5))
+    except requests.exceptions.RequestException as exc:
+        logger.info('Subsidy client warmup request failed: %s', exc)
+        return False
+    return True
+
+
+def _prefetch(client, hot_key):
+    """
+    Reads one hot key through ``client`` so it lands in the read cache.  Failures are only logged.
+    """
+    kind, *args = hot_key
+    try:
+        if kind == HOT_KEY_SUBSIDY:
+            client.retrieve_subsidy(*args)
+        elif kind == HOT_KEY_CONTENT_METADATA:
+            client.get_subsidy_content_data(*args)
+    except requests.exceptions.RequestException as exc:
+        logger.info('Subsidy client warmup failed to prefetch %s: %s', hot_key, exc)
+
+
+def warmup(
+    client, connections=DEFAULT_WARMUP_CONNECTIONS, hot_keys=None, hot_keys_path=None,
+    max_workers=DEFAULT_FAN_OUT_WORKERS,
+):
+    """
+    Fetches an OAuth token, opens pooled connections and prefetches hot keys into the read cache.
+
+    Failures are logged, never raised: warming up is only ever an optimization.
+
+    Args:
+        client: An ``EnterpriseSubsidyAPIClient`` (or V2) instance.
+        connections (int): How many connections to the service to open, concurrently, and leave in
+            the session's pool.
+        hot_keys (list): ``[kind, *args]`` keys to prefetch, as returned by ``HotKeyTracker.most_common()``.
+        hot_keys_path (str): File to load hot keys from instead, as written by ``HotKeyTracker.snapshot()``.
+
+    Returns:
+        dict: ``{'token': bool, 'connections': int, 'prefetched': int}``, what was warmed: the number of
+        connections actually opened, and of hot keys prefetch was attempted for.
+    """
+    summary = {'token': False, 'connections': 0, 'prefetched': 0}
+    try:
+        client.client.token_manager.get_token()
+        summary['token'] = True
+    except requests.exceptions.RequestException as exc:
+        logger.warning('Subsidy client warmup failed to fetch an access token: %s', exc)
+
+    if hot_keys is None and hot_keys_path:
+        hot_keys = load_hot_keys(hot_keys_path)
+    if client.read_cache is None:
+        hot_keys = []
+
+    # Concurrent requests each need a connection of their own, so the pool ends up with that many.
+    with ThreadPoolExecutor(max_workers=max(connections, 1)) as executor:
+        opened = [executor.submit(_open_connection, client) for _ in range(connections)]
+    summary['connections'] = sum(future.result() for future in opened)
+
+    if hot_keys:
+        with ThreadPoolExecutor(max_workers=min(max_workers, connections or 1)) as executor:
+            list(executor.map(lambda hot_key: _prefetch(client, hot_key), hot_keys))
+        summary['prefetched'] = len(hot_keys)
+    logger.info('Subsidy client warmed up: %s', summary)
+    return summary
@@ -3,11 +3,9 @@ Hacky script for testing end-to-end flow between the client, enterprise-subsidy
 edx-enterprise enrollment layer.
 """
 from uuid import uuid4
-from django.conf import settings
 from pprint import pprint
-settings.ENTERPRISE_SUBSIDY_URL = 'http://enterprise-subsidy.app:18280'
 from edx_enterprise_subsidy_client import EnterpriseSubsidyAPIClient
-client = EnterpriseSubsidyAPIClient()
+client = EnterpriseSubsidyAPIClient(base_url='http://enterprise-subsidy.app:18280')
 enterprise_customer_uuid = '70699d54-7504-4429-8295-e1c0ec68dbc7'  # Test Enterprise
 content_key = 'course-v1:edX+DemoX+Demo_Course'
 
@@ -115,6 +115,17 @@ setup(
 
     include_package_data=True,
     install_requires=load_requirements('requirements/base.in'),
+    extras_require={
+        # Lets requests (via urllib3) accept and decode brotli and zstd compressed responses.
+        'compression': ['brotli', 'zstandard'],
+        # The HTTP/2 transport in http2.py.
+        'http2': ['httpx[http2]'],
+        # Parquet and Arrow exports in export.py.
+        'arrow': ['pyarrow'],
+        # Columnar transaction conversions in columnar.py.
+        'numpy': ['numpy'],
+        'pandas': ['pandas'],
+    },
     python_requires=">=3.8",
     license="AGPL 3.0",
     zip_safe=False,
@@ -0,0 +1,174 @@
+"""
+Tests for edx_enterprise_subsidy_client.aggregates.
+"""
+import threading
+import uuid
+from unittest import mock
+
+from pytest import raises
+
+from edx_enterprise_subsidy_client import EnterpriseSubsidyAPIClientV2
+from edx_enterprise_subsidy_client.aggregates import LearnerAggregateCache
+from edx_enterprise_subsidy_client.client import EnterpriseSubsidyAPIClientException
+from test_utils.utils import MockResponse
+
+SUBSIDY_UUID = str(uuid.uuid4())
+POLICY_UUID = str(uuid.uuid4())
+
+
+def _aggregates_response(url):
+    if POLICY_UUID in url:
+        return MockResponse([{'lms_user_id': 7, 'enrollment_count': 1, 'total_quantity': -10000}], 200)
+    return MockResponse([{'lms_user_id': 7, 'enrollment_count': 3, 'total_quantity': -30000}], 200)
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_views_are_fetched_once_and_answer_locally(mock_oauth_client):
+    """
+    Test that each (subsidy, policy) view is fetched once, and answers totals and limit checks locally.
+    """
+    mock_get = mock_oauth_client.return_value.get
+    mock_get.side_effect = _aggregates_response
+    cache = LearnerAggregateCache(EnterpriseSubsidyAPIClientV2())
+
+    assert cache.learner_totals(SUBSIDY_UUID, 7) == (3, -30000)
+    assert cache.learner_totals(SUBSIDY_UUID, '7', policy_uuid=POLICY_UUID) == (1, -10000)
+    assert cache.learner_totals(SUBSIDY_UUID, 8, policy_uuid=POLICY_UUID) == (0, 0)
+    assert not cache.would_exceed_limits(SUBSIDY_UUID, 7, POLICY_UUID, max_enrollments=2, max_spend=20000,
+                                         additional_spend=10000)
+    assert cache.would_exceed_limits(SUBSIDY_UUID, 7, POLICY_UUID, max_spend=20000, additional_spend=10001)
+    assert cache.would_exceed_limits(SUBSIDY_UUID, 7, max_enrollments=3)
+    assert mock_get.call_count == 2
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_own_creates_are_applied_as_deltas(mock_oauth_client):
+    """
+    Test that transactions created through the client update the cached views.
+    """
+    mock_oauth_client.return_value.get.side_effect = _aggregates_response
+    client = EnterpriseSubsidyAPIClientV2()
+    cache = LearnerAggregateCache(client)
+    cache.get_view(SUBSIDY_UUID)
+    cache.get_view(SUBSIDY_UUID, POLICY_UUID)
+
+    mock_oauth_client.return_value.post.return_value = MockResponse({
+        'uuid': str(uuid.uuid4()),
+        'state': 'committed',
+        'lms_user_id': 7,
+        'quantity': -5000,
+        'subsidy_access_policy_uuid': POLICY_UUID,
+    }, 201)
+    client.create_subsidy_transaction(SUBSIDY_UUID, 7, 'course', POLICY_UUID, {})
+
+    assert cache.learner_totals(SUBSIDY_UUID, 7) == (4, -35000)
+    assert cache.learner_totals(SUBSIDY_UUID, 7, POLICY_UUID) == (2, -15000)
+    assert mock_oauth_client.return_value.get.call_count == 2
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_ttl_and_refresh_ahead(mock_oauth_client):
+    """
+    Test that views are refreshed in the background near their TTL, and refetched past it.
+    """
+    mock_get = mock_oauth_client.return_value.get
+    mock_get.side_effect = _aggregates_response
+    cache = LearnerAggregateCache(EnterpriseSubsidyAPIClientV2(), ttl=100, refresh_ahead=10)
+    view = cache.get_view(SUBSIDY_UUID)
+
+    # Inside the refresh-ahead window: the cached view is served, and refreshed in the background.
+    view.fetched_at -= 95
+    with mock.patch('edx_enterprise_subsidy_client.aggregates.threading.Thread') as mock_thread:
+        assert cache.get_view(SUBSIDY_UUID) is view
+    mock_thread.return_value.start.assert_called_once_with()
+
+    # Expired: refetched synchronously.
+    view.fetched_at -= 10
+    assert cache.get_view(SUBSIDY_UUID) is not view
+    assert mock_get.call_count == 2
+
+    cache.invalidate(SUBSIDY_UUID)
+    cache.get_view(SUBSIDY_UUID)
+    assert mock_get.call_count == 3
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_creates_during_a_fetch_are_not_lost(mock_oauth_client):
+    """
+    Test that a transaction created while its view is being fetched is applied to the fetched view.
+    """
+    client = EnterpriseSubsidyAPIClientV2()
+    cache = LearnerAggregateCache(client, ttl=100, refresh_ahead=10)
+    mock_oauth_client.return_value.post.return_value = MockResponse({
+        'uuid': str(uuid.uuid4()),
+        'state': 'committed',
+        'lms_user_id': 7,
+        'quantity': -5000,
+        'subsidy_access_policy_uuid': POLICY_UUID,
+    }, 201)
+
+    def create_while_fetching(url):
+        # The server's response predates the transaction.
+        response = _aggregates_response(url)
+        client.create_subsidy_transaction(SUBSIDY_UUID, 7, 'course', POLICY_UUID, {})
+        return response
+
+    mock_oauth_client.return_value.get.side_effect = create_while_fetching
+    view = cache.get_view(SUBSIDY_UUID)
+    assert view.get(7) == (4, -35000)
+
+    # The view is refreshed on its next use, in case the server data already counted the transaction.
+    mock_oauth_client.return_value.get.side_effect = _aggregates_response
+    with mock.patch('edx_enterprise_subsidy_client.aggregates.threading.Thread') as mock_thread:
+        assert cache.get_view(SUBSIDY_UUID) is view
+    mock_thread.return_value.start.assert_called_once_with()
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_missing_spend_is_not_treated_as_zero(mock_oauth_client):
+    """
+    Test that spend limits can't pass when the service doesn't return ``total_quantity``.
+    """
+    mock_oauth_client.return_value.get.return_value = MockResponse([{'lms_user_id': 7, 'enrollment_count': 1}], 200)
+    cache = LearnerAggregateCache(EnterpriseSubsidyAPIClientV2())
+
+    with mock.patch('edx_enterprise_subsidy_client.aggregates.logger') as mock_logger:
+        assert not cache.get_view(SUBSIDY_UUID).spend_known
+    mock_logger.error.assert_called_once()
+    # Enrollment limits still work.
+    assert cache.would_exceed_limits(SUBSIDY_UUID, 7, max_enrollments=1)
+    assert not cache.would_exceed_limits(SUBSIDY_UUID, 7, max_enrollments=2)
+    with raises(EnterpriseSubsidyAPIClientException):
+        cache.would_exceed_limits(SUBSIDY_UUID, 7, max_enrollments=2, max_spend=20000, additional_spend=100)
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_concurrent_misses_share_one_fetch(mock_oauth_client):
+    """
+    Test that lookups racing for a view that isn't cached yet only fetch it once.
+    """
+    fetching = threading.Event()
+    release = threading.Event()
+
+    def slow_aggregates_response(url):
+        fetching.set()
+        release.wait(5)
+        return _aggregates_response(url)
+
+    mock_get = mock_oauth_client.return_value.get
+    mock_get.side_effect = slow_aggregates_response
+    cache = LearnerAggregateCache(EnterpriseSubsidyAPIClientV2())
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.learner_totals(SUBSIDY_UUID, 7))) for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    fetching.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == [(3, -30000)] * 5
+    assert mock_get.call_count == 1
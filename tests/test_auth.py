@@ -0,0 +1,154 @@
+"""
+Tests for edx_enterprise_subsidy_client.auth.
+"""
+import datetime
+import threading
+import time
+from unittest import mock
+
+import pytest
+import requests
+from edx_django_utils.cache import TieredCache
+
+from edx_enterprise_subsidy_client import auth
+from edx_enterprise_subsidy_client.auth import OAuthAPIClient, OAuthTokenManager, get_token_manager
+
+
+@pytest.fixture(autouse=True)
+def _reset_token_managers():
+    """
+    Clears the process-wide token managers and the shared token cache around each test.
+    """
+    auth.reset_token_managers()
+    TieredCache.dangerous_clear_all_tiers()
+    yield
+    auth.reset_token_managers()
+    TieredCache.dangerous_clear_all_tiers()
+
+
+def _token_response(token, expires_in):
+    """
+    Returns what ``get_oauth_access_token()`` would for a token valid for ``expires_in`` seconds.
+    """
+    return token, datetime.datetime.utcnow() + datetime.timedelta(seconds=expires_in)
+
+
+@mock.patch('edx_enterprise_subsidy_client.auth.get_oauth_access_token')
+def test_concurrent_initial_fetch_is_single_flight(mock_get_token):
+    """
+    Threads that all need a token at once should cause exactly one fetch.
+    """
+    def slow_fetch(*_args, **_kwargs):
+        time.sleep(0.05)
+        return _token_response('the-token', 3600)
+
+    mock_get_token.side_effect = slow_fetch
+    manager = OAuthTokenManager('http://oauth', 'client-id', 'secret')
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.get_token())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ['the-token'] * 8
+    assert mock_get_token.call_count == 1
+
+
+@mock.patch('edx_enterprise_subsidy_client.auth.get_oauth_access_token')
+def test_refresh_window_serves_current_token_and_refreshes_in_background(mock_get_token):
+    """
+    Inside the refresh window, callers keep getting the current token while a background
+    refresh replaces it.
+    """
+    refresh_started = threading.Event()
+    release_refresh = threading.Event()
+
+    def blocking_fetch(*_args, **_kwargs):
+        refresh_started.set()
+        release_refresh.wait(1)
+        return _token_response('new-token', 3600)
+
+    manager = OAuthTokenManager('http://oauth', 'client-id', 'secret')
+    manager.seed('old-token', expires_in=300)
+    manager._refresh_at = 0  # pylint: disable=protected-access
+    mock_get_token.side_effect = blocking_fetch
+
+    assert manager.get_token() == 'old-token'
+    assert refresh_started.wait(1)
+    # A refresh is in flight, so no second one is started and callers are not blocked.
+    assert manager.refresh_in_background() is False
+    assert manager.get_token() == 'old-token'
+
+    release_refresh.set()
+    for _ in range(100):
+        if manager.get_token() == 'new-token':
+            break
+        time.sleep(0.01)
+    assert manager.get_token() == 'new-token'
+    assert mock_get_token.call_count == 1
+
+
+@mock.patch('edx_enterprise_subsidy_client.auth.get_oauth_access_token')
+def test_failed_background_refresh_keeps_current_token(mock_get_token):
+    """
+    Test that a failed background refresh leaves the current token in use.
+    """
+    mock_get_token.side_effect = requests.ConnectionError('provider is down')
+    manager = OAuthTokenManager('http://oauth', 'client-id', 'secret')
+    manager.seed('old-token', expires_in=300)
+    manager._refresh_at = 0  # pylint: disable=protected-access
+
+    assert manager.get_token() == 'old-token'
+    with manager._refresh_lock:  # pylint: disable=protected-access
+        # wait for the background thread to finish
+        pass
+    assert manager.get_token() == 'old-token'
+    assert mock_get_token.call_count == 1
+
+
+def test_token_manager_is_shared_across_clients():
+    """
+    Test that clients with the same credentials and OAuth URL share one token manager.
+    """
+    first = OAuthAPIClient('http://oauth/', 'client-id', 'secret')
+    second = OAuthAPIClient('http://oauth', 'client-id', 'secret')
+    assert first.token_manager is second.token_manager
+    assert get_token_manager('http://oauth', 'client-id', 'secret') is first.token_manager
+
+
+def test_client_authenticates_with_managed_token():
+    """
+    Test that the client authenticates with its token manager's token.
+    """
+    client = OAuthAPIClient('http://oauth', 'client-id', 'secret')
+    client.token_manager.seed('seeded-token', expires_in=3600)
+    client._ensure_authentication()  # pylint: disable=protected-access
+    assert client.auth.token == 'seeded-token'
+
+
+@mock.patch('edx_enterprise_subsidy_client.auth.get_oauth_access_token')
+def test_tokens_are_shared_between_processes(mock_get_token):
+    """
+    Tokens are shared through the TieredCache, under edx-rest-api-client's key.
+    """
+    mock_get_token.return_value = _token_response('shared-token', 3600)
+    assert OAuthTokenManager('http://oauth', 'client-id', 'secret').get_token() == 'shared-token'
+    cached_response = TieredCache.get_cached_response(
+        'edx_rest_api_client.access_token.jwt.client_credentials.client-id.http://oauth/oauth2/access_token'
+    )
+    assert cached_response.value[0] == 'shared-token'
+
+    # Another process's manager adopts the shared token instead of fetching its own.
+    other_manager = OAuthTokenManager('http://oauth', 'client-id', 'secret')
+    assert other_manager.get_token() == 'shared-token'
+    assert mock_get_token.call_count == 1
+
+    # Once that token is due for a refresh, a new one is fetched and shared.
+    mock_get_token.return_value = _token_response('next-token', 3600)
+    assert other_manager.refresh() == 'shared-token'
+    other_manager._refresh_at = 0  # pylint: disable=protected-access
+    assert other_manager.refresh() == 'next-token'
+    assert mock_get_token.call_count == 2
+    assert OAuthTokenManager('http://oauth', 'client-id', 'secret').get_token() == 'next-token'
@@ -0,0 +1,88 @@
+"""
+Tests for edx_enterprise_subsidy_client.batching.
+"""
+import threading
+import time
+from unittest import mock
+
+import requests
+from pytest import raises
+
+from edx_enterprise_subsidy_client.batching import CanRedeemBatcher
+
+
+def _client():
+    """
+    Returns a mock client whose ``can_redeem()`` allows learner 1, denies others, and fails for ``'broken'``.
+    """
+    def can_redeem(_subsidy_uuid, lms_user_id, content_key):
+        if content_key == 'broken':
+            raise requests.exceptions.ConnectionError()
+        return {'can_redeem': lms_user_id == '1', 'content_key': content_key}
+    return mock.Mock(can_redeem=mock.Mock(side_effect=can_redeem))
+
+
+def test_batches_deduplicate_calls_until_needed():
+    """
+    Test that identical calls share one request, and the batch is only sent once a result is needed.
+    """
+    client = _client()
+    with CanRedeemBatcher(client, window=None) as batcher:
+        first = batcher.submit('subsidy', 1, 'edX+DemoX')
+        duplicate = batcher.submit('subsidy', 1, 'edX+DemoX')
+        other = batcher.submit('subsidy', 2, 'edX+DemoX')
+        broken = batcher.submit('subsidy', 1, 'broken')
+        client.can_redeem.assert_not_called()
+
+        # Asking for any result sends the whole batch.
+        assert first.result() == {'can_redeem': True, 'content_key': 'edX+DemoX'}
+        assert duplicate is first
+        assert other.result()['can_redeem'] is False
+        with raises(requests.exceptions.ConnectionError):
+            broken.result()
+
+    assert client.can_redeem.call_count == 3
+    assert batcher.stats == {'calls': 4, 'requests': 3, 'batches': 1}
+
+
+def test_batch_window():
+    """
+    Test that the window timer sends calls submitted from several threads as one batch.
+    """
+    client = _client()
+    with CanRedeemBatcher(client, window=0.01) as batcher:
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(batcher.submit('subsidy', 1, 'edX+DemoX')))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # The window timer sends the batch without anyone asking for a result.
+        for _ in range(100):
+            if results[0].done():
+                break
+            time.sleep(0.01)
+        assert results[0].done()
+        assert len(set(results)) == 1
+        assert batcher.can_redeem('subsidy', 2, 'edX+DemoX')['can_redeem'] is False
+
+    assert client.can_redeem.call_count == 2
+
+
+def test_answers_are_reused_for_the_batchers_lifetime():
+    """
+    Test that successful answers are reused for later identical calls, and failures are not.
+    """
+    client = _client()
+    with CanRedeemBatcher(client) as batcher:
+        for _ in range(3):
+            assert batcher.can_redeem('subsidy', 1, 'edX+DemoX')['can_redeem'] is True
+        # Failures aren't reused.
+        for _ in range(2):
+            with raises(requests.exceptions.ConnectionError):
+                batcher.can_redeem('subsidy', 1, 'broken')
+
+    assert batcher.stats == {'calls': 5, 'requests': 3, 'batches': 3}
@@ -0,0 +1,134 @@
+"""
+Tests for edx_enterprise_subsidy_client.cache.
+"""
+import threading
+import time
+import uuid
+from unittest import mock
+
+import requests
+from pytest import raises
+
+from edx_enterprise_subsidy_client import EnterpriseSubsidyAPIClient
+from edx_enterprise_subsidy_client.cache import LocalMemoryCacheBackend, StaleWhileRevalidateCache
+from test_utils.utils import MockResponse
+
+
+def _age_entry(cache, key, seconds):
+    """
+    Makes the cached entry for ``key`` look ``seconds`` older.
+    """
+    entry = cache.backend.get(key)
+    entry['stored_at'] -= seconds
+
+
+def test_local_memory_backend_lru_and_timeout():
+    """
+    Test that the local memory backend evicts least recently used entries and expires timed out ones.
+    """
+    backend = LocalMemoryCacheBackend(max_entries=2)
+    backend.set('a', {'value': 1}, 60)
+    backend.set('b', {'value': 2}, 60)
+    backend.get('a')
+    backend.set('c', {'value': 3}, 60)
+    assert backend.get('b') is None
+    assert backend.get('a') == {'value': 1}
+    backend.set('d', {'value': 4}, -1)
+    assert backend.get('d') is None
+
+
+def test_stale_while_revalidate_states():
+    """
+    Test that entries are served fresh, served stale while refreshing, or refetched, according to their age.
+    """
+    cache = StaleWhileRevalidateCache(fresh_ttl=10, stale_ttl=100, stale_if_error=1000)
+    fetch = mock.Mock(return_value='v1')
+    assert cache.get_or_fetch('key', fetch) == 'v1'
+    assert cache.get_or_fetch('key', fetch) == 'v1'
+    assert fetch.call_count == 1
+
+    # Stale but usable: served immediately, refreshed once in the background.
+    _age_entry(cache, 'key', 50)
+    refreshed = threading.Event()
+
+    def background_fetch():
+        refreshed.set()
+        return 'v2'
+
+    assert cache.get_or_fetch('key', background_fetch) == 'v1'
+    assert refreshed.wait(1)
+    for _ in range(100):
+        if not cache._refreshing:  # pylint: disable=protected-access
+            break
+        time.sleep(0.01)
+    assert cache.get_or_fetch('key', fetch) == 'v2'
+
+    # Past the hard expiry: the caller blocks on a fetch.
+    _age_entry(cache, 'key', 200)
+    assert cache.get_or_fetch('key', mock.Mock(return_value='v3')) == 'v3'
+    assert cache.stats['misses'] == 2
+    assert cache.stats['stale_hits'] == 1
+
+
+def test_stale_if_error():
+    """
+    Test that a stale value is served when a fetch fails with a transport error, until stale_if_error passes.
+    """
+    cache = StaleWhileRevalidateCache(fresh_ttl=10, stale_ttl=100, stale_if_error=1000)
+    cache.set('key', 'stale-value')
+    failing_fetch = mock.Mock(side_effect=requests.exceptions.ConnectionError())
+
+    _age_entry(cache, 'key', 500)
+    assert cache.get_or_fetch('key', failing_fetch) == 'stale-value'
+    assert cache.stats['stale_if_error_hits'] == 1
+
+    _age_entry(cache, 'key', 600)
+    with raises(requests.exceptions.ConnectionError):
+        cache.get_or_fetch('key', failing_fetch)
+
+
+def test_stale_if_error_only_for_transient_errors():
+    """
+    Test that 5xx responses fall back to the stale value, while 404s and 403s are raised and drop it.
+    """
+    cache = StaleWhileRevalidateCache(fresh_ttl=10, stale_ttl=100, stale_if_error=1000)
+    cache.set('key', 'stale-value')
+    _age_entry(cache, 'key', 500)
+    unavailable = requests.exceptions.HTTPError(response=MockResponse({}, 503))
+    assert cache.get_or_fetch('key', mock.Mock(side_effect=unavailable)) == 'stale-value'
+
+    for status_code in (404, 403):
+        cache.set('key', 'stale-value')
+        _age_entry(cache, 'key', 500)
+        definitive = requests.exceptions.HTTPError(response=MockResponse({}, status_code))
+        with raises(requests.exceptions.HTTPError):
+            cache.get_or_fetch('key', mock.Mock(side_effect=definitive))
+        assert cache.backend.get('key') is None
+    assert cache.stats['stale_if_error_hits'] == 1
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_client_read_cache(mock_oauth_client):
+    """
+    Test that the client serves repeated reads from its read cache.
+    """
+    mock_get = mock_oauth_client.return_value.get
+    subsidy_uuid = str(uuid.uuid4())
+    mock_get.return_value = MockResponse({'uuid': subsidy_uuid}, 200)
+
+    read_cache = StaleWhileRevalidateCache()
+    client = EnterpriseSubsidyAPIClient(read_cache=read_cache)
+    other_environment = EnterpriseSubsidyAPIClient(base_url='http://other-subsidy-service', read_cache=read_cache)
+
+    assert client.retrieve_subsidy(subsidy_uuid) == {'uuid': subsidy_uuid}
+    assert client.retrieve_subsidy(subsidy_uuid) == {'uuid': subsidy_uuid}
+    client.get_subsidy_content_data('customer', 'edX+DemoX')
+    client.get_subsidy_content_data('customer', 'edX+DemoX')
+    client.list_subsidies('customer', page=1)
+    client.list_subsidies('customer', page=1)
+    client.list_subsidies('customer', page=2)
+    assert mock_get.call_count == 4
+
+    # Entries are namespaced by service url.
+    other_environment.retrieve_subsidy(subsidy_uuid)
+    assert mock_get.call_count == 5
@@ -1,6 +1,9 @@
 """
 Tests for edx_enterprise_subsidy_client.py.
 """
+import os
+import subprocess
+import sys
 import uuid
 from unittest import mock
 
@@ -210,3 +213,268 @@ def test_client_v2_create_subsidy_deposit(mock_oauth_client):
         'metadata': {'key': 'value'},
     }
     mock_post.assert_called_once_with(expected_url, json=expected_post_payload)
+
+
+def test_client_url_overrides():
+    """
+    Tests that explicit constructor arguments take precedence over Django settings, per instance.
+    """
+    first = EnterpriseSubsidyAPIClientV2(base_url='https://subsidy-one.example.com/')
+    second = EnterpriseSubsidyAPIClientV2(
+        base_url='https://subsidy-two.example.com',
+        oauth2_provider_url='https://lms.example.com',
+        client_id='some-key',
+        client_secret='some-secret',
+    )
+    assert first.SUBSIDIES_ENDPOINT == 'https://subsidy-one.example.com/api/v1/subsidies/'
+    assert second.TRANSACTIONS_LIST_ENDPOINT == (
+        'https://subsidy-two.example.com/api/v2/subsidies/{subsidy_uuid}/admin/transactions/'
+    )
+    assert second.client._client_id == 'some-key'  # pylint: disable=protected-access
+    # Class-level access still resolves from settings.
+    assert EnterpriseSubsidyAPIClient.CONTENT_METADATA_ENDPOINT == (
+        'enterprise-subsidy-service-base-url/api/v1/content-metadata/'
+    )
+
+
+def test_package_import_does_not_require_settings():
+    """
+    Tests that importing the package, and creating a client with explicit URLs, doesn't need Django settings.
+    """
+    code = (
+        'from edx_enterprise_subsidy_client import EnterpriseSubsidyAPIClient\n'
+        'client = EnterpriseSubsidyAPIClient(\n'
+        '    base_url="http://subsidy", oauth2_provider_url="http://lms", client_id="a", client_secret="b",\n'
+        ')\n'
+        'assert client.SUBSIDIES_ENDPOINT == "http://subsidy/api/v1/subsidies/"\n'
+    )
+    env = {key: value for key, value in os.environ.items() if key != 'DJANGO_SETTINGS_MODULE'}
+    subprocess.run([sys.executable, '-c', code], check=True, env=env)
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_get_enterprise_subsidies_overview(mock_oauth_client):
+    """
+    Test that the overview fetches every part of every subsidy, isolating per-subsidy failures.
+    """
+    healthy_uuid, broken_uuid = str(uuid.uuid4()), str(uuid.uuid4())
+    customer_uuid = str(uuid.uuid4())
+
+    def get(url, params=None):
+        if url.endswith('/subsidies/') and params.get('page') == 1:
+            return MockResponse({'next': 'page-2', 'results': [{'uuid': healthy_uuid}]}, 200)
+        if url.endswith('/subsidies/'):
+            return MockResponse({'next': None, 'results': [{'uuid': broken_uuid}]}, 200)
+        if url.endswith('admin/transactions/') and broken_uuid in url:
+            return MockResponse('ledger unavailable', 503)
+        if url.endswith('admin/transactions/'):
+            return MockResponse({'aggregates': {'total_quantity': -100}, 'results': []}, 200)
+        if 'aggregates-by-learner' in url:
+            return MockResponse([{'lms_user_id': 1, 'enrollment_count': 2}], 200)
+        return MockResponse({'uuid': url.rstrip('/').split('/')[-1]}, 200)
+
+    mock_oauth_client.return_value.get.side_effect = get
+    overview = EnterpriseSubsidyAPIClientV2().get_enterprise_subsidies_overview(customer_uuid, max_workers=3)
+
+    assert overview['enterprise_customer_uuid'] == customer_uuid
+    healthy, broken = overview['subsidies']
+    assert healthy == {
+        'uuid': healthy_uuid,
+        'subsidy': {'uuid': healthy_uuid},
+        'aggregates': {'total_quantity': -100},
+        'learner_aggregates': [{'lms_user_id': 1, 'enrollment_count': 2}],
+        'errors': {},
+    }
+    assert broken['subsidy'] == {'uuid': broken_uuid}
+    assert broken['aggregates'] is None
+    assert broken['errors']['aggregates']['status_code'] == 503
+    assert broken['learner_aggregates'] is not None
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_field_selection(mock_oauth_client):
+    """
+    Test that ``fields`` is sent to the service, and records are trimmed to those fields client-side too.
+    """
+    subsidy_uuid = str(uuid.uuid4())
+    mock_get = mock_oauth_client.return_value.get
+    mock_get.return_value = MockResponse(
+        {'next': None, 'results': [{'uuid': 'tx-1', 'state': 'committed', 'metadata': {'large': 'blob'}}]},
+        200,
+    )
+    client = EnterpriseSubsidyAPIClientV2()
+
+    response = client.list_subsidy_transactions(subsidy_uuid, fields=['uuid', 'state'])
+
+    assert response['results'] == [{'uuid': 'tx-1', 'state': 'committed'}]
+    assert mock_get.call_args[1]['params']['fields'] == 'uuid,state'
+
+    mock_get.return_value = MockResponse([{'lms_user_id': 1, 'enrollment_count': 2, 'total_quantity': -5}], 200)
+    learner_aggregates = client.get_subsidy_aggregates_by_learner_data(subsidy_uuid, fields=['lms_user_id'])
+    assert learner_aggregates == [{'lms_user_id': 1}]
+    assert mock_get.call_args[1] == {'params': {'fields': 'lms_user_id'}}
+
+    # Records the service already trimmed are returned as they are.
+    records = [{'lms_user_id': 1}, {'lms_user_id': 2}]
+    mock_get.return_value = MockResponse(records, 200)
+    assert client.get_subsidy_aggregates_by_learner_data(subsidy_uuid, fields=['lms_user_id']) is records
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.time.sleep')
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_redeem(mock_oauth_client, mock_sleep):
+    """
+    Test that redeem() checks eligibility, reuses the price, and retries a locked ledger.
+    """
+    subsidy_uuid, customer_uuid, policy_uuid = str(uuid.uuid4()), str(uuid.uuid4()), str(uuid.uuid4())
+    mock_client = mock_oauth_client.return_value
+    history = []
+
+    def get(url, params=None):  # pylint: disable=unused-argument
+        if url.endswith('can_redeem/'):
+            return MockResponse({'can_redeem': True, 'content_price': 14900, 'existing_transaction': None}, 200)
+        if '/transactions/' in url:
+            return MockResponse({'next': None, 'results': history}, 200)
+        return MockResponse({'content_key': 'edX+DemoX', 'content_price': '149.00'}, 200)
+
+    mock_client.get.side_effect = get
+    created = {'uuid': str(uuid.uuid4()), 'state': 'committed'}
+    mock_client.post.side_effect = [MockResponse({}, 429), MockResponse(created, 201)]
+    client = EnterpriseSubsidyAPIClientV2()
+
+    outcome = client.redeem(subsidy_uuid, customer_uuid, 42, 'edX+DemoX', policy_uuid, metadata={'a': 1})
+
+    assert outcome.redeemed
+    assert outcome.decided_by == 'transaction'
+    assert outcome.transaction == created
+    assert outcome.content_metadata['content_price'] == '149.00'
+    assert mock_sleep.call_count == 1
+    payload = mock_client.post.call_args[1]['json']
+    assert payload['requested_price_cents'] == 14900
+    assert payload['idempotency_key'] == client.redemption_idempotency_key(
+        subsidy_uuid, policy_uuid, 42, 'edX+DemoX',
+    )
+
+    # A 422 is reported in the outcome rather than raised.
+    mock_client.post.side_effect = [MockResponse({}, 422, content=b'balance exceeded')]
+    outcome = client.redeem(subsidy_uuid, customer_uuid, 42, 'edX+DemoX', policy_uuid)
+    assert not outcome.redeemed
+    assert outcome.error == 'balance exceeded'
+
+    # Once the earlier transaction is reversed, the content can be redeemed again, with a new key.
+    history.append({'uuid': created['uuid'], 'state': 'committed', 'reversal': {'uuid': str(uuid.uuid4())}})
+    history.append({'uuid': str(uuid.uuid4()), 'state': 'committed', 'reversal': None})
+    mock_client.post.side_effect = [MockResponse(created, 201)]
+    client.redeem(subsidy_uuid, customer_uuid, 42, 'edX+DemoX', policy_uuid)
+    assert mock_client.post.call_args[1]['json']['idempotency_key'] == client.redemption_idempotency_key(
+        subsidy_uuid, policy_uuid, 42, 'edX+DemoX', historical_redemption_uuids=[created['uuid']],
+    ) != payload['idempotency_key']
+
+    # Content metadata is only needed for the price, so failing to read it doesn't stop a redemption.
+    def get_without_metadata(url, params=None):
+        if 'content-metadata' in url:
+            raise requests.exceptions.Timeout()
+        return get(url, params)
+
+    mock_client.get.side_effect = get_without_metadata
+    mock_client.post.side_effect = [MockResponse(created, 201)]
+    outcome = client.redeem(subsidy_uuid, customer_uuid, 42, 'edX+DemoX', policy_uuid)
+    assert outcome.redeemed
+    assert outcome.content_metadata is None
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_redeem_decided_by_can_redeem(mock_oauth_client):
+    """
+    Test that redeem() doesn't write when the learner can't redeem, or already has a transaction.
+    """
+    mock_client = mock_oauth_client.return_value
+    existing_transaction = {'uuid': str(uuid.uuid4())}
+    mock_client.get.return_value = MockResponse({'can_redeem': False, 'existing_transaction': None}, 200)
+    client = EnterpriseSubsidyAPIClientV2()
+
+    outcome = client.redeem('subsidy', 'customer', 42, 'edX+DemoX', 'policy')
+    assert (outcome.redeemed, outcome.decided_by) == (False, 'can_redeem')
+
+    mock_client.get.return_value = MockResponse(
+        {'can_redeem': False, 'existing_transaction': existing_transaction}, 200,
+    )
+    outcome = client.redeem('subsidy', 'customer', 42, 'edX+DemoX', 'policy')
+    assert (outcome.redeemed, outcome.decided_by) == (True, 'existing_transaction')
+    assert outcome.transaction == existing_transaction
+    mock_client.post.assert_not_called()
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.time.sleep')
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_create_subsidy_deposits(mock_oauth_client, mock_sleep):
+    """
+    Test that bulk deposits derive idempotency keys, retry locked ledgers and report per-item results.
+    """
+    subsidy_a, subsidy_b = str(uuid.uuid4()), str(uuid.uuid4())
+    attempts = {}
+
+    def post(url, json=None):
+        attempts[json['idempotency_key']] = attempts.get(json['idempotency_key'], 0) + 1
+        if json['sales_contract_reference_id'] == 'locked' and attempts[json['idempotency_key']] == 1:
+            return MockResponse({}, 429)
+        if json['sales_contract_reference_id'] == 'existing':
+            return MockResponse({'idempotency_key': ['Deposit with this idempotency_key already exists.']}, 422)
+        if json['sales_contract_reference_id'] == 'inactive':
+            return MockResponse({'detail': 'Subsidy is inactive, its idempotency_key cannot be reused.'}, 422)
+        if json['desired_deposit_quantity'] <= 0:
+            return MockResponse({}, 400)
+        return MockResponse({'uuid': json['sales_contract_reference_id'], 'url': url}, 201)
+
+    mock_oauth_client.return_value.post.side_effect = post
+    deposits = [
+        {'subsidy_uuid': subsidy_a, 'desired_deposit_quantity': 100, 'sales_contract_reference_id': 'locked'},
+        {'subsidy_uuid': subsidy_b, 'desired_deposit_quantity': 100, 'sales_contract_reference_id': 'existing'},
+        {'subsidy_uuid': subsidy_a, 'desired_deposit_quantity': 0, 'sales_contract_reference_id': 'invalid'},
+        {'subsidy_uuid': subsidy_b, 'desired_deposit_quantity': 100, 'sales_contract_reference_id': 'inactive'},
+    ]
+    for deposit in deposits:
+        deposit['sales_contract_reference_provider'] = 'salesforce'
+    client = EnterpriseSubsidyAPIClientV2()
+
+    results = client.create_subsidy_deposits(deposits)
+
+    assert [result['status'] for result in results] == ['created', 'already_exists', 'failed', 'failed']
+    assert results[0]['deposit']['uuid'] == 'locked'
+    assert results[0]['idempotency_key'] == client.deposit_idempotency_key(subsidy_a, 'salesforce', 'locked')
+    assert results[2]['error']['status_code'] == 400
+    # A 422 for any other reason is a failure, even if its message mentions the idempotency key.
+    assert results[3]['error']['status_code'] == 422
+    assert mock_sleep.call_count == 1
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_create_subsidy_deposits_transport_errors(mock_oauth_client):
+    """
+    Test that a deposit that times out fails on its own, without losing the other deposits' results.
+    """
+    subsidy_a, subsidy_b = str(uuid.uuid4()), str(uuid.uuid4())
+
+    def post(url, json=None):
+        if json['sales_contract_reference_id'] == 'timeout':
+            raise requests.exceptions.ReadTimeout('read timed out')
+        if json['sales_contract_reference_id'] == 'unreachable':
+            raise requests.exceptions.ConnectionError('connection refused')
+        return MockResponse({'uuid': json['sales_contract_reference_id'], 'url': url}, 201)
+
+    mock_oauth_client.return_value.post.side_effect = post
+    deposits = [
+        {'subsidy_uuid': subsidy_a, 'sales_contract_reference_id': 'timeout'},
+        {'subsidy_uuid': subsidy_a, 'sales_contract_reference_id': 'after-timeout'},
+        {'subsidy_uuid': subsidy_b, 'sales_contract_reference_id': 'unreachable'},
+        {'subsidy_uuid': subsidy_b, 'sales_contract_reference_id': 'other'},
+    ]
+    for deposit in deposits:
+        deposit.update(desired_deposit_quantity=100, sales_contract_reference_provider='salesforce')
+
+    results = EnterpriseSubsidyAPIClientV2().create_subsidy_deposits(deposits)
+
+    assert [result['status'] for result in results] == ['failed', 'created', 'failed', 'created']
+    assert results[0]['error'] == {'status_code': None, 'message': 'read timed out'}
+    assert results[2]['error']['status_code'] is None
+    assert results[3]['deposit']['uuid'] == 'other'
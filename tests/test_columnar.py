@@ -0,0 +1,96 @@
+"""
+Tests for edx_enterprise_subsidy_client.columnar.
+"""
+import uuid
+from unittest import mock
+
+import pytest
+
+from edx_enterprise_subsidy_client import EnterpriseSubsidyAPIClientV2
+from edx_enterprise_subsidy_client.columnar import (
+    NULL_TIMESTAMP,
+    ColumnarPages,
+    decode_learner_aggregates,
+    decode_transaction_pages,
+)
+from test_utils.utils import MockResponse
+
+PAGES = [
+    [
+        {'uuid': 'tx-1', 'state': 'committed', 'quantity': -100, 'lms_user_id': 1, 'content_key': 'course-1',
+         'subsidy_access_policy_uuid': 'policy-a', 'created': '2024-01-01T00:00:00Z', 'modified': None},
+        {'uuid': 'tx-2', 'state': 'pending', 'quantity': -50, 'lms_user_id': None, 'content_key': 'course-2',
+         'subsidy_access_policy_uuid': None, 'created': '2024-01-01T00:00:01.5+00:00', 'modified': None},
+    ],
+    [
+        {'uuid': 'tx-3', 'state': 'committed', 'quantity': -25, 'lms_user_id': 3, 'content_key': 'course-1',
+         'subsidy_access_policy_uuid': 'policy-a', 'created': '2024-01-01T05:00:00+05:00', 'modified': None},
+    ],
+]
+
+
+def _columns():
+    """
+    Returns ``PAGES`` decoded into a ``ColumnarPages``.
+    """
+    columns = ColumnarPages()
+    for page in PAGES:
+        columns.add_page(page)
+    return columns
+
+
+def test_decode_into_buffers():
+    """
+    Test that pages are decoded into typed buffers, with nulls and dictionary-encoded strings.
+    """
+    columns = _columns().columns
+    assert list(columns['quantity'].values) == [-100, -50, -25]
+    assert list(columns['lms_user_id'].nulls) == [0, 1, 0]
+    assert columns['quantity'].nulls is None
+    assert list(columns['state'].codes) == [0, 1, 0]
+    assert columns['state'].categories == ['committed', 'pending']
+    assert list(columns['subsidy_access_policy_uuid'].codes) == [0, -1, 0]
+    assert list(columns['created'].values) == [1704067200000000, 1704067201500000, 1704067200000000]
+    assert list(columns['modified'].values) == [NULL_TIMESTAMP] * 3
+
+
+def test_to_pandas_and_arrow():
+    """
+    Test that decoded columns convert to pandas and Arrow with the equivalent types.
+    """
+    pandas = pytest.importorskip('pandas')
+    pyarrow = pytest.importorskip('pyarrow')
+    columns = _columns()
+
+    frame = columns.to_pandas()
+    assert frame['quantity'].sum() == -175
+    assert frame['state'].dtype.name == 'category'
+    assert frame['lms_user_id'].isna().tolist() == [False, True, False]
+    assert frame['created'].iloc[1] == pandas.Timestamp('2024-01-01T00:00:01.5Z')
+    assert frame['modified'].isna().all()
+
+    table = columns.to_arrow()
+    assert pyarrow.types.is_dictionary(table.schema.field('content_key').type)
+    assert table.column('subsidy_access_policy_uuid').null_count == 1
+    assert table.column('lms_user_id').to_pylist() == [1, None, 3]
+    assert table.column('uuid').to_pylist() == ['tx-1', 'tx-2', 'tx-3']
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_decode_from_client(mock_oauth_client):
+    """
+    Test decoding transactions and learner aggregates fetched through the client.
+    """
+    subsidy_uuid = str(uuid.uuid4())
+    mock_get = mock_oauth_client.return_value.get
+    mock_get.side_effect = [
+        MockResponse({'next': 'page-2', 'results': PAGES[0]}, 200),
+        MockResponse({'next': None, 'results': PAGES[1]}, 200),
+        MockResponse([{'lms_user_id': 1, 'enrollment_count': 2, 'total_quantity': -100, 'extra': 'x'}], 200),
+    ]
+    client = EnterpriseSubsidyAPIClientV2()
+
+    assert len(decode_transaction_pages(client, subsidy_uuid)) == 3
+    assert 'fields' in mock_get.call_args_list[0][1]['params']
+    learner_aggregates = decode_learner_aggregates(client, subsidy_uuid)
+    assert list(learner_aggregates.columns['enrollment_count'].values) == [2]
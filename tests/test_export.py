@@ -0,0 +1,163 @@
+"""
+Tests for edx_enterprise_subsidy_client.export and the export_subsidy_transactions command.
+"""
+import csv
+import datetime
+import os
+import uuid
+from unittest import mock
+
+import pytest
+from django.core.management import call_command
+from pytest import raises
+
+from edx_enterprise_subsidy_client import EnterpriseSubsidyAPIClientV2
+from edx_enterprise_subsidy_client.client import EnterpriseSubsidyAPIClientException
+from edx_enterprise_subsidy_client.export import TRANSACTION_COLUMNS, export_subsidy_transactions, transaction_to_row
+from edx_enterprise_subsidy_client.management.commands.export_subsidy_transactions import Command
+from edx_enterprise_subsidy_client.stores import JSONFileLocalStore
+from test_utils.utils import MockResponse
+
+
+def _transaction(**kwargs):
+    """
+    Returns a serialized transaction, with the given fields overridden.
+    """
+    transaction = {
+        'uuid': str(uuid.uuid4()),
+        'state': 'committed',
+        'lms_user_id': 42,
+        'content_key': 'edX+DemoX',
+        'quantity': -14900,
+        'unit': 'usd_cents',
+        'subsidy_access_policy_uuid': str(uuid.uuid4()),
+        'metadata': {'b': 2, 'a': 1},
+        'created': '2023-05-01T12:00:00Z',
+        'modified': '2023-05-01T12:00:01.500000Z',
+    }
+    transaction.update(kwargs)
+    return transaction
+
+
+def _paginated_responses(pages):
+    """
+    Returns MockResponses for the given pages of transactions, linked via ``next``.
+    """
+    responses = []
+    for index, page in enumerate(pages):
+        next_url = f'http://next-page/{index + 1}' if index + 1 < len(pages) else None
+        responses.append(MockResponse({'next': next_url, 'results': page}, 200))
+    return responses
+
+
+def test_transaction_to_row_types():
+    """
+    Test that transactions are converted to rows of typed values.
+    """
+    row = dict(zip(
+        [column for column, _ in TRANSACTION_COLUMNS],
+        transaction_to_row('subsidy-1', _transaction(lms_user_id='42')),
+    ))
+    assert row['subsidy_uuid'] == 'subsidy-1'
+    assert row['lms_user_id'] == 42
+    assert row['quantity'] == -14900
+    assert row['created'] == datetime.datetime(2023, 5, 1, 12, tzinfo=datetime.timezone.utc)
+    assert row['metadata'] == '{"a": 1, "b": 2}'
+    assert row['parent_content_key'] is None
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_export_csv_streams_all_pages(mock_oauth_client, tmp_path):
+    """
+    Test that a CSV export writes every page of transactions, and only the finished file.
+    """
+    pages = [[_transaction(), _transaction()], [_transaction(state='pending')]]
+    mock_oauth_client.return_value.get.side_effect = _paginated_responses(pages)
+    client = EnterpriseSubsidyAPIClientV2()
+    subsidy_uuid = str(uuid.uuid4())
+
+    results = export_subsidy_transactions(client, [subsidy_uuid], str(tmp_path), page_size=2)
+
+    assert results[subsidy_uuid]['rows'] == 3
+    with open(results[subsidy_uuid]['path'], encoding='utf8') as export_file:
+        rows = list(csv.DictReader(export_file))
+    assert [row['state'] for row in rows] == ['committed', 'committed', 'pending']
+    assert rows[0]['created'] == '2023-05-01T12:00:00+00:00'
+    assert mock_oauth_client.return_value.get.call_args_list[1] == mock.call('http://next-page/1')
+    assert os.listdir(tmp_path) == [f'{subsidy_uuid}.csv']
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_export_resumes_from_checkpoint(mock_oauth_client, tmp_path):
+    """
+    Test that a failed export leaves no partial file, and that re-running it only exports the subsidies that failed.
+    """
+    done_subsidy, failing_subsidy = str(uuid.uuid4()), str(uuid.uuid4())
+    checkpoint_store = JSONFileLocalStore(str(tmp_path / 'checkpoint.json'))
+    client = EnterpriseSubsidyAPIClientV2()
+
+    def get(url, **kwargs):  # pylint: disable=unused-argument
+        if done_subsidy in url:
+            return MockResponse({'next': None, 'results': [_transaction()]}, 200)
+        return MockResponse('ledger unavailable', 503)
+
+    mock_oauth_client.return_value.get.side_effect = get
+    with raises(EnterpriseSubsidyAPIClientException):
+        export_subsidy_transactions(
+            client, [done_subsidy, failing_subsidy], str(tmp_path), checkpoint_store=checkpoint_store,
+        )
+    assert checkpoint_store.keys() == [done_subsidy]
+    # The failed subsidy's half-written file was removed.
+    assert set(os.listdir(tmp_path)) == {'checkpoint.json', f'{done_subsidy}.csv'}
+
+    # Re-running with a reloaded checkpoint only fetches the subsidy that failed.
+    mock_oauth_client.return_value.get.reset_mock()
+    mock_oauth_client.return_value.get.side_effect = _paginated_responses([[_transaction(), _transaction()]])
+    results = export_subsidy_transactions(
+        client,
+        [done_subsidy, failing_subsidy],
+        str(tmp_path),
+        checkpoint_store=JSONFileLocalStore(str(tmp_path / 'checkpoint.json')),
+    )
+    assert results[done_subsidy]['rows'] == 1
+    assert results[failing_subsidy]['rows'] == 2
+    assert mock_oauth_client.return_value.get.call_count == 1
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_export_parquet_typed_columns(mock_oauth_client, tmp_path):
+    """
+    Test that Parquet exports have typed columns, with nulls for missing values.
+    """
+    pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+    pages = [[_transaction()], [_transaction(lms_user_id=None)]]
+    mock_oauth_client.return_value.get.side_effect = _paginated_responses(pages)
+    subsidy_uuid = str(uuid.uuid4())
+
+    results = export_subsidy_transactions(EnterpriseSubsidyAPIClientV2(), [subsidy_uuid], str(tmp_path), 'parquet')
+
+    table = pyarrow_parquet.read_table(results[subsidy_uuid]['path'])
+    assert table.num_rows == 2
+    assert str(table.schema.field('quantity').type) == 'int64'
+    assert str(table.schema.field('created').type) == 'timestamp[us, tz=UTC]'
+    assert table.column('lms_user_id').to_pylist() == [42, None]
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_export_command(mock_oauth_client, tmp_path):
+    """
+    Test the export_subsidy_transactions management command.
+    """
+    subsidy_uuid = str(uuid.uuid4())
+    mock_oauth_client.return_value.get.side_effect = [
+        MockResponse({'next': None, 'results': [{'uuid': subsidy_uuid}]}, 200),
+        MockResponse({'next': None, 'results': [_transaction()]}, 200),
+    ]
+    call_command(
+        Command(),
+        '--enterprise-customer-uuid', str(uuid.uuid4()),
+        '--output-dir', str(tmp_path),
+        '--checkpoint-file', str(tmp_path / 'checkpoint.json'),
+    )
+    assert os.path.exists(tmp_path / f'{subsidy_uuid}.csv')
+    assert JSONFileLocalStore(str(tmp_path / 'checkpoint.json')).get(subsidy_uuid)['rows'] == 1
@@ -0,0 +1,208 @@
+"""
+Tests for edx_enterprise_subsidy_client.http2.
+"""
+import json
+import socket
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pytest
+import requests
+
+from edx_enterprise_subsidy_client.client import EnterpriseSubsidyAPIClient, EnterpriseSubsidyAPIClientException
+from edx_enterprise_subsidy_client.http2 import HTTP2Adapter, mount_http2
+
+
+def test_http2_requires_httpx():
+    """
+    Tests that the HTTP/2 transport, and a client asking for it, fail clearly without httpx.
+    """
+    with mock.patch.dict(sys.modules, {'httpx': None}):
+        with pytest.raises(EnterpriseSubsidyAPIClientException):
+            HTTP2Adapter()
+        with pytest.raises(EnterpriseSubsidyAPIClientException):
+            EnterpriseSubsidyAPIClient(
+                base_url='http://subsidy', oauth2_provider_url='http://lms', client_id='a', client_secret='b',
+                http2=True,
+            )
+
+
+def test_http2_adapter_round_trip():
+    """
+    Tests that requests and responses are translated between requests and httpx.
+    """
+    httpx = pytest.importorskip('httpx')
+    pytest.importorskip('h2')
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        if request.url.path == '/missing/':
+            return httpx.Response(404, json={'detail': 'Not found.'})
+        return httpx.Response(200, json={'method': request.method, 'body': request.content.decode()})
+
+    session = requests.Session()
+    mount_http2(session, transport=httpx.MockTransport(handler))
+
+    response = session.post('https://subsidy/api/v1/transactions/', json={'quantity': -100}, timeout=(1, 5))
+    assert response.json() == {'method': 'POST', 'body': '{"quantity": -100}'}
+    assert seen[0].headers['content-type'] == 'application/json'
+    with pytest.raises(requests.exceptions.HTTPError):
+        session.get('https://subsidy/missing/').raise_for_status()
+
+
+def test_http2_adapter_maps_transport_errors():
+    """
+    Tests that httpx transport errors are raised as the equivalent requests exceptions.
+    """
+    httpx = pytest.importorskip('httpx')
+    pytest.importorskip('h2')
+
+    def handler(request):
+        raise httpx.ConnectError('refused', request=request)
+
+    session = requests.Session()
+    mount_http2(session, transport=httpx.MockTransport(handler))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.get('https://subsidy/api/v1/subsidies/')
+
+
+class _H2CServer:
+    """
+    A minimal cleartext HTTP/2 server on localhost, answering every request with a JSON echo of it.
+
+    Only speaks HTTP/2 with prior knowledge, as clients using ``http1=False`` do.
+    """
+
+    def __init__(self, h2):
+        self.h2 = h2
+        self.connections = 0
+        self._listener = socket.create_server(('127.0.0.1', 0))
+        self.url = f'http://127.0.0.1:{self._listener.getsockname()[1]}'
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        """
+        Serves each accepted connection on its own thread until the server is closed.
+        """
+        while True:
+            try:
+                sock, _ = self._listener.accept()
+            except OSError:
+                return  # closed
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(sock,), daemon=True).start()
+
+    def _serve(self, sock):
+        """
+        Answers every request on one connection as its stream ends.
+        """
+        events = self.h2.events
+        connection = self.h2.connection.H2Connection(self.h2.config.H2Configuration(client_side=False))
+        connection.initiate_connection()
+        sock.sendall(connection.data_to_send())
+        requests_by_stream = {}
+        with sock:
+            while True:
+                data = sock.recv(65535)
+                if not data:
+                    return
+                for event in connection.receive_data(data):
+                    if isinstance(event, events.RequestReceived):
+                        headers = {
+                            name.decode() if isinstance(name, bytes) else name:
+                            value.decode() if isinstance(value, bytes) else value
+                            for name, value in event.headers
+                        }
+                        requests_by_stream[event.stream_id] = {'headers': headers, 'body': b''}
+                    elif isinstance(event, events.DataReceived):
+                        requests_by_stream[event.stream_id]['body'] += event.data
+                        connection.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                    elif isinstance(event, events.StreamEnded):
+                        self._respond(connection, event.stream_id, requests_by_stream.pop(event.stream_id))
+                sock.sendall(connection.data_to_send())
+
+    @staticmethod
+    def _respond(connection, stream_id, request):
+        """
+        Sends the JSON echo of one request, or a 404 for ``/missing/``.
+        """
+        headers = request['headers']
+        status = 404 if headers[':path'] == '/missing/' else 200
+        body = json.dumps({
+            'method': headers[':method'],
+            'path': headers[':path'],
+            'content_type': headers.get('content-type'),
+            'body': request['body'].decode(),
+        }).encode()
+        connection.send_headers(stream_id, [
+            (':status', str(status)), ('content-type', 'application/json'), ('content-length', str(len(body))),
+        ])
+        connection.send_data(stream_id, body, end_stream=True)
+
+    def close(self):
+        """
+        Stops listening, so new connections are refused.
+        """
+        if self._listener.fileno() == -1:
+            return
+        # Wakes the accepting thread up, so the port stops listening straight away.
+        self._listener.shutdown(socket.SHUT_RDWR)
+        self._listener.close()
+
+
+@pytest.fixture(name='h2c_server')
+def fixture_h2c_server():
+    """
+    A running ``_H2CServer``, skipping the test if h2 isn't installed.
+    """
+    pytest.importorskip('h2.connection')
+    pytest.importorskip('h2.events')
+    server = _H2CServer(pytest.importorskip('h2'))
+    yield server
+    server.close()
+
+
+def test_http2_adapter_speaks_http2_to_a_server(h2c_server):
+    """
+    Tests that the adapter talks HTTP/2 to a real server, multiplexing concurrent calls over one connection.
+    """
+    pytest.importorskip('httpx')
+    session = requests.Session()
+    adapter = mount_http2(session, http1=False, max_connections=1)
+
+    response = session.post(f'{h2c_server.url}/api/v1/transactions/', json={'quantity': -100}, timeout=(1, 5))
+    assert response.http_version == 'HTTP/2'
+    assert response.json() == {
+        'method': 'POST',
+        'path': '/api/v1/transactions/',
+        'content_type': 'application/json',
+        'body': '{"quantity": -100}',
+    }
+    with pytest.raises(requests.exceptions.HTTPError):
+        session.get(f'{h2c_server.url}/missing/', timeout=5).raise_for_status()
+
+    # Concurrent calls are multiplexed as streams over the one connection.
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        paths = list(executor.map(
+            lambda number: session.get(f'{h2c_server.url}/api/v2/subsidies/{number}/', timeout=5).json()['path'],
+            range(16),
+        ))
+    assert paths == [f'/api/v2/subsidies/{number}/' for number in range(16)]
+    assert h2c_server.connections == 1
+    adapter.close()
+
+
+def test_http2_adapter_maps_refused_connections(h2c_server):
+    """
+    Tests that a refused connection is raised as a requests ``ConnectionError``.
+    """
+    pytest.importorskip('httpx')
+    url = h2c_server.url
+    h2c_server.close()
+    session = requests.Session()
+    mount_http2(session, http1=False)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.get(f'{url}/api/v2/subsidies/', timeout=5)
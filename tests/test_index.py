@@ -0,0 +1,126 @@
+"""
+Tests for edx_enterprise_subsidy_client.index.
+"""
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from edx_enterprise_subsidy_client import EnterpriseSubsidyAPIClientV2
+from edx_enterprise_subsidy_client.index import TransactionIndex
+from test_utils.utils import MockResponse
+
+SUBSIDY_UUID = str(uuid.uuid4())
+POLICY_UUID = str(uuid.uuid4())
+
+
+def _transaction(lms_user_id, content_key, state='committed'):
+    return {
+        'uuid': str(uuid.uuid4()),
+        'lms_user_id': lms_user_id,
+        'content_key': content_key,
+        'subsidy_access_policy_uuid': POLICY_UUID,
+        'state': state,
+    }
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_index_lookups(mock_oauth_client):
+    """
+    Test that the index is built once from every page, and answers each kind of lookup locally.
+    """
+    transactions = [
+        _transaction(1, 'course-a'),
+        _transaction(1, 'course-b', state='failed'),
+        _transaction(2, 'course-a', state='pending'),
+    ]
+    mock_oauth_client.return_value.get.side_effect = [
+        MockResponse({'next': 'http://next-page', 'results': transactions[:2]}, 200),
+        MockResponse({'next': None, 'results': transactions[2:]}, 200),
+    ]
+    index = TransactionIndex(EnterpriseSubsidyAPIClientV2(), SUBSIDY_UUID)
+
+    assert index.has_redeemed(1, 'course-a')
+    assert not index.has_redeemed('1', 'course-b')
+    assert index.has_redeemed(2, 'course-a')
+    assert {t['uuid'] for t in index.for_learner(1)} == {transactions[0]['uuid'], transactions[1]['uuid']}
+    assert len(index.for_content('course-a')) == 2
+    assert len(index.for_policy(uuid.UUID(POLICY_UUID))) == 3
+    assert index.in_state('failed') == [transactions[1]]
+    assert index.get(transactions[2]['uuid']) == transactions[2]
+    # Lookups after the initial build are answered locally.
+    assert mock_oauth_client.return_value.get.call_count == 2
+    assert mock_oauth_client.return_value.get.call_args_list[0].kwargs['params']['state'] == [
+        'committed', 'created', 'failed', 'pending',
+    ]
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_reversed_redemptions_dont_count(mock_oauth_client):
+    """
+    Test that a committed redemption that was since reversed (e.g. refunded) doesn't count as redeemed.
+    """
+    reversed_transaction = _transaction(1, 'course-a')
+    reversed_transaction['reversal'] = {'uuid': str(uuid.uuid4()), 'state': 'committed', 'quantity': 100}
+    transactions = [reversed_transaction, _transaction(2, 'course-a', state='committed')]
+    mock_oauth_client.return_value.get.return_value = MockResponse({'next': None, 'results': transactions}, 200)
+    index = TransactionIndex(EnterpriseSubsidyAPIClientV2(), SUBSIDY_UUID)
+
+    assert not index.has_redeemed(1, 'course-a')
+    assert index.has_redeemed(2, 'course-a')
+    # Redeeming the content again after the reversal counts.
+    index.add(_transaction(1, 'course-a'))
+    assert index.has_redeemed(1, 'course-a')
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_index_tracks_own_creates_and_staleness(mock_oauth_client):
+    """
+    Test that transactions created through the client are indexed at once, and that stale indexes are rebuilt.
+    """
+    mock_oauth_client.return_value.get.return_value = MockResponse({'next': None, 'results': []}, 200)
+    client = EnterpriseSubsidyAPIClientV2()
+    index = TransactionIndex(client, SUBSIDY_UUID, max_staleness=None)
+    assert not index.has_redeemed(3, 'course-c')
+
+    created = _transaction(3, 'course-c', state='created')
+    mock_oauth_client.return_value.post.return_value = MockResponse(created, 201)
+    client.create_subsidy_transaction(SUBSIDY_UUID, 3, 'course-c', POLICY_UUID, {})
+    assert index.has_redeemed(3, 'course-c')
+
+    # A refresh whose snapshot doesn't include the new transaction yet keeps it.
+    index.refresh()
+    assert index.has_redeemed(3, 'course-c')
+
+    # Writes to other subsidies are ignored.
+    client.create_subsidy_transaction(str(uuid.uuid4()), 4, 'course-d', POLICY_UUID, {})
+    assert not index.has_redeemed(4, 'course-d')
+    assert mock_oauth_client.return_value.get.call_count == 2
+
+    # A stale snapshot is still served, while it's rebuilt in the background.
+    index.max_staleness = 0
+    index.close()
+    assert index.has_redeemed(3, 'course-c')
+    for _ in range(100):
+        if not index._refreshing:  # pylint: disable=protected-access
+            break
+        time.sleep(0.01)
+    assert mock_oauth_client.return_value.get.call_count == 3
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_concurrent_lookups_build_the_index_once(mock_oauth_client):
+    """
+    Test that lookups racing for a cold index only build it once.
+    """
+    def get(*args, **kwargs):  # pylint: disable=unused-argument
+        time.sleep(0.05)
+        return MockResponse({'next': None, 'results': [_transaction(1, 'course-a')]}, 200)
+
+    mock_oauth_client.return_value.get.side_effect = get
+    index = TransactionIndex(EnterpriseSubsidyAPIClientV2(), SUBSIDY_UUID)
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        answers = list(executor.map(lambda _: index.has_redeemed(1, 'course-a'), range(5)))
+
+    assert answers == [True] * 5
+    assert mock_oauth_client.return_value.get.call_count == 1
@@ -0,0 +1,155 @@
+"""
+Tests for edx_enterprise_subsidy_client.jobs.
+"""
+import uuid
+from unittest import mock
+
+from pytest import raises
+
+from edx_enterprise_subsidy_client import EnterpriseSubsidyAPIClientV2
+from edx_enterprise_subsidy_client.jobs import OPERATION_CREATE_DEPOSIT, OPERATION_CREATE_TRANSACTION, BulkJob
+from edx_enterprise_subsidy_client.stores import InMemoryLocalStore
+from test_utils.utils import MockResponse
+
+
+def _deposit_items(count):
+    return [
+        {
+            'subsidy_uuid': str(uuid.uuid4()),
+            'desired_deposit_quantity': 100 * (position + 1),
+            'sales_contract_reference_id': f'contract-{position}',
+            'sales_contract_reference_provider': 'salesforce',
+        }
+        for position in range(count)
+    ]
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_bulk_job_resumes_failed_items_only(mock_oauth_client):
+    """
+    Test that a job reports progress, and that re-running it only retries the items that failed.
+    """
+    mock_post = mock_oauth_client.return_value.post
+    items = _deposit_items(5)
+    store = InMemoryLocalStore()
+    client = EnterpriseSubsidyAPIClientV2()
+
+    # The fourth deposit fails the first time around.
+    mock_post.side_effect = [MockResponse({'uuid': str(position)}, 201) for position in range(3)] + [
+        MockResponse({}, 400),
+        MockResponse({'uuid': '4'}, 201),
+    ]
+    progress_reports = []
+    job = BulkJob(store, 'job-1', OPERATION_CREATE_DEPOSIT, chunk_size=2)
+    progress = job.run(client, items, on_progress=progress_reports.append)
+
+    assert progress == {
+        'job_id': 'job-1',
+        'units_total': 3,
+        'units_complete': 2,
+        'items_total': 5,
+        'items_succeeded': 4,
+        'items_failed': 1,
+        'complete': False,
+    }
+    assert len(progress_reports) == 3
+    assert mock_post.call_args_list[0][1]['json']['idempotency_key'] == client.deposit_idempotency_key(
+        items[0]['subsidy_uuid'], 'salesforce', 'contract-0',
+    )
+
+    # Re-running, even from another BulkJob instance, only retries the failed item.
+    mock_post.reset_mock(side_effect=True)
+    mock_post.return_value = MockResponse({'uuid': '3'}, 201)
+    progress = BulkJob(store, 'job-1', OPERATION_CREATE_DEPOSIT, chunk_size=2).run(client, items)
+
+    assert progress['complete']
+    assert mock_post.call_count == 1
+    assert mock_post.call_args[1]['json']['idempotency_key'] == client.deposit_idempotency_key(
+        items[3]['subsidy_uuid'], 'salesforce', 'contract-3',
+    )
+    assert [result['uuid'] for _, result, _ in job.results()] == ['0', '1', '2', '3', '4']
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_bulk_job_units_run_independently(mock_oauth_client):
+    """
+    Test that work units can be run separately, in any order, e.g. by different workers.
+    """
+    mock_oauth_client.return_value.post.return_value = MockResponse({'uuid': 'deposit'}, 201)
+    store = InMemoryLocalStore()
+    job = BulkJob(store, 'job-2', OPERATION_CREATE_DEPOSIT, chunk_size=3)
+    units = job.plan(_deposit_items(7))
+
+    # As if each unit were sent to a different worker.
+    for unit in reversed(units):
+        BulkJob(store, unit['job_id'], unit['operation']).run_unit(EnterpriseSubsidyAPIClientV2(), unit)
+
+    assert job.progress()['complete']
+    job.reset()
+    assert not store.keys()
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_bulk_job_resumes_a_unit_interrupted_before_its_checkpoint(mock_oauth_client):
+    """
+    Test that a deposit made just before a crash counts as succeeded when its unit is re-run.
+    """
+    mock_post = mock_oauth_client.return_value.post
+    items = _deposit_items(2)
+    store = InMemoryLocalStore()
+    client = EnterpriseSubsidyAPIClientV2()
+    job = BulkJob(store, 'job-3', OPERATION_CREATE_DEPOSIT, chunk_size=2)
+
+    # The process dies after the first deposit is written, before the unit is checkpointed.
+    mock_post.side_effect = [MockResponse({'uuid': '0'}, 201), SystemExit()]
+    with raises(SystemExit):
+        job.run(client, items)
+    assert not job.progress()['complete']
+
+    # On resume, the service rejects the first deposit's reused idempotency key.
+    mock_post.side_effect = [
+        MockResponse({'idempotency_key': ['Deposit with this idempotency_key already exists.']}, 422),
+        MockResponse({'uuid': '1'}, 201),
+    ]
+    progress = job.run(client, items)
+
+    assert progress['complete']
+    assert progress['items_failed'] == 0
+    assert [result for _, result, _ in job.results()] == [
+        {
+            'idempotency_key': client.deposit_idempotency_key(items[0]['subsidy_uuid'], 'salesforce', 'contract-0'),
+            'status': 'already_exists',
+        },
+        {'uuid': '1'},
+    ]
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_bulk_job_idempotency_keys_follow_item_contents(mock_oauth_client):
+    """
+    Test that an item's default idempotency key doesn't depend on its position in the job.
+    """
+    mock_post = mock_oauth_client.return_value.post
+    mock_post.return_value = MockResponse({'uuid': 'transaction'}, 201)
+    items = [
+        {
+            'subsidy_uuid': 'subsidy',
+            'lms_user_id': lms_user_id,
+            'content_key': 'edX+DemoX',
+            'subsidy_access_policy_uuid': 'policy',
+            'metadata': None,
+        }
+        for lms_user_id in range(3)
+    ]
+    client = EnterpriseSubsidyAPIClientV2()
+
+    def keys_by_learner(job_id, job_items):
+        mock_post.reset_mock()
+        BulkJob(InMemoryLocalStore(), job_id, OPERATION_CREATE_TRANSACTION).run(client, job_items)
+        return {call[1]['json']['lms_user_id']: call[1]['json']['idempotency_key'] for call in mock_post.call_args_list}
+
+    in_order = keys_by_learner('job-4', items)
+    assert len(set(in_order.values())) == 3
+    # Reordered and filtered, e.g. on resume, each item keeps its key.
+    assert keys_by_learner('job-4', items[:0:-1]) == {1: in_order[1], 2: in_order[2]}
+    assert keys_by_learner('job-5', items)[0] != in_order[0]
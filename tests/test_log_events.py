@@ -0,0 +1,84 @@
+"""
+Tests for edx_enterprise_subsidy_client.log_events.
+"""
+import logging
+from unittest import mock
+
+import requests
+from pytest import raises
+
+from edx_enterprise_subsidy_client import EnterpriseSubsidyAPIClientV2
+from edx_enterprise_subsidy_client.client import retry_on_ledger_lock
+from edx_enterprise_subsidy_client.log_events import RequestFailureLogger
+from test_utils.utils import MockResponse
+
+
+def test_rate_limits_per_endpoint_and_status(caplog):
+    """
+    Test that failures are rate limited per endpoint and status, and that suppressed events are counted.
+    """
+    failure_logger = RequestFailureLogger(window=10, max_events_per_window=2)
+    caplog.set_level(logging.INFO, logger='edx_enterprise_subsidy_client.log_events')
+    with mock.patch('edx_enterprise_subsidy_client.log_events.time.monotonic', return_value=100.0):
+        for _ in range(5):
+            failure_logger.request_failed('can_redeem', 503, 0.25, subsidy_uuid='subsidy')
+        failure_logger.request_failed('can_redeem', 404, 0.01, subsidy_uuid='subsidy')
+    assert len(caplog.records) == 3
+
+    # The first event of the next window reports what was suppressed.
+    with mock.patch('edx_enterprise_subsidy_client.log_events.time.monotonic', return_value=111.0):
+        failure_logger.request_failed('can_redeem', 503, 0.25, subsidy_uuid='subsidy')
+    record = caplog.records[-1]
+    assert record.levelno == logging.WARNING
+    assert record.subsidy_client == {
+        'endpoint': 'can_redeem', 'subsidy_uuid': 'subsidy', 'status': 503, 'latency_ms': 250.0,
+        'attempt': 1, 'suppressed': 3, 'error': None,
+    }
+    assert caplog.records[2].levelno == logging.INFO
+    assert caplog.records[2].subsidy_client['status'] == 404
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_client_logs_failed_requests(mock_oauth_client):
+    """
+    Test that the client reports HTTP error responses and transport errors, but not successes.
+    """
+    mock_session = mock_oauth_client.return_value
+    failure_logger = mock.MagicMock()
+    client = EnterpriseSubsidyAPIClientV2(failure_logger=failure_logger)
+
+    mock_session.get.return_value = MockResponse({'can_redeem': True}, 200)
+    client.can_redeem('subsidy', 1, 'edX+DemoX')
+    assert not failure_logger.request_failed.called
+
+    mock_session.get.return_value = MockResponse({}, 403)
+    with raises(requests.exceptions.HTTPError):
+        client.get_subsidy_aggregates_by_learner_data('subsidy')
+    args, kwargs = failure_logger.request_failed.call_args
+    assert args[:2] == ('learner_aggregates', 403)
+    assert kwargs == {'subsidy_uuid': 'subsidy', 'error': None}
+
+    mock_session.post.side_effect = requests.exceptions.ConnectionError()
+    with raises(requests.exceptions.ConnectionError):
+        client.create_subsidy_deposit('subsidy', 100, 'ref', 'provider')
+    args, kwargs = failure_logger.request_failed.call_args
+    assert args[:2] == ('v2.deposits.create', None)
+    assert isinstance(kwargs['error'], requests.exceptions.ConnectionError)
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.time.sleep')
+def test_events_report_the_retry_attempt(mock_sleep, caplog):  # pylint: disable=unused-argument
+    """
+    Test that each failure event records which ledger lock retry attempt it came from.
+    """
+    failure_logger = RequestFailureLogger()
+    caplog.set_level(logging.WARNING, logger='edx_enterprise_subsidy_client.log_events')
+    locked = MockResponse({}, 429)
+
+    def request():
+        failure_logger.request_failed('v2.transactions.create', 429, 0.01)
+        locked.raise_for_status()
+
+    with raises(requests.exceptions.HTTPError):
+        retry_on_ledger_lock(request, max_attempts=3, backoff=0)
+    assert [record.subsidy_client['attempt'] for record in caplog.records] == [1, 2, 3]
@@ -0,0 +1,91 @@
+"""
+Tests for edx_enterprise_subsidy_client.metrics.
+"""
+import json
+from unittest import mock
+
+import requests
+from django.test import RequestFactory
+from pytest import raises
+
+from edx_enterprise_subsidy_client import EnterpriseSubsidyAPIClientV2
+from edx_enterprise_subsidy_client.metrics import (
+    EndpointMetrics,
+    RequestMetrics,
+    bucket_index,
+    bucket_upper_bound,
+    get_request_metrics,
+)
+from edx_enterprise_subsidy_client.views import subsidy_client_metrics
+from test_utils.utils import MockResponse
+
+
+def test_bucket_precision():
+    """
+    Test that latency buckets are within a few percent of the latencies they hold.
+    """
+    for microseconds in (0, 31, 32, 100, 12345, 987654321):
+        upper_bound = bucket_upper_bound(bucket_index(microseconds))
+        assert microseconds <= upper_bound <= microseconds * 1.04 + 1
+
+
+def test_endpoint_percentiles_and_window():
+    """
+    Test an endpoint's percentiles, error counts and status codes, and that old slots expire.
+    """
+    metrics = EndpointMetrics(window=10, slots=10)
+    with mock.patch('edx_enterprise_subsidy_client.metrics.time.monotonic', return_value=1000.0):
+        for millisecond in range(1, 101):
+            metrics.record(millisecond / 1000, 200)
+        metrics.record(0.5, 503)
+        metrics.record(0.001, None)
+        stats = metrics.snapshot()
+
+    assert stats['count'] == 102
+    assert stats['errors'] == 2
+    assert stats['status_codes'] == {'200': 100, '503': 1, 'no_response': 1}
+    assert 49 <= stats['p50_ms'] <= 52
+    assert 95 <= stats['p95_ms'] <= 99
+    assert stats['max_ms'] == 500
+
+    # Slots that fall out of the window are no longer counted.
+    with mock.patch('edx_enterprise_subsidy_client.metrics.time.monotonic', return_value=1011.0):
+        assert metrics.snapshot()['count'] == 0
+        metrics.record(0.01, 200)
+        assert metrics.snapshot()['count'] == 1
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_client_records_requests(mock_oauth_client):
+    """
+    Test that client requests, including failed ones, are recorded per endpoint.
+    """
+    mock_session = mock_oauth_client.return_value
+    metrics = RequestMetrics()
+    client = EnterpriseSubsidyAPIClientV2(metrics=metrics)
+
+    mock_session.get.return_value = MockResponse({'can_redeem': True}, 200)
+    client.can_redeem('subsidy', 1, 'edX+DemoX')
+    mock_session.post.side_effect = requests.exceptions.ConnectionError()
+    with raises(requests.exceptions.ConnectionError):
+        client.create_subsidy_deposit('subsidy', 100, 'contract', 'salesforce')
+
+    snapshot = metrics.snapshot()
+    assert snapshot['can_redeem']['count'] == 1
+    assert snapshot['v2.deposits.create']['error_rate'] == 1.0
+
+
+def test_metrics_view():
+    """
+    Test that the metrics view is for staff only, and returns every endpoint's metrics.
+    """
+    get_request_metrics().record('can_redeem', 0.01, 200)
+    request = RequestFactory().get('/subsidy-client/metrics/')
+
+    request.user = mock.Mock(is_staff=False)
+    assert subsidy_client_metrics(request).status_code == 403
+
+    request.user = mock.Mock(is_staff=True)
+    response = subsidy_client_metrics(request)
+    assert response.status_code == 200
+    assert json.loads(response.content)['endpoints']['can_redeem']['count'] >= 1
@@ -0,0 +1,115 @@
+"""
+Tests for edx_enterprise_subsidy_client.mmap_cache.
+"""
+import multiprocessing
+import threading
+
+from pytest import raises
+
+from edx_enterprise_subsidy_client.cache import StaleWhileRevalidateCache
+from edx_enterprise_subsidy_client.mmap_cache import BUCKET_SIZE, MmapCacheBackend
+
+
+def _set_in_other_process(path, key, value):
+    """
+    Stores ``value`` under ``key`` through a backend of its own, for running in another process.
+    """
+    backend = MmapCacheBackend(path, num_slots=64, slot_size=512)
+    backend.set(key, {'value': value}, 60)
+    backend.close()
+
+
+def test_get_set_delete_clear(tmp_path):
+    """
+    Test that entries can be stored, replaced, expired, deleted and cleared.
+    """
+    backend = MmapCacheBackend(str(tmp_path / 'cache'), num_slots=64, slot_size=512)
+    assert backend.get('missing') is None
+    backend.set('key', {'value': {'content_price': '149.00'}}, 60)
+    assert backend.get('key') == {'value': {'content_price': '149.00'}}
+    backend.set('key', {'value': 'replaced'}, 60)
+    assert backend.get('key') == {'value': 'replaced'}
+    backend.delete('key')
+    assert backend.get('key') is None
+
+    backend.set('expired', {'value': 1}, -1)
+    assert backend.get('expired') is None
+    backend.set('other', {'value': 2}, 60)
+    backend.clear()
+    assert backend.get('other') is None
+    backend.close()
+
+
+def test_memory_ceiling(tmp_path):
+    """
+    Test that oversized values aren't stored, and full buckets evict the entry closest to expiry.
+    """
+    backend = MmapCacheBackend(str(tmp_path / 'cache'), num_slots=BUCKET_SIZE, slot_size=256)
+    backend.set('too-big', {'value': 'x' * 1000}, 60)
+    assert backend.get('too-big') is None
+
+    # With a single bucket, only BUCKET_SIZE entries fit; the soonest to expire is evicted.
+    for index in range(BUCKET_SIZE + 1):
+        backend.set(f'key-{index}', {'value': index}, 60 + index)
+    assert backend.get('key-0') is None
+    assert [backend.get(f'key-{index}')['value'] for index in range(1, BUCKET_SIZE + 1)] == [1, 2, 3, 4]
+    backend.close()
+
+
+def test_shared_across_processes(tmp_path):
+    """
+    Test that entries written by another process are read, including through the stale-while-revalidate cache.
+    """
+    path = str(tmp_path / 'cache')
+    backend = MmapCacheBackend(path, num_slots=64, slot_size=512)
+    process = multiprocessing.get_context('fork').Process(
+        target=_set_in_other_process, args=(path, 'shared-key', 'from-another-worker'),
+    )
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+    assert backend.get('shared-key') == {'value': 'from-another-worker'}
+
+    # And usable underneath the stale-while-revalidate cache.
+    read_cache = StaleWhileRevalidateCache(backend=backend)
+    read_cache.set('content', {'content_price': '1.00'})
+    other_backend = MmapCacheBackend(path, num_slots=64, slot_size=512)
+    assert StaleWhileRevalidateCache(backend=other_backend).get_or_fetch('content', None) == {'content_price': '1.00'}
+    backend.close()
+    other_backend.close()
+
+
+def test_concurrent_writers_and_readers(tmp_path):
+    """
+    Test that readers never see torn entries while other threads write to the same bucket.
+    """
+    backend = MmapCacheBackend(str(tmp_path / 'cache'), num_slots=BUCKET_SIZE, slot_size=2048)
+    errors = []
+
+    def writer(index):
+        for iteration in range(200):
+            backend.set(f'key-{index}', {'value': [index] * (iteration % 50)}, 60)
+
+    def reader():
+        for _ in range(500):
+            for index in range(BUCKET_SIZE):
+                entry = backend.get(f'key-{index}')
+                if entry is not None and set(entry['value']) - {index}:
+                    errors.append(entry)
+
+    threads = [threading.Thread(target=writer, args=(index,)) for index in range(BUCKET_SIZE)]
+    threads += [threading.Thread(target=reader) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    backend.close()
+
+
+def test_invalid_dimensions(tmp_path):
+    """
+    Test that a file with fewer slots than one bucket is refused.
+    """
+    with raises(ValueError):
+        MmapCacheBackend(str(tmp_path / 'cache'), num_slots=1)
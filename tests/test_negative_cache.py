@@ -0,0 +1,61 @@
+"""
+Tests for edx_enterprise_subsidy_client.negative_cache.
+"""
+import uuid
+from unittest import mock
+
+import requests
+from pytest import raises
+
+from edx_enterprise_subsidy_client import EnterpriseSubsidyAPIClientV2
+from edx_enterprise_subsidy_client.negative_cache import NegativeCache
+from test_utils.utils import MockResponse
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_can_redeem_negative_answers(mock_oauth_client):
+    """
+    Test that negative can_redeem answers are cached until a deposit to the subsidy, and positive ones aren't.
+    """
+    mock_client = mock_oauth_client.return_value
+    subsidy_uuid = str(uuid.uuid4())
+    negative_cache = NegativeCache(ttl=30)
+    client = EnterpriseSubsidyAPIClientV2(negative_cache=negative_cache)
+
+    mock_client.get.return_value = MockResponse({'can_redeem': False, 'existing_transaction': None}, 200)
+    assert client.can_redeem(subsidy_uuid, 42, 'edX+DemoX') == {'can_redeem': False, 'existing_transaction': None}
+    assert client.can_redeem(subsidy_uuid, 42, 'edX+DemoX')['can_redeem'] is False
+    assert mock_client.get.call_count == 1
+    assert negative_cache.stats['hits'] == 1
+
+    # A deposit to the subsidy may make the content redeemable.
+    mock_client.post.return_value = MockResponse({'uuid': str(uuid.uuid4())}, 201)
+    client.create_subsidy_deposit(subsidy_uuid, 10000, 'contract', 'salesforce')
+    mock_client.get.return_value = MockResponse({'can_redeem': True, 'existing_transaction': None}, 200)
+    assert client.can_redeem(subsidy_uuid, 42, 'edX+DemoX')['can_redeem'] is True
+    # Positive answers aren't cached.
+    client.can_redeem(subsidy_uuid, 42, 'edX+DemoX')
+    assert mock_client.get.call_count == 3
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_content_metadata_negative_answers(mock_oauth_client):
+    """
+    Test that 404s for content metadata are cached, and transient errors aren't.
+    """
+    mock_client = mock_oauth_client.return_value
+    client = EnterpriseSubsidyAPIClientV2(negative_cache=NegativeCache())
+
+    mock_client.get.return_value = MockResponse({}, 404, content=b'{"detail": "Not found."}')
+    for _ in range(2):
+        with raises(requests.exceptions.HTTPError) as exc_info:
+            client.get_subsidy_content_data('customer', 'not+in+catalog')
+        assert exc_info.value.response.status_code == 404
+    assert mock_client.get.call_count == 1
+
+    # Transient errors are never cached.
+    mock_client.get.return_value = MockResponse({}, 503)
+    for _ in range(2):
+        with raises(requests.exceptions.HTTPError):
+            client.get_subsidy_content_data('customer', 'edX+DemoX')
+    assert mock_client.get.call_count == 3
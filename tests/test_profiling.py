@@ -0,0 +1,122 @@
+"""
+Tests for edx_enterprise_subsidy_client.profiling.
+"""
+import json
+import os
+import pstats
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from edx_enterprise_subsidy_client import EnterpriseSubsidyAPIClientV2
+from edx_enterprise_subsidy_client.profiling import MODE_CPROFILE, FoldedStackTracer, RequestProfiler
+from test_utils.utils import MockResponse
+
+
+def _inner():
+    return sum(range(1000))
+
+
+def _outer():
+    return _inner() + _inner()
+
+
+def test_folded_stack_tracer():
+    """
+    Test that the tracer returns the function's result and records its call stacks in folded form.
+    """
+    tracer = FoldedStackTracer()
+    assert tracer.run(_outer) == 2 * 499500
+    paths = list(tracer.folded)
+    assert any(path.startswith('_outer (') and path.split(';')[-1].startswith('_inner (') for path in paths)
+    assert all(seconds >= 0 for seconds in tracer.folded.values())
+
+
+def _json_response(*args, **kwargs):  # pylint: disable=unused-argument
+    """
+    Returns a successful can_redeem response with a real JSON body, whatever the request.
+    """
+    response = MockResponse(None, 200, content=b'{"can_redeem": true}')
+    response.json = lambda: json.loads(response.content)
+    return response
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_sampled_requests_are_profiled(mock_oauth_client, tmp_path):
+    """
+    Test that only sampled endpoints are profiled, and their stacks are flushed to a folded file.
+    """
+    mock_oauth_client.return_value.get.side_effect = _json_response
+    profiler = RequestProfiler(str(tmp_path), sample_rate=0.0, sample_rates={'can_redeem': 1.0}, flush_every=2)
+    client = EnterpriseSubsidyAPIClientV2(profiler=profiler)
+
+    for _ in range(2):
+        assert client.can_redeem('subsidy', 1, 'edX+DemoX') == {'can_redeem': True}
+    client.retrieve_subsidy('subsidy')
+
+    assert profiler.stats['can_redeem']['samples'] == 2
+    assert 'subsidies.retrieve' not in profiler.stats
+    with open(os.path.join(str(tmp_path), 'can_redeem.folded'), encoding='utf8') as folded_file:
+        lines = folded_file.read().splitlines()
+    assert lines
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+    assert any('json.loads' in line or 'loads (' in line for line in lines)
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_cprofile_mode(mock_oauth_client, tmp_path):
+    """
+    Test that in cProfile mode each sampled request is dumped to its own .prof file.
+    """
+    mock_oauth_client.return_value.get.side_effect = _json_response
+    profiler = RequestProfiler(str(tmp_path), sample_rate=1.0, mode=MODE_CPROFILE)
+    EnterpriseSubsidyAPIClientV2(profiler=profiler).can_redeem('subsidy', 1, 'edX+DemoX')
+
+    (dump,) = os.listdir(str(tmp_path))
+    assert dump.startswith('can_redeem-') and dump.endswith('.prof')
+    assert pstats.Stats(os.path.join(str(tmp_path), dump)).total_calls > 0
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_concurrent_sampled_requests(mock_oauth_client, tmp_path):
+    """
+    Test that a request made while another is being profiled goes through unprofiled.
+    """
+    started, release = threading.Event(), threading.Event()
+
+    def slow_response(*args, **kwargs):  # pylint: disable=unused-argument
+        if not started.is_set():
+            started.set()
+            release.wait(5)
+        return _json_response()
+
+    mock_oauth_client.return_value.get.side_effect = slow_response
+    profiler = RequestProfiler(str(tmp_path), sample_rate=1.0, mode=MODE_CPROFILE)
+    client = EnterpriseSubsidyAPIClientV2(profiler=profiler)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(client.can_redeem, 'subsidy', 1, 'edX+DemoX')
+        assert started.wait(5)
+        # Another request while the first is being profiled goes through, unprofiled.
+        assert client.can_redeem('subsidy', 2, 'edX+DemoX') == {'can_redeem': True}
+        release.set()
+        assert first.result() == {'can_redeem': True}
+    assert profiler.stats['can_redeem']['samples'] == 1
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_profiler_failures_do_not_fail_requests(mock_oauth_client, tmp_path):
+    """
+    Test that a request still succeeds, unprofiled, when the profiler itself fails.
+    """
+    mock_oauth_client.return_value.get.side_effect = _json_response
+    profiler = RequestProfiler(str(tmp_path), sample_rate=1.0, mode=MODE_CPROFILE)
+    client = EnterpriseSubsidyAPIClientV2(profiler=profiler)
+
+    with mock.patch(
+        'edx_enterprise_subsidy_client.profiling.cProfile.Profile.runcall',
+        side_effect=ValueError('Another profiling tool is already active'),
+    ):
+        assert client.can_redeem('subsidy', 1, 'edX+DemoX') == {'can_redeem': True}
+    assert mock_oauth_client.return_value.get.call_count == 1
+    assert 'can_redeem' not in profiler.stats
@@ -0,0 +1,157 @@
+"""
+Tests for edx_enterprise_subsidy_client.recording.
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+import requests
+from pytest import raises
+
+from edx_enterprise_subsidy_client import EnterpriseSubsidyAPIClientV2, auth
+from edx_enterprise_subsidy_client.recording import Cassette, record, replay
+
+
+class _SubsidyServiceHandler(BaseHTTPRequestHandler):
+    """
+    Serves canned subsidy service responses.
+    """
+
+    def _respond(self, status, data):
+        """
+        Sends ``data`` as a JSON response with the given status.
+        """
+        body = json.dumps(data).encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        if '/subsidies/?' in self.path:
+            self._respond(200, {'next': None, 'results': [{'uuid': 'subsidy-1'}], 'path': self.path})
+        else:
+            self._respond(404, {'detail': 'Not found.'})
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        length = int(self.headers['Content-Length'])
+        payload = json.loads(self.rfile.read(length))
+        self._respond(201, {'uuid': 'transaction-1', 'echo': payload})
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(name='subsidy_service')
+def fixture_subsidy_service():
+    """
+    Runs a local subsidy service for the test, and yields its base URL.
+    """
+    server = HTTPServer(('127.0.0.1', 0), _SubsidyServiceHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def _reset_token_managers():
+    """
+    Clears the process-wide token managers around each test.
+    """
+    auth.reset_token_managers()
+    yield
+    auth.reset_token_managers()
+
+
+def _client(base_url):
+    """
+    Returns a V2 client for ``base_url`` with a seeded token, so it never calls the OAuth provider.
+    """
+    client = EnterpriseSubsidyAPIClientV2(base_url=base_url, client_id=str(uuid.uuid4()))
+    client.client.token_manager.seed('test-token', expires_in=3600)
+    return client
+
+
+def _exercise(client):
+    """
+    Makes a read, a write and a failing read through ``client``, and returns what each produced.
+    """
+    results = [
+        client.list_subsidies('customer-1', page=1),
+        client.create_subsidy_transaction('subsidy-1', 7, 'edX+DemoX', 'policy-1', {'a': 1}),
+    ]
+    with raises(requests.exceptions.HTTPError) as exc:
+        client.retrieve_subsidy('missing')
+    results.append(exc.value.response.status_code)
+    return results
+
+
+@pytest.mark.parametrize('cassette_name', ['cassette.jsonl', 'cassette.jsonl.gz'])
+def test_record_then_replay(subsidy_service, tmp_path, cassette_name):
+    """
+    Test that exchanges recorded against a live service replay to the same results, without the service.
+    """
+    cassette_path = str(tmp_path / cassette_name)
+    recording_client = _client(subsidy_service)
+    cassette = record(recording_client, cassette_path)
+    recorded = _exercise(recording_client)
+    cassette.close()
+
+    exchanges = Cassette(cassette_path).load()
+    assert [exchange['method'] for exchange in exchanges] == ['GET', 'POST', 'GET']
+    assert exchanges[0]['params'] == [['enterprise_customer_uuid', 'customer-1'], ['page', '1']]
+    assert exchanges[1]['body']['metadata'] == {'a': 1}
+    assert exchanges[2]['status'] == 404
+    assert all(exchange['elapsed'] >= 0 for exchange in exchanges)
+
+    # Same credentials, so both clients share a token manager.
+    replaying_client = EnterpriseSubsidyAPIClientV2(
+        base_url=subsidy_service, client_id=recording_client.client._client_id,  # pylint: disable=protected-access
+    )
+    replay(replaying_client, cassette_path, timing_scale=0)
+    assert _exercise(replaying_client) == recorded
+    # Only the replaying session sends the dummy token.
+    assert recording_client.client.token_manager.get_token() == 'test-token'
+
+    with raises(requests.exceptions.ConnectionError):
+        replaying_client.retrieve_subsidy('never-recorded')
+
+
+def test_replay_scales_timings(tmp_path):
+    """
+    Test that replay sleeps for the recorded response times, scaled by timing_scale.
+    """
+    cassette = Cassette(str(tmp_path / 'cassette.jsonl'))
+    cassette.append({
+        'method': 'GET', 'url': 'http://subsidy/api/v1/subsidies/s/', 'params': [], 'body': None,
+        'status': 200, 'reason': 'OK', 'headers': {'Content-Type': 'application/json'},
+        'content': '{"uuid": "s"}', 'elapsed': 0.2,
+    })
+    cassette.close()
+    client = EnterpriseSubsidyAPIClientV2(base_url='http://subsidy')
+    replay(client, cassette.path, timing_scale=0.25)
+    started_at = time.perf_counter()
+    assert client.retrieve_subsidy('s') == {'uuid': 's'}
+    assert 0.05 <= time.perf_counter() - started_at < 0.2
+    # Replayed responses can be streamed like real ones.
+    response = client.client.get('http://subsidy/api/v1/subsidies/s/', stream=True)
+    assert b''.join(response.iter_content()) == b'{"uuid": "s"}'
+
+
+def test_gzip_cassettes_are_one_stream(tmp_path):
+    """
+    Test that a gzipped cassette is written as one gzip stream, not one per exchange.
+    """
+    path = str(tmp_path / 'cassette.jsonl.gz')
+    with Cassette(path) as cassette:
+        for number in range(50):
+            cassette.append({'method': 'GET', 'url': f'http://subsidy/{number}', 'content': 'x' * 200})
+    with open(path, 'rb') as cassette_file:
+        assert cassette_file.read().count(b'\x1f\x8b\x08') == 1
+    assert len(Cassette(path).load()) == 50
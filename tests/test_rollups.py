@@ -0,0 +1,116 @@
+"""
+Tests for edx_enterprise_subsidy_client.rollups.
+"""
+import uuid
+from unittest import mock
+
+from edx_enterprise_subsidy_client import EnterpriseSubsidyAPIClientV2
+from edx_enterprise_subsidy_client.rollups import ROLLUP_FIELDS, TransactionRollup, rollup_subsidy_transactions
+from test_utils.utils import MockResponse
+
+
+def _transaction(policy, content_key, quantity, created, state='committed', reversal=None):
+    """
+    Returns a transaction record with the fields a roll-up reads, plus one it doesn't.
+    """
+    return {
+        'uuid': str(uuid.uuid4()),
+        'state': state,
+        'quantity': quantity,
+        'subsidy_access_policy_uuid': policy,
+        'content_key': content_key,
+        'created': created,
+        'reversal': reversal,
+        'metadata': {'ignored': True},
+    }
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_rollup_subsidy_transactions(mock_oauth_client):
+    """
+    Test that streamed transaction pages are rolled up overall and per group, and cross-checked.
+    """
+    subsidy_uuid = str(uuid.uuid4())
+    pages = {
+        None: {'next': 'page-2', 'results': [
+            _transaction('policy-a', 'course-1', -100, '2024-01-01T23:30:00-05:00'),
+            _transaction('policy-a', 'course-2', -50, '2024-01-02T10:00:00Z', state='pending'),
+        ]},
+        'page-2': {'next': None, 'results': [
+            _transaction('policy-b', 'course-1', -25, '2024-01-02T11:00:00Z'),
+        ]},
+    }
+
+    def get(url, params=None):
+        """
+        Serves the two pages, or the service's aggregates.
+        """
+        if params and params.get('include_aggregates'):
+            return MockResponse({'aggregates': {'total_quantity': -175}, 'results': []}, 200)
+        return MockResponse(pages['page-2' if url == 'page-2' else None], 200)
+
+    mock_get = mock_oauth_client.return_value.get
+    mock_get.side_effect = get
+
+    rollup, mismatches = rollup_subsidy_transactions(EnterpriseSubsidyAPIClientV2(), subsidy_uuid)
+
+    assert not mismatches
+    totals = rollup.as_dict()
+    assert (totals['count'], totals['total_quantity']) == (3, -175)
+    assert totals['by_policy'] == {
+        'policy-a': {'count': 2, 'total_quantity': -150},
+        'policy-b': {'count': 1, 'total_quantity': -25},
+    }
+    assert totals['by_state']['pending'] == {'count': 1, 'total_quantity': -50}
+    assert totals['by_content_key']['course-1'] == {'count': 2, 'total_quantity': -125}
+    # Days are UTC.
+    assert totals['by_day'] == {
+        '2024-01-02': {'count': 3, 'total_quantity': -175},
+    }
+    assert mock_get.call_args_list[0][1]['params']['fields'] == ','.join(ROLLUP_FIELDS)
+
+    assert rollup.cross_check({'total_quantity': -200}) == {'total_quantity': {'local': -175, 'server': -200}}
+
+
+def test_empty_rollup():
+    """
+    Test that a roll-up of no transactions has zero totals, no groups, and agrees with a zero server total.
+    """
+    rollup = TransactionRollup()
+    rollup.add_page([])
+    assert rollup.as_dict() == {
+        'count': 0,
+        'total_quantity': 0,
+        'by_state': {},
+        'by_policy': {},
+        'by_content_key': {},
+        'by_day': {},
+    }
+    assert not rollup.cross_check({'total_quantity': 0})
+    assert not rollup.cross_check(None)
+
+
+def test_reversed_and_committed_transactions():
+    """
+    Test that committed reversals cancel their transactions' quantities, and uncommitted ones don't.
+    """
+    rollup = TransactionRollup()
+    rollup.add_page([
+        _transaction('policy-a', 'course-1', -100, '2024-01-01T10:00:00Z'),
+        _transaction(
+            'policy-a', 'course-2', -50, '2024-01-01T11:00:00Z',
+            reversal={'uuid': str(uuid.uuid4()), 'state': 'committed', 'quantity': 50},
+        ),
+        _transaction(
+            'policy-b', 'course-2', -25, '2024-01-02T10:00:00Z',
+            reversal={'uuid': str(uuid.uuid4()), 'state': 'pending', 'quantity': 25},
+        ),
+    ])
+    totals = rollup.as_dict()
+    assert (totals['count'], totals['total_quantity']) == (3, -125)
+    assert totals['by_content_key'] == {
+        'course-1': {'count': 1, 'total_quantity': -100},
+        'course-2': {'count': 2, 'total_quantity': -25},
+    }
+    assert totals['by_policy']['policy-a'] == {'count': 2, 'total_quantity': -100}
+    assert totals['by_day']['2024-01-01'] == {'count': 2, 'total_quantity': -100}
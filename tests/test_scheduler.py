@@ -0,0 +1,91 @@
+"""
+Tests for edx_enterprise_subsidy_client.scheduler.
+"""
+import threading
+import time
+from unittest import mock
+
+import requests
+from pytest import raises
+
+from edx_enterprise_subsidy_client.scheduler import LedgerWriteScheduler
+from test_utils.utils import MockResponse
+
+
+def test_writes_serialized_per_ledger():
+    """
+    Test that writes to one ledger run one at a time and in order, while different ledgers run concurrently.
+    """
+    lock = threading.Lock()
+    active, max_active, order = {}, {}, []
+
+    def create_subsidy_transaction(subsidy_uuid, lms_user_id):
+        with lock:
+            active[subsidy_uuid] = active.get(subsidy_uuid, 0) + 1
+            max_active[subsidy_uuid] = max(max_active.get(subsidy_uuid, 0), active[subsidy_uuid])
+            order.append((subsidy_uuid, lms_user_id))
+        time.sleep(0.01)
+        with lock:
+            active[subsidy_uuid] -= 1
+        return {'subsidy_uuid': subsidy_uuid, 'lms_user_id': lms_user_id}
+
+    client = mock.Mock(create_subsidy_transaction=create_subsidy_transaction)
+    with LedgerWriteScheduler(client, max_workers=4) as scheduler:
+        futures = [
+            scheduler.submit_transaction(subsidy_uuid, lms_user_id)
+            for lms_user_id in range(5)
+            for subsidy_uuid in ('a', 'b', 'c')
+        ]
+        results = [future.result() for future in futures]
+
+    assert results[0] == {'subsidy_uuid': 'a', 'lms_user_id': 0}
+    assert max_active == {'a': 1, 'b': 1, 'c': 1}
+    assert [lms_user_id for subsidy_uuid, lms_user_id in order if subsidy_uuid == 'b'] == [0, 1, 2, 3, 4]
+    assert scheduler.pending() == {}
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.time.sleep')
+def test_write_errors_and_retries(mock_sleep):
+    """
+    Test that ledger-lock 429s are retried and other errors resolve the write's future.
+    """
+    locked = requests.exceptions.HTTPError(response=MockResponse({}, 429))
+    invalid = requests.exceptions.HTTPError(response=MockResponse({}, 400))
+    client = mock.Mock()
+    client.create_subsidy_deposit.side_effect = [locked, {'uuid': 'deposit'}, invalid]
+
+    with LedgerWriteScheduler(client) as scheduler:
+        first = scheduler.submit_deposit('subsidy', 100, 'contract', 'salesforce')
+        second = scheduler.submit_deposit('subsidy', -1, 'contract', 'salesforce')
+        assert first.result() == {'uuid': 'deposit'}
+        with raises(requests.exceptions.HTTPError):
+            second.result()
+    assert mock_sleep.call_count == 1
+
+
+def test_shutdown_without_wait_cancels_queued_writes():
+    """
+    Test that shutdown(wait=False) lets the running write finish and cancels the writes queued behind it.
+    """
+    started, release = threading.Event(), threading.Event()
+
+    def create_subsidy_transaction(subsidy_uuid, lms_user_id):
+        started.set()
+        release.wait(5)
+        return {'subsidy_uuid': subsidy_uuid, 'lms_user_id': lms_user_id}
+
+    client = mock.Mock(create_subsidy_transaction=create_subsidy_transaction)
+    scheduler = LedgerWriteScheduler(client)
+    running = scheduler.submit_transaction('subsidy', 1)
+    queued = [scheduler.submit_transaction('subsidy', lms_user_id) for lms_user_id in (2, 3)]
+    assert started.wait(5)
+
+    scheduler.shutdown(wait=False)
+    release.set()
+
+    assert running.result(5) == {'subsidy_uuid': 'subsidy', 'lms_user_id': 1}
+    assert all(future.cancelled() for future in queued)
+    with raises(RuntimeError):
+        scheduler.submit_transaction('subsidy', 4)
+    scheduler.shutdown()
+    assert scheduler.pending() == {}
@@ -0,0 +1,116 @@
+"""
+Tests for edx_enterprise_subsidy_client.snapshot_cache.
+"""
+import threading
+from unittest import mock
+
+from edx_enterprise_subsidy_client.cache import StaleWhileRevalidateCache
+from edx_enterprise_subsidy_client.snapshot_cache import SnapshotCacheBackend
+
+
+def test_snapshot_survives_restart(tmp_path):
+    """
+    Test that a new backend reads the most recently used entries from the saved snapshot.
+    """
+    path = str(tmp_path / 'cache.snapshot')
+    backend = SnapshotCacheBackend(path, max_snapshot_entries=50)
+    for position in range(100):
+        backend.set(f'content-metadata:customer:course-{position}', {'value': {'price': position}}, 600)
+    backend.set('expired', {'value': 1}, -1)
+    assert backend.save() == 50
+
+    # A new process only sees the 50 most recently used entries.
+    restarted = SnapshotCacheBackend(path)
+    assert restarted.get('content-metadata:customer:course-99') == {'value': {'price': 99}}
+    assert restarted.get('content-metadata:customer:course-50') == {'value': {'price': 50}}
+    assert restarted.get('content-metadata:customer:course-49') is None
+    assert restarted.get('expired') is None
+
+    # Local writes and deletes take precedence over the snapshot.
+    restarted.delete('content-metadata:customer:course-98')
+    assert restarted.get('content-metadata:customer:course-98') is None
+    restarted.close()
+    assert restarted.get('content-metadata:customer:course-99') == {'value': {'price': 99}}
+
+
+def test_snapshot_expiry_and_version(tmp_path):
+    """
+    Test that snapshot entries expire as usual, and snapshots from another version are ignored.
+    """
+    path = str(tmp_path / 'cache.snapshot')
+    backend = SnapshotCacheBackend(path, version='http://subsidy-a')
+    backend.set('key', {'value': 1}, 60)
+    backend.save()
+
+    assert SnapshotCacheBackend(path, version='http://subsidy-b').get('key') is None
+    with mock.patch('edx_enterprise_subsidy_client.snapshot_cache.time.time', return_value=10**10):
+        assert SnapshotCacheBackend(path, version='http://subsidy-a').get('key') is None
+    assert SnapshotCacheBackend(path, version='http://subsidy-a').get('key') == {'value': 1}
+
+
+def test_snapshot_backend_with_read_cache(tmp_path):
+    """
+    Test that the read cache serves snapshot entries after a restart without fetching them.
+    """
+    path = str(tmp_path / 'cache.snapshot')
+    cache = StaleWhileRevalidateCache(backend=SnapshotCacheBackend(path))
+    cache.set('content-metadata:customer:edX+DemoX', {'content_price': '149.00'})
+    cache.backend.save()
+
+    fetch = mock.Mock()
+    restarted = StaleWhileRevalidateCache(backend=SnapshotCacheBackend(path))
+    assert restarted.get_or_fetch('content-metadata:customer:edX+DemoX', fetch) == {'content_price': '149.00'}
+    fetch.assert_not_called()
+
+
+def test_save_keeps_snapshot_entries_that_were_never_requested(tmp_path):
+    """
+    Test that saving again keeps untouched snapshot entries, and honors the ones overwritten or deleted since.
+    """
+    path = str(tmp_path / 'cache.snapshot')
+    backend = SnapshotCacheBackend(path)
+    for position in range(3):
+        backend.set(f'key-{position}', {'value': position}, 600)
+    backend.save()
+
+    restarted = SnapshotCacheBackend(path)
+    assert restarted.get('key-0') == {'value': 0}
+    restarted.set('key-1', {'value': 'new'}, 600)
+    restarted.delete('key-2')
+    restarted.set('key-3', {'value': 3}, 600)
+    assert restarted.save() == 3
+
+    again = SnapshotCacheBackend(path)
+    assert [again.get(f'key-{position}') for position in range(4)] == [
+        {'value': 0}, {'value': 'new'}, None, {'value': 3},
+    ]
+
+
+def test_clear_while_other_threads_read(tmp_path):
+    """
+    Test that clearing the backend while other threads read from its snapshot doesn't break those reads.
+    """
+    path = str(tmp_path / 'cache.snapshot')
+    backend = SnapshotCacheBackend(path)
+    for position in range(200):
+        backend.set(f'key-{position}', {'value': position}, 600)
+    backend.save()
+
+    errors = []
+
+    def read(restarted):
+        try:
+            for position in range(200):
+                restarted.get(f'key-{position}')
+        except Exception as exc:
+            errors.append(exc)
+
+    for _ in range(20):
+        restarted = SnapshotCacheBackend(path)
+        readers = [threading.Thread(target=read, args=(restarted,)) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        restarted.clear()
+        for reader in readers:
+            reader.join()
+    assert not errors
@@ -0,0 +1,133 @@
+"""
+Tests for edx_enterprise_subsidy_client.sync.
+"""
+import uuid
+from unittest import mock
+
+import requests
+from pytest import raises
+
+from edx_enterprise_subsidy_client import EnterpriseSubsidyAPIClientV2
+from edx_enterprise_subsidy_client.stores import InMemoryLocalStore
+from edx_enterprise_subsidy_client.sync import TransactionSync
+from test_utils.utils import MockResponse
+
+
+def _transaction(modified, state='committed', transaction_uuid=None):
+    """
+    Returns a minimal transaction record last modified at ``modified``.
+    """
+    return {
+        'uuid': transaction_uuid or str(uuid.uuid4()),
+        'state': state,
+        'modified': modified,
+    }
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_incremental_sync(mock_oauth_client):
+    """
+    Test that the first sync fetches everything, and later syncs only yield changed transactions.
+    """
+    mock_get = mock_oauth_client.return_value.get
+    subsidy_uuid = str(uuid.uuid4())
+    first = _transaction('2023-05-01T10:00:00Z', state='pending')
+    second = _transaction('2023-05-01T11:00:00Z')
+    mock_get.return_value = MockResponse({'next': None, 'results': [first, second]}, 200)
+
+    store = InMemoryLocalStore()
+    syncer = TransactionSync(EnterpriseSubsidyAPIClientV2(), store)
+
+    assert syncer.sync(subsidy_uuid) == [first, second]
+    assert syncer.get_watermark(subsidy_uuid) == {'modified': '2023-05-01T11:00:00Z', 'uuid': second['uuid']}
+    first_params = mock_get.call_args.kwargs['params']
+    assert 'modified__gte' not in first_params
+    assert first_params['state'] == ['committed', 'created', 'failed', 'pending']
+    assert first_params['ordering'] == 'modified,uuid'
+
+    # The pending transaction was committed; the service (re)returns rows modified at/after the watermark.
+    committed_first = dict(first, state='committed', modified='2023-05-01T12:00:00Z')
+    mock_get.return_value = MockResponse({'next': None, 'results': [second, committed_first]}, 200)
+
+    assert syncer.sync(subsidy_uuid) == [committed_first]
+    assert mock_get.call_args.kwargs['params']['modified__gte'] == '2023-05-01T11:00:00Z'
+    assert syncer.get_watermark(subsidy_uuid)['uuid'] == first['uuid']
+
+    # Nothing changed since.
+    mock_get.return_value = MockResponse({'next': None, 'results': [committed_first]}, 200)
+    assert not syncer.sync(subsidy_uuid)
+
+    syncer.reset(subsidy_uuid)
+    assert syncer.get_watermark(subsidy_uuid) is None
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_interrupted_sync_does_not_advance_watermark(mock_oauth_client):
+    """
+    Test that the watermark only advances once a sync has read every page.
+    """
+    mock_oauth_client.return_value.get.side_effect = [
+        MockResponse({'next': 'http://next-page', 'results': [_transaction('2023-05-01T10:00:00Z')]}, 200),
+        MockResponse('unavailable', 503),
+    ]
+    syncer = TransactionSync(EnterpriseSubsidyAPIClientV2(), InMemoryLocalStore())
+    changes = syncer.iter_changes('some-subsidy')
+    assert len(next(changes)) == 1
+    with raises(requests.exceptions.HTTPError):
+        next(changes)
+    assert syncer.get_watermark('some-subsidy') is None
+
+
+class _PaginatedLedger:
+    """
+    Serves transactions like the service: filtered by ``modified__gte``, ordered, in numbered pages.
+    """
+
+    page_size = 2
+
+    def __init__(self, transactions):
+        self.transactions = transactions
+        self.on_request = None
+
+    def get(self, url, params=None):  # pylint: disable=unused-argument
+        """
+        Answers a ``list_subsidy_transactions()`` request with the requested page.
+        """
+        if self.on_request:
+            self.on_request()
+        rows = sorted(
+            (row for row in self.transactions if row['modified'] >= params.get('modified__gte', '')),
+            key=lambda row: (row['modified'], row['uuid']),
+        )
+        page = int(params.get('page', 1))
+        start = (page - 1) * self.page_size
+        next_url = f'http://next-page/?page={page + 1}' if start + self.page_size < len(rows) else None
+        return MockResponse({'next': next_url, 'results': rows[start:start + self.page_size]}, 200)
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_rows_modified_during_a_sync_are_not_skipped(mock_oauth_client):
+    """
+    Test that rows which move between pages mid-sync, or share a modified time, are all synced.
+    """
+    transactions = [_transaction(f'2023-05-01T1{hour}:00:00Z', transaction_uuid=str(hour)) for hour in range(6)]
+    ledger = _PaginatedLedger(transactions)
+    mock_oauth_client.return_value.get.side_effect = ledger.get
+    syncer = TransactionSync(EnterpriseSubsidyAPIClientV2(), InMemoryLocalStore())
+
+    # The first transaction is modified after the first page was served, shifting every row back one place.
+    requests_made = []
+
+    def modify_first_after_first_page():
+        requests_made.append(True)
+        if len(requests_made) == 2:
+            transactions[0]['modified'] = '2023-05-01T20:00:00Z'
+
+    ledger.on_request = modify_first_after_first_page
+    seen = {transaction['uuid'] for transaction in syncer.sync('some-subsidy')}
+    assert seen == {str(hour) for hour in range(6)}
+
+    # Many rows sharing one modified time are stepped through page by page.
+    transactions[:] = [_transaction('2023-05-02T10:00:00Z', transaction_uuid=str(number)) for number in range(5)]
+    ledger.on_request = None
+    assert {transaction['uuid'] for transaction in syncer.sync('some-subsidy')} == {str(n) for n in range(5)}
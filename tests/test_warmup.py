@@ -0,0 +1,112 @@
+"""
+Tests for edx_enterprise_subsidy_client.warmup.
+"""
+import uuid
+from unittest import mock
+
+import requests
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
+from pytest import raises
+
+from edx_enterprise_subsidy_client import EnterpriseSubsidyAPIClient
+from edx_enterprise_subsidy_client.apps import EnterpriseSubsidyClientConfig
+from edx_enterprise_subsidy_client.cache import StaleWhileRevalidateCache
+from edx_enterprise_subsidy_client.warmup import load_hot_keys, track_hot_keys, warmup
+from test_utils.utils import MockResponse
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_hot_keys_snapshot_and_warmup(mock_oauth_client, tmp_path):
+    """
+    Test that hot keys tracked by one process are prefetched by the next one's warmup.
+    """
+    mock_session = mock_oauth_client.return_value
+    mock_session.get.return_value = MockResponse({'uuid': 'anything'}, 200)
+    hot_keys_path = str(tmp_path / 'hot-keys.json')
+    hot_subsidy, cold_subsidy = str(uuid.uuid4()), str(uuid.uuid4())
+
+    # The previous process.
+    client = EnterpriseSubsidyAPIClient()
+    tracker = track_hot_keys(client)
+    for _ in range(3):
+        client.retrieve_subsidy(hot_subsidy)
+        client.get_subsidy_content_data('customer', 'edX+DemoX')
+    client.retrieve_subsidy(cold_subsidy)
+    tracker.snapshot(hot_keys_path, max_keys=2)
+    assert load_hot_keys(hot_keys_path) == [['subsidy', hot_subsidy], ['content_metadata', 'customer', 'edX+DemoX']]
+
+    # The next one.
+    mock_session.get.reset_mock()
+    client = EnterpriseSubsidyAPIClient(read_cache=StaleWhileRevalidateCache())
+    summary = warmup(client, connections=3, hot_keys_path=hot_keys_path)
+
+    assert summary == {'token': True, 'connections': 3, 'prefetched': 2}
+    mock_session.token_manager.get_token.assert_called_once_with()
+    assert mock_session.head.call_count == 3
+    assert mock_session.get.call_count == 2
+    client.retrieve_subsidy(hot_subsidy)
+    client.get_subsidy_content_data('customer', 'edX+DemoX')
+    assert mock_session.get.call_count == 2
+
+
+def test_load_missing_hot_keys(tmp_path):
+    """
+    Test that a missing hot keys file loads as no hot keys.
+    """
+    assert load_hot_keys(str(tmp_path / 'missing.json')) == []
+
+
+_shared_client = {}
+
+
+def get_shared_client():
+    """
+    The client the service under test makes its calls through.
+    """
+    return _shared_client['client']
+
+
+@mock.patch('edx_enterprise_subsidy_client.warmup.atexit.register')
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_app_ready_hook(mock_oauth_client, mock_atexit_register, tmp_path):
+    """
+    Test that the app's ready() hook warms up the configured client and snapshots its hot keys at exit.
+    """
+    hot_keys_path = str(tmp_path / 'hot-keys.json')
+    app_config = EnterpriseSubsidyClientConfig.create('edx_enterprise_subsidy_client')
+    config = {
+        'client_factory': 'tests.test_warmup.get_shared_client',
+        'connections': 2,
+        'hot_keys_path': hot_keys_path,
+        'background': False,
+    }
+
+    _shared_client['client'] = EnterpriseSubsidyAPIClient(read_cache=StaleWhileRevalidateCache())
+    with override_settings(ENTERPRISE_SUBSIDY_CLIENT_WARMUP=config):
+        app_config.ready()
+    assert mock_oauth_client.return_value.head.call_count == 2
+    assert _shared_client['client'].hot_keys is not None
+    assert mock_atexit_register.call_args[0][1:] == (hot_keys_path, 500)
+
+    # A client without a read cache has nothing to prefetch, so its (empty) hot keys aren't snapshotted.
+    mock_atexit_register.reset_mock()
+    _shared_client['client'] = EnterpriseSubsidyAPIClient()
+    with override_settings(ENTERPRISE_SUBSIDY_CLIENT_WARMUP=config):
+        app_config.ready()
+    assert _shared_client['client'].hot_keys is None
+    mock_atexit_register.assert_not_called()
+
+    with override_settings(ENTERPRISE_SUBSIDY_CLIENT_WARMUP={'connections': 2}):
+        with raises(ImproperlyConfigured):
+            app_config.ready()
+
+
+@mock.patch('edx_enterprise_subsidy_client.client.OAuthAPIClient', return_value=mock.MagicMock())
+def test_warmup_counts_opened_connections(mock_oauth_client):
+    """
+    Test that warmup only counts the connections it managed to open.
+    """
+    mock_oauth_client.return_value.head.side_effect = [None, requests.exceptions.ConnectionError(), None]
+    summary = warmup(EnterpriseSubsidyAPIClient(), connections=3)
+    assert summary['connections'] == 2